@@ -2,7 +2,12 @@ import os
 from flask import Flask
 from datetime import datetime
 from flask_login import current_user
+from .compression import init_compression
 from .db import init_db
+from .core.engine import init_extraction_engine
+from .core.storage import init_blob_store
+from .core.telemetry import init_telemetry
+from .cli import init_cli
 from .routes import documents, quizzes, results, ui, auth
 from .routes.auth import login_manager
 
@@ -14,14 +19,37 @@ def create_app():
     app.config.from_mapping(
         SECRET_KEY=os.getenv("SECRET_KEY"),
         DATABASE_URL=os.getenv("DATABASE_URL"),
-        FLASK_ENV=os.getenv("FLASK_ENV")
+        FLASK_ENV=os.getenv("FLASK_ENV"),
+        EXTRACTION_WORKERS=os.getenv("EXTRACTION_WORKERS"),
+        EXTRACTION_TIMEOUT=os.getenv("EXTRACTION_TIMEOUT"),
+        EXTRACTION_MAX_BYTES=os.getenv("EXTRACTION_MAX_BYTES"),
+        EXTRACTION_MAX_CHARS=os.getenv("EXTRACTION_MAX_CHARS"),
+        BLOB_STORE_URL=os.getenv("BLOB_STORE_URL"),
+        S3_ENDPOINT_URL=os.getenv("S3_ENDPOINT_URL"),
+        JOBS_EAGER=os.getenv("JOBS_EAGER", "").lower() in ("1", "true", "yes"),
+        LLM_TELEMETRY=os.getenv("LLM_TELEMETRY", "1").lower() in ("1", "true", "yes"),
+        DOCUMENT_COMPRESSION=os.getenv("DOCUMENT_COMPRESSION"),
+        DOCUMENT_COMPRESSION_LEVEL=os.getenv("DOCUMENT_COMPRESSION_LEVEL"),
+        DOCUMENT_COMPRESSION_DICT=os.getenv("DOCUMENT_COMPRESSION_DICT"),
     )
 
+    # codec of the compressed document texts
+    init_compression(app)
+
     print("Initializing the database ...")
     # initiate database
     init_db(app)
     print("the database has been initialized successfully.")
 
+    # document extraction process pool (started lazily, on the first upload)
+    init_extraction_engine(app)
+
+    # raw uploaded files (optional content-addressed blob store)
+    init_blob_store(app)
+
+    # one telemetry row per LLM call (llm_calls table)
+    init_telemetry(app)
+
     # authentication
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
@@ -48,6 +76,9 @@ def create_app():
     print("ui blueprint successfully initialized! ...")
 
 
+    # maintenance commands
+    init_cli(app)
+
     @app.context_processor
     def inject_globals():
         return {
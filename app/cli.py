@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta, timezone
+
+import click
+from sqlalchemy import delete, select
+
+from .compression import build_dictionary, get_codec
+from .db import LocalSession, migrate_compressed_columns, migrate_uuid_columns
+from .core import llm
+from .core.dedupe import DEFAULT_THRESHOLD, dedupe_document
+from .core.recompress import compress_documents, content_stats
+from .core.storage import collect_garbage, get_blob_store
+from .core.telemetry import GROUP_KEYS, summarize
+from .models import Document, LLMCall
+
+
+def init_cli(app):
+    """Register the maintenance commands (`flask --app wsgi <group> <command>`)."""
+
+    @app.cli.group("blobs")
+    def blobs():
+        """Raw uploaded files (content-addressed blob store)."""
+
+    @blobs.command("gc")
+    @click.option("--grace-hours", default=1.0, show_default=True, help="Keep blobs younger than this.")
+    @click.option("--dry-run", is_flag=True, help="Only list the blobs that would be deleted.")
+    def blobs_gc(grace_hours, dry_run):
+        """Delete blobs that no document references any more."""
+        store = get_blob_store()
+        if store is None:
+            raise click.ClickException("No blob store configured (BLOB_STORE_URL)")
+        with LocalSession() as session:
+            deleted = collect_garbage(store, session, timedelta(hours=grace_hours), dry_run=dry_run)
+        for digest in deleted:
+            click.echo(digest)
+        click.echo(f"{len(deleted)} unreferenced blob(s) {'found' if dry_run else 'deleted'}")
+
+    @app.cli.group("llm-cache")
+    def llm_cache():
+        """Persistent LLM response cache (LLM_CACHE_DIR)."""
+
+    def _get_cache():
+        if llm.response_cache is None:
+            raise click.ClickException("LLM response cache disabled (LLM_CACHE_DIR)")
+        return llm.response_cache
+
+    @llm_cache.command("stats")
+    def llm_cache_stats():
+        """Show the number and size of the cached responses, and the hit/miss counters."""
+        stats = _get_cache().stats()
+        click.echo(f"{stats['entries']} entries, {stats['bytes'] / 1024:.1f} KB")
+        click.echo(f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+    @llm_cache.command("evict")
+    def llm_cache_evict():
+        """Drop expired entries and shrink the cache under its size limit."""
+        click.echo(f"{_get_cache().evict()} entries evicted")
+
+    @llm_cache.command("clear")
+    def llm_cache_clear():
+        """Delete every cached response."""
+        _get_cache().clear()
+        click.echo("LLM response cache cleared")
+
+    @app.cli.group("questions")
+    def questions():
+        """Question banks."""
+
+    @questions.command("dedupe")
+    @click.option("--document-id", default=None, help="Only this document (default: every document).")
+    @click.option("--threshold", default=DEFAULT_THRESHOLD, show_default=True, type=float,
+                  help="Estimated Jaccard similarity of a near-duplicate.")
+    @click.option("--dry-run", is_flag=True, help="Only list the near-duplicates.")
+    def questions_dedupe(document_id, threshold, dry_run):
+        """Delete near-duplicate questions (already answered ones are kept)."""
+        with LocalSession() as session:
+            document_ids = [document_id] if document_id else list(session.scalars(select(Document.id)))
+            nb_duplicates = nb_deleted = 0
+            for doc_id in document_ids:
+                duplicates, deleted = dedupe_document(session, doc_id, threshold, dry_run=dry_run)
+                for duplicate, kept in duplicates:
+                    click.echo(f"{duplicate.id} ~ {kept.id}: {duplicate.question}")
+                nb_duplicates += len(duplicates)
+                nb_deleted += deleted
+                # also stores the signatures computed on the way
+                session.commit()
+        click.echo(f"{nb_duplicates} near-duplicate question(s) found, {nb_deleted} deleted")
+
+    @app.cli.group("llm-calls")
+    def llm_calls():
+        """Telemetry of the LLM calls (llm_calls table)."""
+
+    def _cutoff(hours):
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+
+    @llm_calls.command("stats")
+    @click.option("--since-hours", default=24.0, show_default=True, help="Only the calls of the last hours.")
+    @click.option("--by", "group_by", default="model", show_default=True, type=click.Choice(sorted(GROUP_KEYS)),
+                  help="Group the calls by this key.")
+    def llm_calls_stats(since_hours, group_by):
+        """Latency percentiles, tokens, failures and cost of the LLM calls."""
+        with LocalSession() as session:
+            summaries = summarize(session, since=_cutoff(since_hours), group_by=group_by)
+        if not summaries:
+            click.echo("No LLM call recorded")
+            return
+
+        def fmt(value, pattern="{:.0f}"):
+            return "-" if value is None else pattern.format(value)
+
+        click.echo(f"{group_by:<24} {'calls':>6} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8} "
+                   f"{'in tok':>7} {'out tok':>7} {'tok/s':>6} {'q/call':>6} {'cost $':>9}")
+        for summary in summaries:
+            click.echo(
+                f"{summary[group_by]:<24} {summary['calls']:>6} {summary['failure_rate']:>7.1%} "
+                f"{fmt(summary['latency_p50_ms']):>8} {fmt(summary['latency_p95_ms']):>8} "
+                f"{fmt(summary['input_tokens_mean']):>7} {fmt(summary['output_tokens_mean']):>7} "
+                f"{fmt(summary['output_tokens_per_s']):>6} {summary['questions_per_call']:>6.1f} "
+                f"{fmt(summary['cost'], '{:.4f}'):>9}"
+            )
+            failures = {outcome: n for outcome, n in summary["outcomes"].items() if outcome != "ok"}
+            if failures:
+                click.echo("  " + ", ".join(f"{outcome}: {n}" for outcome, n in sorted(failures.items())))
+
+    @llm_calls.command("purge")
+    @click.option("--older-than-days", default=30.0, show_default=True, help="Delete the calls older than this.")
+    def llm_calls_purge(older_than_days):
+        """Delete old telemetry rows."""
+        with LocalSession() as session:
+            deleted = session.execute(delete(LLMCall).where(LLMCall.created_at < _cutoff(older_than_days * 24)))
+            session.commit()
+        click.echo(f"{deleted.rowcount} LLM call(s) deleted")
+
+    @app.cli.group("ids")
+    def ids():
+        """Primary and foreign keys."""
+
+    @ids.command("migrate")
+    @click.option("--dry-run", is_flag=True, help="Only print the SQL statements.")
+    def ids_migrate(dry_run):
+        """Store the ids of an existing Postgres database in native uuid columns (also done at startup)."""
+        with LocalSession() as session:
+            engine = session.get_bind()
+        statements = migrate_uuid_columns(engine, dry_run=dry_run)
+        for statement in statements:
+            click.echo(statement + ";")
+        if not statements:
+            click.echo("Nothing to migrate")
+
+    @app.cli.group("documents")
+    def documents():
+        """Extracted text of the documents (compressed storage)."""
+
+    @documents.command("stats")
+    def documents_stats():
+        """Show the stored size of the texts against their plain size."""
+        with LocalSession() as session:
+            stats = content_stats(session)
+        formats = ", ".join(f"{count} {name}" for name, count in sorted(stats["formats"].items()))
+        click.echo(f"{stats['documents']} document(s): {formats or 'none'}")
+        click.echo(f"text {stats['text_bytes'] / 1024:.1f} KB, stored {stats['stored_bytes'] / 1024:.1f} KB")
+        if stats["stored_bytes"]:
+            click.echo(f"ratio {stats['text_bytes'] / stats['stored_bytes']:.2f}x, "
+                       f"{1 - stats['stored_bytes'] / stats['text_bytes']:.0%} less read per text loaded")
+
+    @documents.command("compress")
+    @click.option("--batch-size", default=100, show_default=True, help="Documents rewritten per transaction.")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be rewritten.")
+    def documents_compress(batch_size, dry_run):
+        """Rewrite the texts stored before compression (or with another codec or dictionary)."""
+        with LocalSession() as session:
+            engine = session.get_bind()
+        for statement in migrate_compressed_columns(engine, dry_run=dry_run):
+            click.echo(statement + ";")
+        with LocalSession() as session:
+            result = compress_documents(session, batch_size=batch_size, dry_run=dry_run)
+        codec = get_codec()
+        click.echo(f"{result['documents']} document(s) {'to rewrite' if dry_run else 'rewritten'} with {codec.codec}: "
+                   f"{result['bytes_before'] / 1024:.1f} KB -> {result['bytes_after'] / 1024:.1f} KB")
+
+    @documents.command("build-dict")
+    @click.argument("output", type=click.Path(dir_okay=False, writable=True))
+    @click.option("--size", default=32 * 1024, show_default=True, help="Dictionary size in bytes.")
+    @click.option("--samples", default=500, show_default=True, help="Most recent documents sampled.")
+    def documents_build_dict(output, size, samples):
+        """Build a shared compression dictionary (DOCUMENT_COMPRESSION_DICT) from the documents."""
+        with LocalSession() as session:
+            texts = session.scalars(
+                select(Document.content).order_by(Document.created_at.desc()).limit(samples)
+            ).all()
+        dictionary = build_dictionary(texts, size=size)
+        with open(output, "wb") as f:
+            f.write(dictionary)
+        click.echo(f"{len(dictionary)} bytes from {len(texts)} document(s) written to {output}; "
+                   f"set DOCUMENT_COMPRESSION_DICT then run `documents compress`")
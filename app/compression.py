@@ -0,0 +1,183 @@
+import hashlib
+import zlib
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # optional: DOCUMENT_COMPRESSION=zstd requires the zstandard package
+    zstandard = None
+
+CODECS = ("zlib", "zstd", "none")
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3, "none": 0}
+
+# A stored value is MAGIC, a codec tag, the id of the dictionary (zeros without one),
+# then the payload. Texts written before compression have no header: extracted text
+# never starts with a NUL byte.
+MAGIC = b"\x00"
+HEADER_SIZE = 6
+_TAGS = {"zlib": b"z", "zstd": b"s", "none": b"r"}
+_NO_DICTIONARY = bytes(4)
+
+# Shorter texts are stored as is: the header and the codec framing would eat the gain
+MIN_SIZE = 256
+
+
+def dictionary_id(dictionary: bytes) -> bytes:
+    """Id of a shared dictionary, written in the header of the values it compressed."""
+    return hashlib.sha256(dictionary).digest()[:4]
+
+
+class TextCodec:
+    """Compression of the extracted text of the documents.
+
+    Args:
+        codec (str): "zlib", "zstd" (zstandard package) or "none"
+        level (int, optional): compression level, the codec default otherwise
+        dictionary (bytes, optional): shared dictionary of the substrings common to the
+            documents (see `build_dictionary`). It must be kept as long as values
+            compressed with it remain in the database.
+    """
+
+    def __init__(self, codec: str = "zlib", level: Optional[int] = None, dictionary: Optional[bytes] = None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown compression codec {codec!r}, expected one of {', '.join(CODECS)}")
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self.dictionary = dictionary or None
+        self.dictionary_id = dictionary_id(dictionary) if dictionary else _NO_DICTIONARY
+
+    def compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self.codec == "none" or len(data) < MIN_SIZE:
+            return MAGIC + _TAGS["none"] + _NO_DICTIONARY + data
+        if self.codec == "zlib":
+            compressor = (
+                zlib.compressobj(self.level, zdict=self.dictionary) if self.dictionary
+                else zlib.compressobj(self.level)
+            )
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            payload = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(data)
+        return MAGIC + _TAGS[self.codec] + self.dictionary_id + payload
+
+    def decompress(self, value) -> str:
+        """Text of a stored value, whatever the codec it was written with.
+
+        Values written before compression are returned as is (`str` from a text column)
+        or decoded (`bytes` once the column is binary).
+        """
+        if isinstance(value, str):
+            return value
+        stored = bytes(value)
+        if not stored.startswith(MAGIC):
+            return stored.decode("utf-8")
+        tag, dict_id, payload = stored[1:2], stored[2:HEADER_SIZE], stored[HEADER_SIZE:]
+        dictionary = None
+        if dict_id != _NO_DICTIONARY:
+            if dict_id != self.dictionary_id:
+                raise ValueError(
+                    f"Text compressed with the dictionary {dict_id.hex()}, "
+                    f"DOCUMENT_COMPRESSION_DICT is {self.dictionary_id.hex() if self.dictionary else 'not set'}"
+                )
+            dictionary = self.dictionary
+        data: bytes
+        if tag == _TAGS["none"]:
+            data = payload
+        elif tag == _TAGS["zlib"]:
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            data = decompressor.decompress(payload) + decompressor.flush()
+        elif tag == _TAGS["zstd"]:
+            if zstandard is None:
+                raise RuntimeError("Text compressed with zstd: install the zstandard package")
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            data = zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+        else:
+            raise ValueError(f"Unknown compression tag {tag!r}")
+        return data.decode("utf-8")
+
+    def format(self, value) -> str:
+        """Codec a stored value was written with ("plain" before compression)."""
+        if isinstance(value, str) or not bytes(value[:1]) == MAGIC:
+            return "plain"
+        tag = bytes(value[1:2])
+        return next((codec for codec, codec_tag in _TAGS.items() if codec_tag == tag), "unknown")
+
+    def is_current(self, value) -> bool:
+        """Whether a stored value is already written with this codec and dictionary."""
+        codec = self.format(value)
+        if codec == "none":
+            return self.codec == "none" or len(value) - HEADER_SIZE < MIN_SIZE
+        return codec == self.codec and bytes(value[2:HEADER_SIZE]) == self.dictionary_id
+
+
+_codec = TextCodec()
+
+
+def init_compression(app):
+    global _codec
+    dictionary = None
+    path = app.config.get("DOCUMENT_COMPRESSION_DICT")
+    if path:
+        with open(path, "rb") as f:
+            dictionary = f.read()
+    level = app.config.get("DOCUMENT_COMPRESSION_LEVEL")
+    _codec = TextCodec(
+        codec=app.config.get("DOCUMENT_COMPRESSION") or "zlib",
+        level=int(level) if level else None,
+        dictionary=dictionary,
+    )
+
+
+def get_codec() -> TextCodec:
+    return _codec
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored compressed (`bytea` on Postgres, BLOB elsewhere).
+
+    Values are `str` on the Python side: the text is compressed when written and
+    decompressed when the column is loaded. Rows written before compression (plain
+    text) are read unchanged, `flask documents compress` rewrites them.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else _codec.compress(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else _codec.decompress(value)
+
+
+def build_dictionary(texts: Iterable[str], size: int = 32 * 1024) -> bytes:
+    """Shared dictionary of the lines repeated across documents (headings, boilerplate,
+    table separators, course vocabulary).
+
+    The lines found in several texts are ranked by the bytes they would save, and the
+    most valuable ones are placed last: zlib (32 KB window) and zstd (raw content
+    dictionary) both reach the end of a dictionary at the shortest distances.
+    """
+    counts: Counter = Counter()
+    for text in texts:
+        counts.update({line.strip() for line in text.splitlines() if len(line.strip()) >= 8})
+    lines = sorted(
+        (line for line, count in counts.items() if count > 1),
+        key=lambda line: counts[line] * len(line.encode("utf-8")),
+        reverse=True,
+    )
+    selected, total = [], 0
+    for line in lines:
+        data = line.encode("utf-8") + b"\n"
+        if total + len(data) > size:
+            continue
+        selected.append(data)
+        total += len(data)
+    return b"".join(reversed(selected))
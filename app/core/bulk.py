@@ -0,0 +1,49 @@
+from typing import Dict, List, Sequence, Type
+
+from sqlalchemy import insert, inspect
+from sqlalchemy.orm import Session
+
+from ..db import Base
+from ..ids import new_id
+
+
+def insert_rows(session: Session, model: Type[Base], rows: List[Dict]) -> List[str]:
+    """Insert rows of a model with a single executemany INSERT (committed by the caller).
+
+    The ids are generated client-side, so no row has to be read back: the ORM
+    unit of work (one INSERT and identity map entry per object) is bypassed.
+
+    Args:
+        session (Session): database session
+        model (Type[Base]): mapped class, e.g. `Question` or `Result`
+        rows (List[Dict]): column values of each row, without id or with one
+
+    Returns:
+        List[str]: ids of the inserted rows, in order
+    """
+    for row in rows:
+        if not row.get("id"):
+            row["id"] = new_id()
+    if rows:
+        session.execute(insert(model), rows)
+    return [row["id"] for row in rows]
+
+
+def insert_objects(session: Session, objects: Sequence[Base]) -> List[str]:
+    """Insert new (transient) ORM objects of one model through `insert_rows`.
+
+    Only the columns set on the objects are written, the others get their default.
+    The objects are not added to the session.
+    """
+    if not objects:
+        return []
+    model = type(objects[0])
+    columns = [attribute.key for attribute in inspect(model).column_attrs]
+    rows = [
+        {key: obj.__dict__[key] for key in columns if key in obj.__dict__}
+        for obj in objects
+    ]
+    ids = insert_rows(session, model, rows)
+    for obj, id in zip(objects, ids):
+        obj.id = id
+    return ids
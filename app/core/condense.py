@@ -0,0 +1,195 @@
+import bisect
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Set
+
+from .extraction import split_sections
+
+# Token budget of the course text of a generation (0: no limit, the text is sent as is)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET") or 0)
+
+# A short line found at least this many times at page boundaries is a page header or footer
+BOILERPLATE_MIN_REPEATS = 3
+BOILERPLATE_MAX_LENGTH = 100
+# A line is at a page boundary if it is at most this many (non-empty) lines away from
+# a page number or from the start or end of the text
+PAGE_BOUNDARY_WINDOW = 2
+# Unlabelled numbers ("12", "3 / 40") are page numbers when they count up this many times
+PAGE_RUN_MIN = 3
+
+PAGE_NUMBER_RE = re.compile(r"^[-–—\s]*(page|p\.)?\s*(\d+)\s*((/|of|sur)\s*\d+)?[-–—\s]*$", re.IGNORECASE)
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate number of LLM tokens of a text.
+
+    Words count for 4/3 token (long and rare words are split in several tokens) and each
+    punctuation mark for one, which is close to the tokenizers of the supported models
+    for French and English prose without depending on any of them.
+    """
+    words = len(re.findall(r"\w+", text))
+    punctuation = len(re.findall(r"[^\w\s]", text))
+    return math.ceil(words * 4 / 3) + punctuation
+
+
+def _line_signature(line: str) -> str:
+    # page numbers vary from a header to the next: "Course 3 - page 12" ~ "Course 3 - page 13"
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def _page_number_lines(lines: List[str]) -> Set[int]:
+    """Indexes of the page-number lines: labelled ones ("Page 3", "p. 3"), and the bare
+    numbers counting up from a page to the next ("1 / 12", "2 / 12" ...). A lone number
+    ("50", a numeric answer) is course content.
+    """
+    page_numbers = set()
+    run: List[int] = []
+    previous = None
+    for i, line in enumerate(lines):
+        match = PAGE_NUMBER_RE.match(line)
+        if not match:
+            continue
+        number = int(match.group(2))
+        if match.group(1):
+            page_numbers.add(i)
+        if previous is None or number != previous + 1:
+            if len(run) >= PAGE_RUN_MIN:
+                page_numbers.update(run)
+            run = []
+        run.append(i)
+        previous = number
+    if len(run) >= PAGE_RUN_MIN:
+        page_numbers.update(run)
+    return page_numbers
+
+
+def strip_boilerplate(text: str, min_repeats: int = BOILERPLATE_MIN_REPEATS) -> str:
+    """Remove the page numbers and the short lines repeated at page boundaries (headers,
+    footers). The same line repeated inside the pages ("Example:") is kept.
+    """
+    lines = text.splitlines()
+    page_numbers = _page_number_lines(lines)
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    position = {i: rank for rank, i in enumerate(non_empty)}
+    boundaries = sorted([-1, len(non_empty)] + [position[i] for i in page_numbers])
+
+    def at_boundary(i: int) -> bool:
+        k = bisect.bisect_left(boundaries, position[i])
+        nearest = min(abs(position[i] - b) for b in boundaries[max(k - 1, 0):k + 1])
+        return nearest <= PAGE_BOUNDARY_WINDOW
+
+    candidates = {
+        i for i in non_empty
+        if i not in page_numbers
+        and lines[i].strip()[0] not in "#-*|>"  # repeated headings ("## Exercises"), list items, table rows
+        and len(lines[i].strip()) <= BOILERPLATE_MAX_LENGTH
+        and at_boundary(i)
+    }
+    counts = Counter(_line_signature(lines[i]) for i in candidates)
+    removed = page_numbers | {i for i in candidates if counts[_line_signature(lines[i])] >= min_repeats}
+    return "\n".join(line for i, line in enumerate(lines) if i not in removed)
+
+
+def flatten_tables(text: str) -> str:
+    """Turn markdown table rows into plain "cell; cell" lines and drop the separator rows
+    and empty cells (their padding and pipes cost tokens and carry no content).
+    """
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("|") and stripped.endswith("|"):
+            if TABLE_SEPARATOR_RE.match(stripped):
+                continue
+            cells = [cell.strip() for cell in stripped.strip("|").split("|")]
+            line = "; ".join(cell for cell in cells if cell)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def normalize_whitespace(text: str) -> str:
+    text = re.sub(r"[ \t ]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def clean_text(text: str) -> str:
+    """Remove the extraction noise of a document: boilerplate, table markup, whitespace."""
+    return normalize_whitespace(flatten_tables(strip_boilerplate(text)))
+
+
+def _fit_paragraphs(section: str, budget: int) -> str:
+    """Keep the leading paragraphs of a section within `budget` tokens."""
+    kept: List[str] = []
+    used = 0
+    for paragraph in re.split(r"\n\s*\n", section):
+        tokens = count_tokens(paragraph)
+        if used + tokens > budget:
+            if not kept:
+                # a single paragraph larger than the share: keep its first sentences
+                words = paragraph.split(" ")
+                kept.append(" ".join(words[: max(1, int(len(words) * budget / max(tokens, 1)))]))
+            break
+        kept.append(paragraph)
+        used += tokens
+    return "\n\n".join(kept)
+
+
+def fit_to_budget(text: str, budget: int) -> str:
+    """Condense a text to about `budget` tokens while covering the whole course.
+
+    Every section gets a share of the budget proportional to its size and keeps its
+    leading paragraphs (definitions and key points usually come first), rather than
+    cutting the end of the document.
+    """
+    sections = [section for section in split_sections(text) if section.strip()]
+    sizes = [count_tokens(section) for section in sections]
+    total = sum(sizes)
+    if total <= budget:
+        return text
+    return "\n\n".join(
+        fitted
+        for section, size in zip(sections, sizes)
+        if (fitted := _fit_paragraphs(section, budget * size // total))
+    )
+
+
+class CondensedText:
+    """Result of `condense`: the text to put in the prompt and its token counts."""
+
+    def __init__(self, text: str, original_tokens: int, tokens: int):
+        self.text = text
+        self.original_tokens = original_tokens
+        self.tokens = tokens
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+    def __repr__(self):
+        return f"CondensedText({self.original_tokens} -> {self.tokens} tokens)"
+
+
+def condense(text: str, budget: Optional[int] = None) -> CondensedText:
+    """Prepare the course text of a prompt. Within the token budget (or without one) the
+    text is sent as is; over it, the text is cleaned (see `clean_text`), then condensed
+    to the budget if it is still too long.
+
+    Args:
+        text (str): markdown text of the document
+        budget (int, optional): token budget, defaults to PROMPT_TOKEN_BUDGET (0: no limit)
+
+    Returns:
+        CondensedText: condensed text and token counts
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    original_tokens = count_tokens(text)
+    if not budget or original_tokens <= budget:
+        return CondensedText(text, original_tokens, original_tokens)
+    condensed = clean_text(text)
+    if count_tokens(condensed) > budget:
+        condensed = fit_to_budget(condensed, budget)
+    return CondensedText(condensed, original_tokens, count_tokens(condensed))
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import random
+import re
+import unicodedata
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Question
+
+# MinHash signature: NUM_PERM 32-bit minimums, split in BANDS bands of ROWS rows for the
+# LSH. Two questions become candidates when one band matches, which happens with a
+# probability of 1 - (1 - s^ROWS)^BANDS for a Jaccard similarity s (50% at s ~ 0.5).
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Candidates are near-duplicates from this estimated Jaccard similarity
+DEFAULT_THRESHOLD = float(os.getenv("QUESTION_DEDUPE_THRESHOLD") or 0.6)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures are stored in the database and must stay comparable
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+Signature = Tuple[int, ...]
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    # words of 1-2 letters are mostly articles and prepositions ("le", "de", "is" ...)
+    return [token for token in re.findall(r"\w+", text) if len(token) > 2 or token.isdigit()]
+
+
+def shingles(question: str, choices: Optional[Iterable[str]] = None) -> Set[str]:
+    """Word unigrams and bigrams of the question, plus the words of its choices.
+
+    Unigrams make reworded questions ("Which organ ..." / "What organ ...") similar,
+    bigrams keep word order significant, and the choices (usually unchanged by a
+    paraphrase) separate same-topic questions with different answers.
+    """
+    words = _tokens(question)
+    result = set(words)
+    result.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for choice in choices or []:
+        result.update(f"choice:{token}" for token in _tokens(str(choice)))
+    return result
+
+
+def minhash(shingle_set: Iterable[str]) -> Signature:
+    """MinHash signature of a set of shingles."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingle_set
+    ]
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def question_signature(question: str, choices: Optional[Iterable[str]] = None) -> Signature:
+    return minhash(shingles(question, choices))
+
+
+def encode_signature(signature: Signature) -> bytes:
+    """Pack a signature for `Question.signature` (4 bytes per value)."""
+    return array("I", signature).tobytes()
+
+
+def decode_signature(data: bytes) -> Signature:
+    values = array("I")
+    values.frombytes(data)
+    return tuple(values)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the shingle sets of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+class MinHashIndex:
+    """LSH index of question signatures: lookups only compare the questions sharing a
+    band with the query, so they stay fast on banks of tens of thousands of questions.
+
+    Args:
+        threshold (float, optional): estimated Jaccard similarity of a near-duplicate
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: Dict[str, Signature] = {}
+        self.buckets: Dict[Tuple[int, Signature], List[str]] = defaultdict(list)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def _bands(signature: Signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def add(self, key: str, signature: Signature):
+        self.signatures[key] = signature
+        for band in self._bands(signature):
+            self.buckets[band].append(key)
+
+    def find_duplicate(self, signature: Signature) -> Optional[str]:
+        """Key of the most similar indexed question above the threshold, or None."""
+        candidates = {key for band in self._bands(signature) for key in self.buckets.get(band, ())}
+        best, best_score = None, self.threshold
+        for key in candidates:
+            score = similarity(signature, self.signatures[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+    def add_if_new(self, key: str, signature: Signature) -> Optional[str]:
+        """Index the question unless it duplicates an indexed one (whose key is returned)."""
+        duplicate = self.find_duplicate(signature)
+        if duplicate is None:
+            self.add(key, signature)
+        return duplicate
+
+
+def ensure_signature(question: Question) -> Signature:
+    """Signature of a question, computed and stored on the row if missing."""
+    if question.signature is not None:
+        return decode_signature(question.signature)
+    signature = question_signature(question.question, question.choices)
+    question.signature = encode_signature(signature)
+    return signature
+
+
+def load_index(session: Session, document_id: str, threshold: float = DEFAULT_THRESHOLD) -> MinHashIndex:
+    """Index the questions of a document (signatures missing in the database are computed
+    and stored, committed with the caller's transaction).
+    """
+    index = MinHashIndex(threshold)
+    for question in session.scalars(select(Question).where(Question.document_id == document_id)):
+        index.add(question.id, ensure_signature(question))
+    return index
+
+
+def find_duplicates(questions: Sequence[Question], threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[Question, Question]]:
+    """Pairs (duplicate, kept question) of a bank, keeping the first question of each group."""
+    index = MinHashIndex(threshold)
+    by_id = {question.id: question for question in questions}
+    duplicates = []
+    for question in questions:
+        duplicate_of = index.add_if_new(question.id, ensure_signature(question))
+        if duplicate_of is not None:
+            duplicates.append((question, by_id[duplicate_of]))
+    return duplicates
+
+
+def dedupe_document(
+    session: Session,
+    document_id: str,
+    threshold: float = DEFAULT_THRESHOLD,
+    dry_run: bool = False,
+) -> Tuple[List[Tuple[Question, Question]], int]:
+    """Delete the near-duplicate questions of a document (committed by the caller).
+
+    Duplicates already answered in a quiz are kept, so that no result is lost.
+
+    Returns:
+        Tuple[List, int]: the (duplicate, kept question) pairs, and the number deleted
+    """
+    questions = list(session.scalars(select(Question).where(Question.document_id == document_id)))
+    duplicates = find_duplicates(questions, threshold)
+    deleted = 0
+    if not dry_run:
+        for duplicate, _ in duplicates:
+            if not duplicate.results:
+                session.delete(duplicate)
+                deleted += 1
+    return duplicates, deleted
@@ -0,0 +1,256 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from .extraction import DocumentTooLargeError, extract_text_from_file, extract_text_within_budget
+
+# Defaults, overridable through EXTRACTION_WORKERS / EXTRACTION_TIMEOUT / EXTRACTION_MAX_BYTES
+# (EXTRACTION_MAX_CHARS, unset by default, caps the extracted text and stops decoding early)
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_INPUT_SIZE = 50 * 1024 * 1024
+
+
+class ExtractionTimeoutError(Exception):
+    """Raised when a document takes longer than the engine timeout to extract."""
+
+
+def extract_text_from_bytes(
+    data: bytes,
+    filename: Optional[str] = None,
+    mimetype: Optional[str] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    """Extract markdown from raw file bytes (runs inside the worker processes).
+    With `max_chars`, the document is decoded chunk by chunk and extraction stops at the budget.
+    """
+    stream = io.BytesIO(data)
+    if max_chars is not None:
+        return extract_text_within_budget(stream, max_chars, filename=filename, mimetype=mimetype)
+    return extract_text_from_file(stream, filename=filename, mimetype=mimetype)
+
+
+def _worker_main(conn):
+    """Loop of a worker process: run the jobs received on `conn`, send back their outcome."""
+    while True:
+        try:
+            extractor, data, kwargs = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, extractor(data, **kwargs)))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:  # the exception itself does not pickle
+                conn.send((False, RuntimeError(str(e))))
+
+
+def _process_context():
+    """Start method of the worker processes: never a plain fork, the web workers run
+    threads (gthread) and forking a threaded process can deadlock the child. forkserver
+    forks them from a single-threaded server that has already imported the extractors
+    (spawn, where it is not available, starts each one from scratch).
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["app.core.engine"])
+    return context
+
+
+_context = _process_context()
+
+
+def default_workers() -> int:
+    """Worker processes per web worker: the CPUs shared by the WEB_CONCURRENCY gunicorn
+    workers of the host (each one has its own engine).
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY") or 1)))
+
+
+class _Worker:
+    """One extraction process, fed its jobs over a pipe by a single dispatcher thread."""
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+
+    def run(self, extractor: Callable[..., str], data: bytes, kwargs: Dict[str, Any], timeout: float) -> str:
+        if self.process is None or not self.process.is_alive():
+            self.start()
+        try:
+            self.conn.send((extractor, data, kwargs))
+        except OSError:
+            self.stop()
+            raise RuntimeError("Extraction worker died before processing the document")
+        # the deadline runs from the start of this job, not from its submission
+        if not self.conn.poll(timeout):
+            self.stop()
+            raise ExtractionTimeoutError(f"Extraction took longer than {timeout} seconds")
+        try:
+            ok, value = self.conn.recv()
+        except EOFError:
+            self.stop()
+            raise RuntimeError("Extraction worker died while processing the document")
+        if not ok:
+            raise value
+        text: str = value
+        return text
+
+    def start(self):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        """Kill the process (a running job cannot be cancelled), the next job starts a new one."""
+        process, conn, self.process, self.conn = self.process, self.conn, None, None
+        if process is not None:
+            process.terminate()
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if conn is not None:
+            conn.close()
+
+
+class ExtractionEngine:
+    """Runs document extraction in a bounded set of worker processes.
+
+    Extraction is CPU-bound and can hang on malformed files, so it is kept out of
+    the web workers: each job runs in a worker process, is bounded in size and in time,
+    and a stuck job only costs its own process (which is killed and replaced), never
+    the request worker nor the jobs running in the other processes.
+
+    Args:
+        max_workers (int, optional): number of worker processes of this engine (one per
+            web worker). Defaults to default_workers(). 0 runs extraction inline, in the
+            calling process (dev / tests).
+        timeout (float, optional): seconds allowed per job, from the moment it starts.
+        max_input_size (int, optional): maximum accepted input size, in bytes.
+        max_chars (int, optional): maximum extracted text size, extraction stops there.
+        extractor (Callable, optional): picklable function turning bytes (plus optional
+            filename and mimetype keywords) into markdown.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_input_size: int = DEFAULT_MAX_INPUT_SIZE,
+        max_chars: Optional[int] = None,
+        extractor: Callable[..., str] = extract_text_from_bytes,
+    ):
+        # each dispatcher thread owns one worker process and feeds it one job at a time
+        self._dispatcher: Optional[ThreadPoolExecutor] = None
+        self._workers: List[_Worker] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.extractor = extractor
+        self.configure(
+            max_workers=max_workers, timeout=timeout, max_input_size=max_input_size, max_chars=max_chars
+        )
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_input_size: int = DEFAULT_MAX_INPUT_SIZE,
+        max_chars: Optional[int] = None,
+    ):
+        """(Re)configure the engine. Running workers are stopped and restarted lazily."""
+        self.shutdown()
+        self.max_workers = default_workers() if max_workers is None else max_workers
+        self.timeout = timeout
+        self.max_input_size = max_input_size
+        self.max_chars = max_chars
+
+    def _get_dispatcher(self) -> ThreadPoolExecutor:
+        # Created on first use so every gunicorn worker starts its own processes after the fork
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="extraction"
+                )
+            return self._dispatcher
+
+    def _run(self, data: bytes, kwargs: Dict[str, Any]) -> str:
+        worker = getattr(self._local, "worker", None)
+        if worker is None:
+            worker = self._local.worker = _Worker()
+            with self._lock:
+                self._workers.append(worker)
+        return worker.run(self.extractor, data, kwargs, self.timeout)
+
+    def check_size(self, size: int):
+        """Raise DocumentTooLargeError if `size` bytes exceed the input limit."""
+        if size > self.max_input_size:
+            raise DocumentTooLargeError(
+                f"Document is {size} bytes, the limit is {self.max_input_size} bytes"
+            )
+
+    def submit(self, data: bytes, filename: Optional[str] = None, mimetype: Optional[str] = None) -> Future:
+        """Schedule the extraction of `data` and return its future.
+        `filename` and `mimetype` let the worker pick the converter without guessing.
+        """
+        self.check_size(len(data))
+        kwargs: Dict[str, Any] = {"filename": filename, "mimetype": mimetype}
+        if self.max_chars is not None:
+            kwargs["max_chars"] = self.max_chars
+        if self.max_workers == 0:
+            future: Future = Future()
+            try:
+                future.set_result(self.extractor(data, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_dispatcher().submit(self._run, data, kwargs)
+
+    def result(self, future: Future, timeout: Optional[float] = None) -> str:
+        """Wait for a submitted job. The engine timeout is enforced by the worker from the
+        start of the job, `timeout` optionally bounds the wait here (queueing included).
+
+        Raises:
+            ExtractionTimeoutError: the job did not finish in time.
+            RuntimeError: the worker process died (crash, out of memory ...).
+        """
+        try:
+            text: str = future.result(timeout=timeout)
+            return text
+        except FutureTimeoutError:
+            raise ExtractionTimeoutError(f"Extraction took longer than {timeout} seconds")
+
+    def extract(self, data: bytes, filename: Optional[str] = None, mimetype: Optional[str] = None) -> str:
+        """Extract markdown from `data` in a worker process and wait for the result."""
+        return self.result(self.submit(data, filename=filename, mimetype=mimetype))
+
+    def shutdown(self):
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+            workers, self._workers = self._workers, []
+        self._local = threading.local()
+        if dispatcher is not None:
+            dispatcher.shutdown(wait=False, cancel_futures=True)
+        for worker in workers:
+            worker.stop()
+
+
+# Shared engine, configured from the app settings by init_extraction_engine
+extraction_engine = ExtractionEngine()
+
+
+def init_extraction_engine(app):
+    workers = app.config.get("EXTRACTION_WORKERS")
+    max_chars = app.config.get("EXTRACTION_MAX_CHARS")
+    extraction_engine.configure(
+        max_workers=int(workers) if workers not in (None, "") else None,
+        timeout=float(app.config.get("EXTRACTION_TIMEOUT") or DEFAULT_TIMEOUT),
+        max_input_size=int(app.config.get("EXTRACTION_MAX_BYTES") or DEFAULT_MAX_INPUT_SIZE),
+        max_chars=int(max_chars) if max_chars else None,
+    )
@@ -1,7 +1,165 @@
-from markitdown import MarkItDown
-from typing import BinaryIO, Union
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import IO, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-def _extract_from_stream(stream: BinaryIO) -> str:
+# Size of the blocks read when hashing/copying an upload
+CHUNK_SIZE = 64 * 1024
+
+# Uploads are kept in memory up to this size, then spooled to an anonymous temporary file
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# markitdown converter class used for each file extension
+CONVERTERS_BY_EXTENSION = {
+    ".pdf": "PdfConverter",
+    ".docx": "DocxConverter",
+    ".pptx": "PptxConverter",
+    ".xlsx": "XlsxConverter",
+    ".xls": "XlsConverter",
+    ".html": "HtmlConverter",
+    ".htm": "HtmlConverter",
+    ".csv": "CsvConverter",
+    ".epub": "EpubConverter",
+    ".ipynb": "IpynbConverter",
+    ".txt": "PlainTextConverter",
+    ".md": "PlainTextConverter",
+    ".markdown": "PlainTextConverter",
+}
+
+# file extension used for each MIME type (when the upload has no usable filename)
+EXTENSIONS_BY_MIMETYPE = {
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": ".pptx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "application/vnd.ms-excel": ".xls",
+    "text/html": ".html",
+    "text/csv": ".csv",
+    "application/epub+zip": ".epub",
+    "text/plain": ".txt",
+    "text/markdown": ".md",
+}
+
+
+# progress(done, total) callback of the streaming API, total is None when unknown
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class DocumentTooLargeError(Exception):
+    """Raised when an input document exceeds the accepted size."""
+
+
+class ConverterRegistry:
+    """Per-process cache of markitdown converters.
+
+    markitdown is only imported on first use, and each format's converter is built
+    once and then reused for every document of that format. Streams of unknown
+    format go through a single, shared `MarkItDown` instance which guesses the type.
+    """
+
+    def __init__(self):
+        self._converters: Dict[str, Any] = {}
+        self._markitdown = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_extension(extension: Optional[str] = None, mimetype: Optional[str] = None) -> Optional[str]:
+        """Return the registry key for an extension and/or MIME type, if known."""
+        if extension:
+            extension = extension.lower()
+            if not extension.startswith("."):
+                extension = "." + extension
+            if extension in CONVERTERS_BY_EXTENSION:
+                return extension
+        if mimetype:
+            return EXTENSIONS_BY_MIMETYPE.get(mimetype.split(";")[0].strip().lower())
+        return None
+
+    def get(self, extension: Optional[str] = None, mimetype: Optional[str] = None):
+        """Return the converter for a format, building it on first use (None if unknown)."""
+        key = self.resolve_extension(extension, mimetype)
+        if key is None:
+            return None
+        converter = self._converters.get(key)
+        if converter is None:
+            with self._lock:
+                converter = self._converters.get(key)
+                if converter is None:
+                    from markitdown import converters
+
+                    converter = getattr(converters, CONVERTERS_BY_EXTENSION[key])()
+                    self._converters[key] = converter
+        return converter
+
+    def markitdown(self):
+        """Return the shared, fully featured MarkItDown instance (format guessing)."""
+        if self._markitdown is None:
+            with self._lock:
+                if self._markitdown is None:
+                    from markitdown import MarkItDown
+
+                    self._markitdown = MarkItDown()
+        return self._markitdown
+
+
+converter_registry = ConverterRegistry()
+
+
+def _normalize_markdown(text: str) -> str:
+    # Same normalization MarkItDown applies to its results
+    text = "\n".join(line.rstrip() for line in re.split(r"\r?\n", text))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _iter_pdf_pages(stream: BinaryIO, progress: Optional[ProgressCallback] = None) -> Iterator[str]:
+    # pdfminer lays pages out one at a time, so only the current page is held in memory
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+    from pdfminer.pdfpage import PDFPage
+
+    total = sum(1 for _ in PDFPage.get_pages(stream))
+    stream.seek(0)
+    for number, page in enumerate(extract_pages(stream), start=1):  # type: ignore[arg-type]
+        text = "".join(el.get_text() for el in page if isinstance(el, LTTextContainer))
+        if progress is not None:
+            progress(number, total)
+        yield text
+
+def _fast_plain_text(stream: BinaryIO) -> Optional[str]:
+    # .txt / .md need no conversion, only decoding
+    try:
+        return stream.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None  # not UTF-8: let markitdown detect the charset
+
+def _fast_pdf_text(stream: BinaryIO) -> Optional[str]:
+    # Text-layer PDFs: one pdfminer pass, page by page (markitdown runs pdfplumber
+    # over every page first, then pdfminer again for prose documents)
+    try:
+        text = "\n\n".join(_iter_pdf_pages(stream))
+    except Exception:
+        return None
+    if not text.strip():
+        return None  # scanned / image-only PDF: needs the full converter
+    return text
+
+# Cheapest extractor for each format. They return None when the document needs
+# the markitdown converter after all.
+FAST_EXTRACTORS: Dict[str, Callable[[BinaryIO], Optional[str]]] = {
+    ".txt": _fast_plain_text,
+    ".md": _fast_plain_text,
+    ".markdown": _fast_plain_text,
+    ".pdf": _fast_pdf_text,
+}
+
+
+def _extract_from_stream(
+    stream: BinaryIO,
+    extension: Optional[str] = None,
+    mimetype: Optional[str] = None,
+) -> str:
     stream.seek(0)  # Move to the beginning of the file
     # Check if the file is empty by seeking to the end and checking position
     stream.seek(0, 2)  # Seek to end (2 = SEEK_END)
@@ -9,16 +167,184 @@ def _extract_from_stream(stream: BinaryIO) -> str:
     if file_size == 0:
         return ""
     stream.seek(0)  # Reset to beginning for conversion
-    md = MarkItDown()
-    result = md.convert(stream)
-    return result.text_content.strip()
 
-def extract_text_from_file(stream: Union[BinaryIO, str]) -> str:
+    # Dispatch to the cheapest extractor that handles the format:
+    # native fast path, then the format's markitdown converter, then MarkItDown guessing
+    key = converter_registry.resolve_extension(extension, mimetype)
+    fast_extractor = FAST_EXTRACTORS.get(key) if key else None
+    if fast_extractor is not None:
+        text = fast_extractor(stream)
+        if text is not None:
+            return _normalize_markdown(text)
+        stream.seek(0)
+
+    # Known format: call its converter directly, without MarkItDown's type guessing
+    converter = converter_registry.get(extension, mimetype)
+    if converter is not None:
+        from markitdown import StreamInfo
+
+        try:
+            result = converter.convert(stream, StreamInfo(extension=key, mimetype=mimetype))
+            return _normalize_markdown(result.text_content)
+        except Exception:
+            # wrong extension or converter failure: let MarkItDown guess the format
+            stream.seek(0)
+
+    result = converter_registry.markitdown().convert(stream)
+    markdown: str = result.text_content
+    return markdown.strip()
+
+def extract_text_from_file(
+    stream: Union[BinaryIO, str],
+    filename: Optional[str] = None,
+    mimetype: Optional[str] = None,
+) -> str:
     """Extract text from word/pdf file and convert it to markdown.
     Accepts either a file-like binary stream or a filesystem path (str).
+    `filename` and `mimetype` (optional) select the converter without guessing the format.
     """
+    extension: Optional[str]
     if isinstance(stream, str):
+        extension = os.path.splitext(filename or stream)[1]
         with open(stream, "rb") as f:
-            return _extract_from_stream(f)
+            return _extract_from_stream(f, extension, mimetype)
     else:
-        return _extract_from_stream(stream)
\ No newline at end of file
+        extension = os.path.splitext(filename)[1] if filename else None
+        return _extract_from_stream(stream, extension, mimetype)
+
+def split_sections(markdown: str) -> List[str]:
+    """Split markdown on its headings, keeping each heading with its section."""
+    sections = re.split(r"\n(?=#{1,6} )", markdown)
+    return [section for section in sections if section.strip()]
+
+def iter_text_chunks(
+    stream: Union[BinaryIO, str],
+    filename: Optional[str] = None,
+    mimetype: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Iterator[str]:
+    """Extract a document chunk by chunk.
+
+    PDFs are decoded and yielded page by page. Other formats are converted with their
+    markitdown converter, then yielded section by section (split on headings).
+
+    Args:
+        stream (BinaryIO | str): binary stream or filesystem path
+        filename (str, optional): original filename, used to detect the format
+        mimetype (str, optional): MIME type, used to detect the format
+        progress (Callable, optional): called as progress(done, total) after each chunk
+
+    Yields:
+        str: markdown chunk (page or section)
+    """
+    if isinstance(stream, str):
+        with open(stream, "rb") as f:
+            yield from iter_text_chunks(f, filename or stream, mimetype, progress)
+        return
+
+    extension = os.path.splitext(filename)[1] if filename else None
+    stream.seek(0, 2)
+    is_empty = stream.tell() == 0
+    if not is_empty and converter_registry.resolve_extension(extension, mimetype) == ".pdf":
+        stream.seek(0)
+        for page in _iter_pdf_pages(stream, progress):
+            page = _normalize_markdown(page)
+            if page:
+                yield page
+        return
+
+    sections = split_sections(_extract_from_stream(stream, extension, mimetype))
+    for number, section in enumerate(sections, start=1):
+        if progress is not None:
+            progress(number, len(sections))
+        yield section.strip()
+
+def extract_text_within_budget(
+    stream: Union[BinaryIO, str],
+    max_chars: int,
+    filename: Optional[str] = None,
+    mimetype: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> str:
+    """Extract markdown, stopping as soon as `max_chars` characters have been collected.
+    The remaining pages are never decoded.
+    """
+    chunks: List[str] = []
+    size = 0
+    for chunk in iter_text_chunks(stream, filename, mimetype, progress):
+        chunks.append(chunk[: max_chars - size])
+        size += len(chunks[-1]) + 2
+        if size >= max_chars:
+            break
+    return "\n\n".join(chunks).strip()
+
+def copy_and_hash(src: IO[bytes], dst: IO[bytes], max_size: Optional[int] = None) -> str:
+    """Copy `src` into `dst` block by block and hash the bytes on the way.
+
+    Args:
+        src (BinaryIO): stream to read from (e.g. the uploaded file)
+        dst (BinaryIO): stream to write to
+        max_size (int, optional): stop with DocumentTooLargeError past this many bytes
+
+    Returns:
+        str: hex SHA-256 digest of the copied bytes
+    """
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise DocumentTooLargeError(f"Document exceeds the {max_size} bytes limit")
+        sha.update(chunk)
+        dst.write(chunk)
+    return sha.hexdigest()
+
+def spool_and_hash(src: BinaryIO, max_size: Optional[int] = None) -> Tuple[IO[bytes], str]:
+    """Copy an incoming stream into a spooled temporary buffer, hashing it on the fly.
+
+    Small uploads stay in memory, large ones go to an anonymous temporary file that
+    disappears when the buffer is closed: nothing is left behind on the web node.
+
+    Args:
+        src (BinaryIO): incoming stream (e.g. the uploaded file)
+        max_size (int, optional): stop with DocumentTooLargeError past this many bytes
+
+    Returns:
+        Tuple[IO[bytes], str]: the buffer, rewound, and the hex SHA-256 digest
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        digest = copy_and_hash(src, buffer, max_size=max_size)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer, digest
+
+
+def hash_upload(src: BinaryIO, max_size: Optional[int] = None) -> Tuple[IO[bytes], str]:
+    """Hash an upload without copying it when it is seekable (werkzeug has already spooled
+    the request files): the stream itself is returned, rewound. Other streams are copied
+    by `spool_and_hash`.
+
+    Args:
+        src (BinaryIO): incoming stream (e.g. the uploaded file)
+        max_size (int, optional): stop with DocumentTooLargeError past this many bytes
+
+    Returns:
+        Tuple[IO[bytes], str]: the stream (or its copy), rewound, and the hex SHA-256 digest
+    """
+    if not src.seekable():
+        return spool_and_hash(src, max_size=max_size)
+    size = src.seek(0, os.SEEK_END)
+    if max_size is not None and size > max_size:
+        raise DocumentTooLargeError(f"Document exceeds the {max_size} bytes limit")
+    src.seek(0)
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        sha.update(chunk)
+    src.seek(0)
+    return src, sha.hexdigest()
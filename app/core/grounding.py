@@ -0,0 +1,239 @@
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..models import Question
+
+# Size of the passage a question is matched against, in indexed words
+WINDOW_WORDS = 60
+
+# A question is supported by the text from this share of its (IDF weighted) words
+# found in a single passage
+SUPPORT_THRESHOLD = float(os.getenv("GROUNDING_THRESHOLD") or 0.4)
+
+# Documents without headings are cut in sections of about this many characters
+SECTION_CHARS = 2000
+
+# Question words and common function words, never expected to locate a passage
+STOPWORDS = {
+    "what", "which", "who", "whom", "when", "where", "why", "how", "does", "did", "the", "and",
+    "for", "are", "was", "were", "has", "have", "with", "from", "that", "this", "following",
+    "true", "false", "quel", "quelle", "quels", "quelles", "qui", "quoi", "quand", "pourquoi",
+    "comment", "lequel", "laquelle", "lesquels", "lesquelles", "parmi", "suivant", "suivante",
+    "suivants", "suivantes", "vrai", "faux", "completez", "les", "des", "une", "est", "sont",
+    "que", "dans", "pour", "par", "sur", "avec", "aux", "ces", "son", "ses", "leur", "leurs",
+}
+
+WORD_RE = re.compile(r"\w+")
+HEADING_RE = re.compile(r"^#{1,6} ", re.MULTILINE)
+PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+
+
+def _normalize(word: str) -> str:
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(char for char in word if not unicodedata.combining(char))
+
+
+def _is_term(word: str) -> bool:
+    # words of 1-2 letters are mostly articles and prepositions, like in app/core/dedupe.py
+    return len(word) > 2 or word.isdigit()
+
+
+def query_terms(question: str, answer: Optional[str] = None) -> List[str]:
+    """Word unigrams and bigrams of a question and its correct answer."""
+    terms: List[str] = []
+    for text in (question, answer or ""):
+        words = [word for word in map(_normalize, WORD_RE.findall(text)) if _is_term(word)]
+        terms.extend(word for word in words if word not in STOPWORDS)
+        terms.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return list(dict.fromkeys(terms))
+
+
+class Grounding:
+    """Passage of the document supporting a question: character span and score (0-1)."""
+
+    def __init__(self, start: Optional[int], end: Optional[int], score: float):
+        self.start = start
+        self.end = end
+        self.score = score
+
+    @property
+    def supported(self) -> bool:
+        return self.start is not None and self.score >= SUPPORT_THRESHOLD
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """Whether the passage overlaps the characters start:end of the text."""
+        return self.start is not None and self.end is not None and self.start < end and self.end > start
+
+    def __repr__(self):
+        return f"Grounding({self.start}:{self.end}, score={self.score:.2f})"
+
+
+class GroundingIndex:
+    """Inverted index of the word unigrams and bigrams of a document.
+
+    A question is located by collecting the positions of its terms in the text, then
+    sliding a window of `window` words over them: the passage containing the largest
+    share of the question terms (weighted by IDF, so that rare words count more) is
+    its source. Lookups only touch the positions of the question terms, not the text.
+
+    Args:
+        text (str): markdown text of the document
+        window (int, optional): size of the passages, in indexed words
+    """
+
+    def __init__(self, text: str, window: int = WINDOW_WORDS):
+        self.text = text
+        self.window = window
+        # character span of each indexed word
+        self.spans: List[Tuple[int, int]] = []
+        # positions of each term (bigrams at the position of their first word)
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        previous = None
+        for match in WORD_RE.finditer(text):
+            word = _normalize(match.group())
+            if not _is_term(word):
+                continue
+            position = len(self.spans)
+            self.spans.append(match.span())
+            self.postings[word].append(position)
+            if previous is not None:
+                self.postings[f"{previous} {word}"].append(position - 1)
+            previous = word
+
+    def _weight(self, term: str) -> float:
+        # terms absent from the text weigh the most: a question built on them is not grounded
+        return math.log(1 + len(self.spans) / (1 + len(self.postings.get(term, ()))))
+
+    def locate(self, question: str, answer: Optional[str] = None) -> Grounding:
+        """Find the passage of the text that best supports a question.
+
+        The passage is chosen on the words and bigrams of the question, its score is the
+        weighted share of the question words it contains (a paraphrase rarely keeps
+        the bigrams).
+        """
+        terms = query_terms(question, answer)
+        weights = {term: self._weight(term) for term in terms}
+        total = sum(weight for term, weight in weights.items() if " " not in term)
+        hits = sorted((position, term) for term in terms for position in self.postings.get(term, ()))
+        if not hits or total == 0:
+            return Grounding(None, None, 0.0)
+
+        counts: Dict[str, int] = defaultdict(int)
+        matched = best = 0.0
+        best_range = (0, 0)
+        first = 0
+        for last, (position, term) in enumerate(hits):
+            counts[term] += 1
+            if counts[term] == 1:
+                matched += weights[term]
+            # slide past the window, then drop the leading repeats: the passage stays minimal
+            while position - hits[first][0] >= self.window or counts[hits[first][1]] > 1:
+                old = hits[first][1]
+                counts[old] -= 1
+                if counts[old] == 0:
+                    matched -= weights[old]
+                first += 1
+            if matched > best:
+                best, best_range = matched, (first, last)
+
+        window = hits[best_range[0]:best_range[1] + 1]
+        score = sum(weights[term] for term in {term for _, term in window if " " not in term}) / total
+        first_position, last_position = window[0][0], window[-1][0]
+        if " " in window[-1][1]:
+            last_position += 1  # bigram: ends with the next word
+        return Grounding(self.spans[first_position][0], self.spans[last_position][1], round(score, 3))
+
+
+def grounding_of(question: Question, index: GroundingIndex) -> Grounding:
+    """Source passage of a question: the stored one, or located without changing the row."""
+    if question.source_score is not None:
+        return Grounding(question.source_start, question.source_end, question.source_score)
+    return index.locate(question.question, question.answer)
+
+
+def ensure_grounding(question: Question, index: GroundingIndex) -> Grounding:
+    """Source passage of a question, located and stored on the row if missing."""
+    if question.source_score is not None:
+        return grounding_of(question, index)
+    grounding = index.locate(question.question, question.answer)
+    question.source_start, question.source_end = grounding.start, grounding.end
+    question.source_score = grounding.score
+    return grounding
+
+
+def section_spans(text: str) -> List[Tuple[int, int]]:
+    """Character spans of the sections of a document: split on its headings, or in
+    groups of paragraphs of about SECTION_CHARS characters when it has none.
+    """
+    starts = [match.start() for match in HEADING_RE.finditer(text)]
+    if len(starts) < 2:
+        starts = [0]
+        for match in PARAGRAPH_BREAK_RE.finditer(text):
+            if match.end() - starts[-1] >= SECTION_CHARS:
+                starts.append(match.end())
+    if starts[0] != 0 and text[:starts[0]].strip():
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if text[start:end].strip()]
+
+
+def _section_title(text: str) -> str:
+    line = text.strip().split("\n", 1)[0]
+    line = line.lstrip("#").strip()
+    return line if len(line) <= 80 else line[:77] + "..."
+
+
+def coverage(text: str, groundings: Iterable[Tuple[str, Grounding]]) -> dict:
+    """Coverage of the sections of a document by its questions.
+
+    Args:
+        text (str): markdown text of the document
+        groundings (Iterable[Tuple[str, Grounding]]): (question id, source passage) pairs
+
+    Returns:
+        dict: sections with their number of supported questions, covered share of the
+        sections, and ids of the questions without support in the text
+    """
+    spans = section_spans(text)
+    counts = [0] * len(spans)
+    unsupported = []
+    nb_questions = 0
+    for question_id, grounding in groundings:
+        nb_questions += 1
+        if not grounding.supported:
+            unsupported.append(question_id)
+            continue
+        for i, (start, end) in enumerate(spans):
+            if grounding.overlaps(start, end):
+                counts[i] += 1
+
+    sections = [
+        {"index": i, "title": _section_title(text[start:end]), "start": start, "end": end, "nb_questions": count}
+        for i, ((start, end), count) in enumerate(zip(spans, counts))
+    ]
+    nb_covered = sum(1 for count in counts if count)
+    return {
+        "nb_questions": nb_questions,
+        "nb_sections": len(sections),
+        "nb_covered": nb_covered,
+        "coverage": round(nb_covered / len(sections), 3) if sections else 0.0,
+        "sections": sections,
+        "unsupported": unsupported,
+    }
+
+
+def uncovered_text(text: str, groundings: Iterable[Grounding]) -> str:
+    """Sections of a document that no question is grounded in, or the whole text when
+    every section is covered (used to target the follow-up generations).
+    """
+    supported = [grounding for grounding in groundings if grounding.supported]
+    uncovered = [
+        text[start:end].strip()
+        for start, end in section_spans(text)
+        if not any(grounding.overlaps(start, end) for grounding in supported)
+    ]
+    return "\n\n".join(uncovered) if uncovered else text
@@ -0,0 +1,287 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from typing import Callable, Dict, Optional, Tuple, cast
+
+from sqlalchemy import CursorResult, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..db import LocalSession
+from ..models import Job, JobStatus, _utcnow
+
+# kind -> handler(session, job) returning the JSON result of the job
+HANDLERS: Dict[str, Callable] = {}
+
+# A running job refreshes its heartbeat at this interval (seconds); without a heartbeat
+# for DEFAULT_STALE_AFTER, its worker (or request) is considered lost
+HEARTBEAT_INTERVAL = 30.0
+DEFAULT_STALE_AFTER = timedelta(minutes=2)
+MAX_ATTEMPTS = 3
+
+
+class JobError(Exception):
+    """Expected job failure: the message is reported as is, the job is not retried."""
+
+
+def job_handler(kind: str):
+    """Register the function running the jobs of a given kind.
+
+    The handler receives the session and the job, may call `set_progress`, and returns
+    a JSON-serializable result. Its database changes are committed with the job status.
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(session: Session, kind: str, payload: Optional[dict] = None, user_id: Optional[str] = None) -> Job:
+    """Add a job to the queue (committed by the caller)."""
+    job = Job(kind=kind, payload=payload or {}, user_id=user_id, status=JobStatus.queued)
+    session.add(job)
+    session.flush()
+    return job
+
+
+def get_active(session: Session, active_key: str) -> Optional[Job]:
+    """Return the queued or running job holding `active_key`, if any."""
+    return session.scalars(select(Job).where(Job.active_key == active_key)).first()
+
+
+def enqueue_once(
+    session: Session,
+    kind: str,
+    active_key: str,
+    payload: Optional[dict] = None,
+    user_id: Optional[str] = None,
+    status: JobStatus = JobStatus.queued,
+) -> Tuple[Job, bool]:
+    """Add a job unless one with the same `active_key` is already queued or running.
+
+    The insert relies on the unique constraint on `Job.active_key`, so two workers racing
+    on the same key cannot both create a job: the loser gets the in-flight job instead.
+    The new job is committed (the caller must not hold uncommitted changes).
+
+    Returns:
+        Tuple[Job, bool]: the job, and whether it has just been created
+    """
+    while True:
+        job = Job(kind=kind, payload=payload or {}, user_id=user_id, status=status, active_key=active_key)
+        if status == JobStatus.running:
+            job.started_at = job.heartbeat_at = _utcnow()
+            job.attempts = 1
+        session.add(job)
+        try:
+            session.commit()
+            return job, True
+        except IntegrityError:
+            session.rollback()
+        existing = get_active(session, active_key)
+        if existing is not None:
+            return existing, False
+        # the in-flight job finished between the insert and the lookup: try again
+
+
+def finish(job: Job, status: JobStatus, result=None, error: Optional[str] = None):
+    """Record the final state of a job (committed by the caller) and release its active key."""
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = _utcnow()
+    job.active_key = None
+    if status == JobStatus.succeeded:
+        job.progress = 100
+
+
+def claim_next(session: Session, worker_id: str) -> Optional[Job]:
+    """Atomically take the oldest queued job, or return None if the queue is empty.
+
+    PostgreSQL uses `FOR UPDATE SKIP LOCKED`, so concurrent workers never wait on each
+    other. SQLite has no row locks: the claim is a conditional UPDATE, retried if another
+    worker took the job first (SQLite serializes writers).
+    """
+    query = (
+        select(Job)
+        .where(Job.status == JobStatus.queued)
+        .order_by(Job.created_at)
+        .limit(1)
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        job = session.scalars(query.with_for_update(skip_locked=True)).first()
+        if job is None:
+            session.rollback()
+            return None
+        job.status = JobStatus.running
+        job.locked_by = worker_id
+        job.started_at = job.heartbeat_at = _utcnow()
+        job.attempts += 1
+        session.commit()
+        return job
+
+    while True:
+        job_id = session.scalars(query.with_only_columns(Job.id)).first()
+        if job_id is None:
+            session.rollback()
+            return None
+        claimed = cast(CursorResult, session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.queued)
+            .values(status=JobStatus.running, locked_by=worker_id, started_at=_utcnow(), heartbeat_at=_utcnow(),
+                    attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ))
+        session.commit()
+        if claimed.rowcount == 1:
+            return session.get(Job, job_id, populate_existing=True)
+
+
+def set_progress(session: Session, job: Job, progress: int):
+    """Report the progress (0-100) of a running job, visible to the status endpoint."""
+    session.execute(
+        update(Job).where(Job.id == job.id).values(progress=progress, heartbeat_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    job.progress = progress
+
+
+class _Heartbeat(threading.Thread):
+    """Refresh the heartbeat of a running job every HEARTBEAT_INTERVAL, in its own session."""
+
+    def __init__(self, job_id: str):
+        super().__init__(daemon=True, name=f"heartbeat-{job_id}")
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"Heartbeat of job {self.job_id} not recorded: {e}")
+
+    def beat(self):
+        with LocalSession() as session:
+            session.execute(
+                update(Job).where(Job.id == self.job_id, Job.status == JobStatus.running)
+                .values(heartbeat_at=_utcnow()).execution_options(synchronize_session=False)
+            )
+            session.commit()
+
+
+def _stale(stale_after: timedelta):
+    """Conditions of a running job without a heartbeat for `stale_after`."""
+    last_seen = func.coalesce(Job.heartbeat_at, Job.started_at)
+    return Job.status == JobStatus.running, last_seen < _utcnow() - stale_after
+
+
+def run_job(session: Session, job: Job, retry: bool = True) -> Job:
+    """Run a claimed job with its handler and record the outcome.
+    With `retry`, an unexpected error puts the job back in the queue (up to MAX_ATTEMPTS).
+    The job heartbeat is refreshed in the background while the handler runs.
+    """
+    handler = HANDLERS.get(job.kind)
+    job_id = job.id
+    heartbeat = _Heartbeat(job_id)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise JobError(f"No handler for jobs of kind '{job.kind}'")
+        result = handler(session, job)
+        finish(job, JobStatus.succeeded, result=result)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        job = session.get(Job, job_id, populate_existing=True) or job
+        if not isinstance(e, JobError):
+            traceback.print_exc()
+        if not retry or isinstance(e, JobError) or job.attempts >= MAX_ATTEMPTS:
+            finish(job, JobStatus.failed, error=str(e))
+        else:
+            # unexpected error (LLM outage ...): back in the queue for another attempt
+            job.status = JobStatus.queued
+            job.error = str(e)
+        session.commit()
+    finally:
+        heartbeat.stopped.set()
+    return job
+
+
+def fail_if_stale(session: Session, job_id: str, stale_after: timedelta = DEFAULT_STALE_AFTER) -> bool:
+    """Fail a running job without a recent heartbeat (the worker or request running it is
+    gone) and release its active key. Returns whether the job was stale.
+    """
+    result = cast(CursorResult, session.execute(
+        update(Job)
+        .where(Job.id == job_id, *_stale(stale_after))
+        .values(
+            status=JobStatus.failed,
+            error="Generation lost: the job stopped reporting progress",
+            finished_at=_utcnow(),
+            locked_by=None,
+            active_key=None,
+        )
+        .execution_options(synchronize_session=False)
+    ))
+    session.commit()
+    return result.rowcount == 1
+
+
+def requeue_stale(session: Session, stale_after: timedelta = DEFAULT_STALE_AFTER) -> int:
+    """Put back in the queue the running jobs whose worker died (no heartbeat for
+    `stale_after`). Returns their number. A job that already used its MAX_ATTEMPTS
+    (one that keeps crashing its worker) fails instead.
+    """
+    stale = _stale(stale_after)
+    session.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= MAX_ATTEMPTS)
+        .values(
+            status=JobStatus.failed,
+            error=f"Worker lost while running the job ({MAX_ATTEMPTS} attempts)",
+            finished_at=_utcnow(),
+            locked_by=None,
+            active_key=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    result = cast(CursorResult, session.execute(
+        update(Job)
+        .where(*stale)
+        .values(status=JobStatus.queued, locked_by=None)
+        .execution_options(synchronize_session=False)
+    ))
+    session.commit()
+    return int(result.rowcount)
+
+
+def work(
+    worker_id: Optional[str] = None,
+    poll_interval: float = 1.0,
+    max_jobs: Optional[int] = None,
+    stale_after: timedelta = DEFAULT_STALE_AFTER,
+) -> int:
+    """Worker loop: claim and run jobs until `max_jobs` have run (forever by default).
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker_id} started, handling: {', '.join(sorted(HANDLERS))}")
+    nb_jobs = 0
+    while max_jobs is None or nb_jobs < max_jobs:
+        with LocalSession() as session:
+            requeue_stale(session, stale_after)
+            job = claim_next(session, worker_id)
+            if job is None:
+                if max_jobs is not None:
+                    break
+                time.sleep(poll_interval)
+                continue
+            print(f"Running job {job.id} ({job.kind}, attempt {job.attempts})")
+            job = run_job(session, job)
+            print(f"Job {job.id} {job.status.value}")
+            nb_jobs += 1
+    return nb_jobs
@@ -1,14 +1,39 @@
 import os
-import google.genai as genai
+import re
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app, has_app_context
 from pydantic import BaseModel
-from typing import List
+from typing import Callable, Iterator, List, Optional
 
+from .condense import condense
+from .extraction import split_sections
+from .llm_cache import ResponseCache, create_response_cache
+from .providers import LLMProvider, create_provider
+from .ratelimit import RateLimiter, backoff_delay, call_with_retry, create_rate_limiter, is_retryable
+from .telemetry import track_call
+from ..models import LLMCallOutcome
 
-# Instantiate Gemini client
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Choose Gemini model
-MODEL_NAME = "gemini-2.5-flash"
+# Backend selected by LLM_PROVIDER (gemini, openai or stub), built on first use
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+# Long documents are split into chunks of at most this many characters, generated concurrently
+MAX_CHUNK_CHARS = int(os.getenv("LLM_MAX_CHUNK_CHARS", "12000"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Persistent response cache, disabled unless LLM_CACHE_DIR is set
+response_cache: Optional[ResponseCache] = create_response_cache()
+
+# Rate and concurrency limits shared by the workers of the host, disabled unless
+# LLM_RATE_LIMIT or LLM_MAX_INFLIGHT is set. Failed calls are retried with backoff.
+rate_limiter: Optional[RateLimiter] = create_rate_limiter()
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
 
 # Fix the prompt
 PROMPT = """
@@ -35,6 +60,16 @@ TEXTE À ANALYSER :
 {text}
 <<<
 """
+
+# Appended to the prompt of an incremental generation (top-up)
+EXISTING_QUESTIONS_PROMPT = """
+QUESTIONS DÉJÀ EXISTANTES (ne les répète pas et ne les reformule pas, interroge d'autres notions du cours) :
+{existing}
+"""
+
+# Only the most recent existing questions are listed, to bound the size of the prompt
+MAX_EXISTING_IN_PROMPT = 50
+
 class MCQ(BaseModel):
     question: str
     answers: List[str]
@@ -43,52 +78,352 @@ class MCQ(BaseModel):
 class MCQList(BaseModel):
     questions: List[MCQ]
 
-def _build_prompt(text: str, nb_questions: int) -> str:
+def _build_prompt(text: str, nb_questions: int, existing: Optional[List[str]] = None) -> str:
     """build the prompt
 
     Args:
         text (str): markdown text
         nb_questions (int): number of questions to be generated
+        existing (List[str], optional): questions already generated, not to be repeated
 
     Returns:
         str: prompt
     """
-    return PROMPT.format(nb_questions=nb_questions, text=text)
+    prompt = PROMPT.format(nb_questions=nb_questions, text=text)
+    if existing:
+        listed = "\n".join(f"- {question}" for question in existing[-MAX_EXISTING_IN_PROMPT:])
+        prompt += EXISTING_QUESTIONS_PROMPT.format(existing=listed)
+    return prompt
+
+def split_into_chunks(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """Split markdown into chunks of at most `max_chars` characters.
+
+    Sections (split on headings) are packed together while they fit; a section larger
+    than a chunk is split on paragraphs, and a paragraph larger than a chunk is cut.
+
+    Args:
+        text (str): markdown text
+        max_chars (int, optional): maximum chunk size
+
+    Returns:
+        List[str]: chunks, in document order
+    """
+    pieces: List[str] = []
+    for section in split_sections(text):
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for paragraph in re.split(r"\n\s*\n", section):
+            pieces.extend(paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars))
+
+    chunks: List[str] = []
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if chunks and len(chunks[-1]) + len(piece) + 2 <= max_chars:
+            chunks[-1] += "\n\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def _allocate_questions(chunks: List[str], nb_questions: int) -> List[int]:
+    """Share `nb_questions` between chunks proportionally to their length (largest remainders)."""
+    total = sum(len(chunk) for chunk in chunks)
+    shares = [nb_questions * len(chunk) / total for chunk in chunks]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[: nb_questions - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"[\W_]+", " ", question.lower()).strip()
+
+def _deduplicate(questions: List[dict], exclude: Optional[List[str]] = None) -> List[dict]:
+    """Drop questions whose normalized text was already seen (or is in `exclude`)."""
+    seen = {_normalize_question(question) for question in exclude or []}
+    unique = []
+    for q in questions:
+        key = _normalize_question(q.get("question", ""))
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(q)
+    return unique
+
+def _prepare_text(text: str) -> str:
+    """Condense the course text before prompt assembly (see `condense`) and report the saving."""
+    condensed = condense(text)
+    if condensed.saved_tokens > 0:
+        print(f"Prompt text condensed: {condensed.original_tokens} -> {condensed.tokens} tokens "
+              f"({condensed.saved_tokens} saved)")
+    return condensed.text
+
+def get_provider() -> LLMProvider:
+    """Return the configured LLM provider, creating it on first use."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider()
+        return _provider
+
+def _generate_single(
+    text: str,
+    nb_questions: int,
+    existing: Optional[List[str]] = None,
+    document_chars: Optional[int] = None,
+) -> List:
+    """One LLM call generating `nb_questions` MCQs from `text` (served from the cache if possible).
+    The call is recorded by the telemetry, with the size of its document (`document_chars`).
+    """
+    prompt = _build_prompt(text=text, nb_questions=nb_questions, existing=existing)
+    provider = get_provider()
+
+    cache, cache_key = response_cache, ""
+    if cache is not None:
+        cache_key = ResponseCache.make_key(f"{provider.name}/{provider.model}", prompt, nb_questions)
+        cached: Optional[List] = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    with track_call(provider, "generate", prompt, nb_questions, document_chars) as record:
+        def call():
+            record.attempts += 1
+            limiter = rate_limiter
+            if limiter is None:
+                return provider.generate(prompt, MCQList)
+            with limiter.slot():
+                return provider.generate(prompt, MCQList)
+
+        resp_text = call_with_retry(call, MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        if resp_text is None:
+            record.fail(LLMCallOutcome.empty, "No text returned")
+            print(f"No text returned from {provider.name}")
+            return []
+        record.add_output(resp_text)
+
+        try:
+            quiz = MCQList.model_validate_json(resp_text)
+        except Exception as e:
+            record.fail(LLMCallOutcome.invalid, e)
+            print("JSON parsing error:", e)
+            print(resp_text[:200])
+            return []
+        questions = [item.model_dump() for item in quiz.questions]
+        record.nb_questions = len(questions)
+
+    if cache is not None and questions:
+        cache.set(cache_key, questions)
+    return questions
+
+class MCQStreamParser:
+    """Incremental parser of a streamed `MCQList` JSON document.
+
+    Text is fed as it arrives; each question object is returned as soon as its closing
+    brace is received and it validates as an `MCQ`. Only the braces outside of strings
+    are tracked, so the pieces may be cut anywhere (even inside a string or an escape).
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start: Optional[int] = None
+
+    def feed(self, piece: str) -> List[dict]:
+        self.buffer += piece
+        questions = []
+        for i in range(self.position, len(self.buffer)):
+            char = self.buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+                if self.depth == 2:  # a question object in the top-level "questions" list
+                    self.start = i
+            elif char == "}":
+                if self.depth == 2 and self.start is not None:
+                    try:
+                        questions.append(MCQ.model_validate_json(self.buffer[self.start:i + 1]).model_dump())
+                    except Exception as e:
+                        print("Skipping invalid streamed question:", e)
+                    self.start = None
+                self.depth -= 1
+        self.position = len(self.buffer)
+
+        # drop what has been consumed, keeping the question being received
+        keep = self.start if self.start is not None else self.position
+        self.buffer = self.buffer[keep:]
+        self.position -= keep
+        if self.start is not None:
+            self.start = 0
+        return questions
 
-def generate_mcq(text: str, nb_questions=10) -> List:
-    """_summary_
+def stream_mcq(
+    text: str,
+    nb_questions=10,
+    max_chunk_chars: int = MAX_CHUNK_CHARS,
+    existing: Optional[List[str]] = None,
+) -> Iterator[dict]:
+    """Generate Multiple Choice Questions from a text, yielding each one as soon as the
+    model has produced it.
+
+    Long texts are split like in `generate_mcq`, and the chunks are streamed one after the
+    other. Duplicates are skipped; complete responses are stored in the cache.
 
     Args:
         text (str): Text to use as a base to the generate Multiple Choice Questions
         nb_questions (int, optional): Number of questions to generate. Defaults to 10.
+        max_chunk_chars (int, optional): Maximum size of a chunk, in characters.
+        existing (List[str], optional): questions already generated (top-up), not repeated.
 
-    Returns:
-        List: List of Multiple Choice Questions
+    Yields:
+        dict: Multiple Choice Question
     """
-    prompt = _build_prompt(text=text, nb_questions=nb_questions)
-
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=prompt,
-        config = {
-            "response_mime_type": "application/json",
-            "response_schema": MCQList
-        }
-    )
+    document_chars = len(text)
+    text = _prepare_text(text)
+    chunks = split_into_chunks(text, max_chunk_chars) or [text]
+    counts = _allocate_questions(chunks, nb_questions) if len(chunks) > 1 else [nb_questions]
+    provider = get_provider()
+    seen = {_normalize_question(question) for question in existing or []}
+    nb_yielded = 0
 
-    resp_text = response.text
-    if resp_text is None:
-        print("No text returned from Gemini")
-        return []
+    for chunk, count in zip(chunks, counts):
+        if count <= 0:
+            continue
+        prompt = _build_prompt(text=chunk, nb_questions=count, existing=existing)
+        cache, cache_key = response_cache, ""
+        cached = None
+        if cache is not None:
+            cache_key = ResponseCache.make_key(f"{provider.name}/{provider.model}", prompt, count)
+            cached = cache.get(cache_key)
 
-    try:
-        quiz = MCQList.model_validate_json(resp_text)
-        return [item.model_dump() for item in quiz.questions]
+        if cached is not None:
+            received = cached
+            new_questions: Iterator = iter(cached)
+        else:
+            received = []
+            new_questions = _stream_chunk(provider, prompt, received, count, document_chars)
 
-    except Exception as e:
-        print("JSON parsing error:", e)
-        print(resp_text[:200])
-        return []
+        for q in new_questions:
+            key = _normalize_question(q.get("question", ""))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            yield q
+            nb_yielded += 1
+            if nb_yielded >= nb_questions:
+                return
+
+        if cache is not None and cached is None and received:
+            cache.set(cache_key, received)
+
+def _stream_chunk(
+    provider: LLMProvider,
+    prompt: str,
+    received: List[dict],
+    nb_questions: int,
+    document_chars: Optional[int] = None,
+) -> Iterator[dict]:
+    """Stream one prompt, yielding the valid questions (also appended to `received`).
+    The stream holds a rate limiter slot; it is retried if it fails before any output.
+    """
+    with track_call(provider, "stream", prompt, nb_questions, document_chars) as record:
+        for attempt in range(MAX_ATTEMPTS):
+            record.attempts += 1
+            parser = MCQStreamParser()
+            started = False
+            limiter = rate_limiter
+            try:
+                with limiter.slot() if limiter is not None else nullcontext():
+                    for piece in provider.stream(prompt, MCQList):
+                        started = True
+                        record.add_output(piece)
+                        for q in parser.feed(piece):
+                            received.append(q)
+                            record.nb_questions += 1
+                            yield q
+                if not record.output:
+                    record.fail(LLMCallOutcome.empty, "No text returned")
+                elif not received:
+                    record.fail(LLMCallOutcome.invalid, "No valid question in the response")
+                return
+            except Exception as e:
+                if started or attempt + 1 >= MAX_ATTEMPTS or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                print(f"LLM stream failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
 
+def generate_mcq(
+    text: str,
+    nb_questions=10,
+    max_chunk_chars: int = MAX_CHUNK_CHARS,
+    max_concurrency: int = MAX_CONCURRENCY,
+    progress: Optional[Callable[[int, int], None]] = None,
+    existing: Optional[List[str]] = None,
+) -> List:
+    """Generate Multiple Choice Questions from a text.
 
+    The text is first condensed (boilerplate, table markup and whitespace removed, then
+    fit to PROMPT_TOKEN_BUDGET if set). Long texts are map-reduced: the text is split
+    into chunks, each chunk gets a number of questions proportional to its length, the
+    chunks are generated concurrently (at most `max_concurrency` calls at a time), then
+    the questions are merged in document order and deduplicated.
+
+    With `existing` (incremental top-up), the prompts list the questions already
+    generated and only new questions are returned.
+
+    Args:
+        text (str): Text to use as a base to the generate Multiple Choice Questions
+        nb_questions (int, optional): Number of questions to generate. Defaults to 10.
+        max_chunk_chars (int, optional): Maximum size of a chunk, in characters.
+        max_concurrency (int, optional): Maximum number of concurrent LLM calls.
+        progress (Callable, optional): called as progress(done, total) after each chunk.
+        existing (List[str], optional): questions already generated, not to be repeated.
+
+    Returns:
+        List: List of Multiple Choice Questions
+    """
+    document_chars = len(text)
+    text = _prepare_text(text)
+    chunks = split_into_chunks(text, max_chunk_chars)
+    if len(chunks) <= 1:
+        return _deduplicate(_generate_single(text, nb_questions, existing, document_chars), exclude=existing)
+
+    jobs = [(chunk, count) for chunk, count in zip(chunks, _allocate_questions(chunks, nb_questions)) if count > 0]
+    results: List[List] = [[] for _ in jobs]
+    app = current_app._get_current_object() if has_app_context() else None  # type: ignore[attr-defined]
+
+    def generate_chunk(chunk: str, count: int) -> List[dict]:
+        # the pool threads run in the app context of the caller (telemetry settings)
+        if app is None:
+            return _generate_single(chunk, count, existing, document_chars)
+        with app.app_context():
+            return _generate_single(chunk, count, existing, document_chars)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(jobs)))) as pool:
+        futures = {
+            pool.submit(generate_chunk, chunk, count): i
+            for i, (chunk, count) in enumerate(jobs)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                # a failed chunk costs its questions, not the whole generation
+                print("Chunk generation error:", e)
+            if progress is not None:
+                progress(done, len(jobs))
 
+    questions = _deduplicate([q for chunk_questions in results for q in chunk_questions], exclude=existing)
+    return questions[:nb_questions]
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the counters file is compacted without a lock
+    fcntl = None  # type: ignore[assignment]
+
+# Defaults, overridable through LLM_CACHE_MAX_BYTES / LLM_CACHE_MAX_AGE
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# A full scan of the directory runs every EVICT_EVERY writes, or as soon as the size
+# counter of the process goes over the limit
+EVICT_EVERY = 100
+# Hit/miss counters are appended to COUNTERS_FILE every FLUSH_EVERY lookups (the lines
+# are added up into one by each scan of the directory)
+FLUSH_EVERY = 20
+COUNTERS_FILE = ".counters"
+
+
+class ResponseCache:
+    """Persistent cache of LLM responses, one JSON file per entry.
+
+    Entries are keyed by model, prompt hash and number of questions. Eviction is
+    age-based (entries older than `max_age` seconds are dropped) and size-based
+    (least recently used entries are removed once the cache exceeds `max_bytes`).
+    The directory is only scanned every EVICT_EVERY writes, or when the running size
+    counter (reset by each scan) goes over `max_bytes`. Hits and misses are counted per
+    process and added up in a counters file shared by the processes.
+
+    Args:
+        directory (str): cache directory (shared by every worker of the host)
+        max_bytes (int, optional): maximum total size of the entries
+        max_age (float, optional): maximum age of an entry, in seconds
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, max_age: float = DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._unflushed = (0, 0)
+        self._bytes: Optional[int] = None  # unknown until the first scan
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, prompt: str, nb_questions: int) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}\0{prompt_hash}\0{nb_questions}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None (miss, or expired entry)."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            entry = None
+
+        if entry is not None and time.time() - entry["created_at"] > self.max_age:
+            self._remove(path)
+            entry = None
+
+        with self._lock:
+            hits, misses = self._unflushed
+            self._unflushed = (hits, misses + 1) if entry is None else (hits + 1, misses)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if sum(self._unflushed) >= FLUSH_EVERY:
+                self._flush_counters()
+        if entry is None:
+            return None
+        try:
+            os.utime(path)  # mark as recently used for the size-based eviction
+        except FileNotFoundError:  # evicted by another process since it was read
+            pass
+        return entry["value"]
+
+    def _flush_counters(self):
+        """Append the counts not yet recorded to the counters file (called with the lock held)."""
+        hits, misses = self._unflushed
+        self._unflushed = (0, 0)
+        # a single short append is atomic: concurrent processes never mix their lines
+        with open(os.path.join(self.directory, COUNTERS_FILE), "a", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH)  # not while the file is compacted
+            f.write(f"{hits} {misses}\n")
+
+    def _compact_counters(self):
+        """Replace the lines of the counters file by their sum."""
+        try:
+            f = open(os.path.join(self.directory, COUNTERS_FILE), "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            hits, misses = _sum_counters(f)
+            f.seek(0)
+            f.truncate()
+            f.write(f"{hits} {misses}\n")
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value, then evict entries if over the limits."""
+        entry = {"created_at": time.time(), "value": value}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+            size = f.tell()
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._writes += 1
+            if self._bytes is not None:
+                self._bytes += size
+            due = self._bytes is None or self._bytes > self.max_bytes or self._writes % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above `max_bytes`.
+        Returns the number of removed entries.
+        """
+        now = time.time()
+        entries = []
+        removed = 0
+        for item in os.scandir(self.directory):
+            if not item.name.endswith(".json"):
+                continue
+            try:
+                stat = item.stat()
+            except FileNotFoundError:  # removed by another process during the scan
+                continue
+            # mtime is refreshed on every hit, age is checked against the creation on get
+            if now - stat.st_mtime > self.max_age:
+                removed += self._remove(item.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, item.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        with self._lock:
+            self._bytes = total
+        self._compact_counters()
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def clear(self):
+        for item in os.scandir(self.directory):
+            if item.name.endswith(".json"):
+                self._remove(item.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of every process using the directory and the current size of the cache."""
+        sizes = [item.stat().st_size for item in os.scandir(self.directory) if item.name.endswith(".json")]
+        with self._lock:
+            hits, misses = self._unflushed
+        try:
+            with open(os.path.join(self.directory, COUNTERS_FILE), encoding="utf-8") as f:
+                flushed_hits, flushed_misses = _sum_counters(f)
+            hits, misses = hits + flushed_hits, misses + flushed_misses
+        except FileNotFoundError:
+            pass
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+        }
+
+
+def _sum_counters(f) -> Tuple[int, int]:
+    """Hits and misses of the lines of an open counters file."""
+    hits = misses = 0
+    for line in f:
+        counts = line.split()
+        if len(counts) == 2:
+            hits, misses = hits + int(counts[0]), misses + int(counts[1])
+    return hits, misses
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Build the cache from LLM_CACHE_DIR / LLM_CACHE_MAX_BYTES / LLM_CACHE_MAX_AGE (None if disabled)."""
+    directory = os.getenv("LLM_CACHE_DIR")
+    if not directory:
+        return None
+    return ResponseCache(
+        directory,
+        max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES") or DEFAULT_MAX_BYTES),
+        max_age=float(os.getenv("LLM_CACHE_MAX_AGE") or DEFAULT_MAX_AGE),
+    )
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+# Default model of each provider, overridable with LLM_MODEL
+DEFAULT_MODELS = {
+    "gemini": "gemini-2.5-flash",
+    "openai": "gpt-4o-mini",
+    "stub": "stub-v1",
+}
+
+
+class LLMProvider(ABC):
+    """A backend able to answer a prompt with JSON matching a pydantic schema."""
+
+    name = "base"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or DEFAULT_MODELS[self.name]
+        # token counts reported by the API for the last call of each thread
+        self._usage = threading.local()
+
+    def _set_usage(self, input_tokens: Optional[int], output_tokens: Optional[int]):
+        if input_tokens is not None and output_tokens is not None:
+            self._usage.value = (input_tokens, output_tokens)
+
+    def pop_usage(self) -> Optional[Tuple[int, int]]:
+        """(input, output) tokens of the last call of this thread, if the API reported them."""
+        usage: Optional[Tuple[int, int]] = getattr(self._usage, "value", None)
+        self._usage.value = None
+        return usage
+
+    @abstractmethod
+    def generate(self, prompt: str, schema: Type[BaseModel]) -> Optional[str]:
+        """Return the raw JSON text of the response (None if the model returned nothing)."""
+
+    @abstractmethod
+    def stream(self, prompt: str, schema: Type[BaseModel]) -> Iterator[str]:
+        """Yield the JSON text of the response piece by piece, as the model produces it.
+        Providers without a streaming API yield the whole `generate` response at once.
+        """
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through `google.genai` (GEMINI_API_KEY)."""
+
+    name = "gemini"
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None):
+        super().__init__(model)
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # built on first use: importing the app needs neither the SDK client nor a key
+        with self._lock:
+            if self._client is None:
+                import google.genai as genai
+
+                self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def generate(self, prompt: str, schema: Type[BaseModel]) -> Optional[str]:
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+        )
+        self._set_usage_metadata(response)
+        text: Optional[str] = response.text
+        return text
+
+    def _set_usage_metadata(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self._set_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+    def stream(self, prompt: str, schema: Type[BaseModel]) -> Iterator[str]:
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+        ):
+            self._set_usage_metadata(chunk)  # cumulative, complete on the last chunk
+            if chunk.text:
+                yield chunk.text
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions API, or any compatible server (vLLM, llama.cpp, Ollama ...)
+    through OPENAI_BASE_URL.
+    """
+
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__(model)
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY") or "not-needed"  # local servers ignore it
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+
+                self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    @staticmethod
+    def _response_format(schema: Type[BaseModel]) -> dict:
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+        }
+
+    def generate(self, prompt: str, schema: Type[BaseModel]) -> Optional[str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format=self._response_format(schema),
+        )
+        if response.usage is not None:
+            self._set_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        content: Optional[str] = response.choices[0].message.content
+        return content
+
+    def stream(self, prompt: str, schema: Type[BaseModel]) -> Iterator[str]:
+        for chunk in self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format=self._response_format(schema),
+            stream=True,
+        ):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubProvider(LLMProvider):
+    """Deterministic offline backend for load tests and local development.
+
+    Questions are fill-in-the-blank sentences taken from the text of the prompt, so the
+    same prompt always gives the same answer. `latency` (seconds, LLM_STUB_LATENCY)
+    simulates the time of a real call.
+    """
+
+    name = "stub"
+
+    def __init__(self, model: Optional[str] = None, latency: Optional[float] = None):
+        super().__init__(model)
+        self.latency = float(os.getenv("LLM_STUB_LATENCY") or 0) if latency is None else latency
+
+    @staticmethod
+    def _parse_prompt(prompt: str):
+        match = re.search(r"(\d+) questions", prompt)
+        nb_questions = int(match.group(1)) if match else 10
+        parts = prompt.split("<<<")
+        text = parts[1] if len(parts) > 2 else prompt
+        return text, nb_questions
+
+    def build_response(self, prompt: str) -> dict:
+        text, nb_questions = self._parse_prompt(prompt)
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if len(s.split()) >= 4]
+        words = sorted({w for w in re.findall(r"\w{5,}", text)}) or ["alpha", "beta", "gamma", "delta"]
+
+        questions: List[dict] = []
+        for i, sentence in enumerate(sentences):
+            if len(questions) >= nb_questions:
+                break
+            answer = max(re.findall(r"\w+", sentence), key=len)
+            question = "Complétez : " + sentence.replace(answer, "____", 1)
+            if question in prompt:  # listed as an existing question (top-up)
+                continue
+            seed = int(hashlib.sha256(f"{i}:{sentence}".encode()).hexdigest(), 16)
+            distractors = [w for w in words if w != answer]
+            choices = [answer] + [distractors[(seed + k * 7919) % len(distractors)] for k in range(3)] if distractors else [answer]
+            choices = list(dict.fromkeys(choices))
+            while len(choices) < 4:
+                choices.append(f"{answer} ({len(choices)})")
+            position = seed % 4
+            choices[0], choices[position] = choices[position], choices[0]
+            questions.append({
+                "question": question,
+                "answers": choices,
+                "correct_answer": answer,
+            })
+        return {"questions": questions}
+
+    def generate(self, prompt: str, schema: Type[BaseModel]) -> Optional[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        return json.dumps(self.build_response(prompt), ensure_ascii=False)
+
+    def stream(self, prompt: str, schema: Type[BaseModel]) -> Iterator[str]:
+        # the latency is spread over the pieces, like tokens arriving from a real model
+        text = json.dumps(self.build_response(prompt), ensure_ascii=False)
+        pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+        for piece in pieces:
+            if self.latency:
+                time.sleep(self.latency / len(pieces))
+            yield piece
+
+
+PROVIDERS = {provider.name: provider for provider in (GeminiProvider, OpenAIProvider, StubProvider)}
+
+
+def create_provider(name: Optional[str] = None, model: Optional[str] = None) -> LLMProvider:
+    """Build the provider selected by `name` (or LLM_PROVIDER, defaults to gemini)."""
+    name = (name or os.getenv("LLM_PROVIDER") or "gemini").lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](model=model or os.getenv("LLM_MODEL") or None)
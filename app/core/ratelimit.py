@@ -0,0 +1,202 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: the limits only apply within the process
+    fcntl = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: rate limited, or transient provider errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket and concurrency limiter shared by every process of the host.
+
+    The bucket (`rate` calls per second, up to `burst` calls at once) lives in a small
+    JSON file updated under an exclusive `flock`. Concurrency is limited by `max_inflight`
+    slot files: a call holds a lock on one of them while it runs, and the kernel releases
+    it if the process dies, so a crashed worker never leaks a slot.
+
+    Args:
+        directory (str): directory of the state and slot files (shared by the workers)
+        rate (float, optional): sustained calls per second, None for no rate limit
+        burst (int, optional): bucket capacity
+        max_inflight (int, optional): maximum concurrent calls, None for no limit
+        poll_interval (float, optional): wait between two attempts to get a free slot
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        max_inflight: Optional[int] = None,
+        poll_interval: float = 0.05,
+    ):
+        self.directory = directory
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_inflight = max_inflight
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, path: str, blocking: bool = True) -> Iterator[Optional[int]]:
+        """Hold an exclusive lock on `path`; yields None if not blocking and already locked."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield None
+                    return
+            yield fd
+        finally:
+            os.close(fd)  # also releases the lock
+
+    def _take_token(self) -> float:
+        """Take a token if available; otherwise return the time to wait for the next one."""
+        assert self.rate is not None
+        with self._lock, self._locked(os.path.join(self.directory, "bucket.lock")) as fd:
+            assert fd is not None
+            os.lseek(fd, 0, os.SEEK_SET)
+            raw = os.read(fd, 256)
+            now = time.time()
+            try:
+                state = json.loads(raw)
+                tokens = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+            except ValueError:
+                tokens = self.burst
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            data = json.dumps({"tokens": tokens, "updated": now}).encode()
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, data)
+            return wait
+
+    def wait_for_token(self):
+        """Block until the bucket grants a call."""
+        if self.rate is None:
+            return
+        while True:
+            wait = self._take_token()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Wait for a token and a free concurrency slot, held until the block exits."""
+        self.wait_for_token()
+        if self.max_inflight is None:
+            yield
+            return
+        if fcntl is None:
+            with self._fallback_semaphore():
+                yield
+            return
+
+        while True:
+            for i in range(self.max_inflight):
+                with self._locked(os.path.join(self.directory, f"slot-{i}.lock"), blocking=False) as fd:
+                    if fd is None:
+                        continue
+                    yield
+                    return
+            time.sleep(self.poll_interval)
+
+    @contextmanager
+    def _fallback_semaphore(self) -> Iterator[None]:
+        with self._lock:
+            if not hasattr(self, "_semaphore"):
+                self._semaphore = threading.BoundedSemaphore(self.max_inflight or 1)
+        with self._semaphore:
+            yield
+
+
+@lru_cache(maxsize=None)
+def _network_errors() -> tuple:
+    """Exception types of a lost connection or a timeout, those of the HTTP client of the
+    SDKs included (imported on the first error: importing the app does not need them).
+    """
+    errors: list = [ConnectionError, TimeoutError]
+    try:
+        import httpx  # used by the Gemini and OpenAI SDKs
+
+        errors.append(httpx.TransportError)
+    except ImportError:
+        pass
+    try:
+        from openai import APIConnectionError  # wraps the httpx errors, timeouts included
+
+        errors.append(APIConnectionError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limiting / transient errors (status on `code` or `status_code`,
+    as set by the Gemini and OpenAI SDKs) and network errors.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUSES
+    return isinstance(error, _network_errors())
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter for the given attempt (0 for the first retry)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    max_attempts: int = 4,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """Call `func`, retrying retryable errors with exponential backoff and jitter."""
+    for attempt in range(max_attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt + 1 >= max_attempts or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"LLM call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+            sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    """Build the limiter from LLM_RATE_LIMIT / LLM_RATE_BURST / LLM_MAX_INFLIGHT / LLM_RATE_LIMIT_DIR
+    (None if neither a rate nor a concurrency limit is set).
+    """
+    rate = os.getenv("LLM_RATE_LIMIT")
+    max_inflight = os.getenv("LLM_MAX_INFLIGHT")
+    if not rate and not max_inflight:
+        return None
+    return RateLimiter(
+        os.getenv("LLM_RATE_LIMIT_DIR") or os.path.join(tempfile.gettempdir(), "mcq-llm-limiter"),
+        rate=float(rate) if rate else None,
+        burst=int(os.getenv("LLM_RATE_BURST") or 1),
+        max_inflight=int(max_inflight) if max_inflight else None,
+    )
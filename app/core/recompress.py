@@ -0,0 +1,78 @@
+from collections import Counter
+from typing import Dict, List
+
+from sqlalchemy import select, type_coerce, update
+from sqlalchemy.orm import Session
+from sqlalchemy.types import NullType
+
+from ..compression import get_codec
+from ..models import Document
+
+
+def _stored_contents(session: Session, batch_size: int):
+    """Yield (id, stored value) of every document, by batches of ids."""
+    stored = type_coerce(Document.content, NullType()).label("stored")  # raw value, not decompressed
+    after = None
+    while True:
+        statement = select(Document.id, stored).order_by(Document.id).limit(batch_size)
+        if after is not None:
+            statement = statement.where(Document.id > after)
+        rows = session.execute(statement).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1].id
+
+
+def _stored_size(value) -> int:
+    return len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+
+
+def content_stats(session: Session, batch_size: int = 100) -> Dict:
+    """Stored size and text size of the documents, per storage format.
+
+    Returns:
+        Dict: documents, stored_bytes (read from the database to load every text),
+        text_bytes (UTF-8 size of the texts) and documents per format
+        (plain, none, zlib, zstd)
+    """
+    codec = get_codec()
+    stats: Dict = {"documents": 0, "stored_bytes": 0, "text_bytes": 0, "formats": Counter()}
+    for _, value in _stored_contents(session, batch_size):
+        stats["documents"] += 1
+        stats["stored_bytes"] += _stored_size(value)
+        stats["text_bytes"] += len(codec.decompress(value).encode("utf-8"))
+        stats["formats"][codec.format(value)] += 1
+    stats["formats"] = dict(stats["formats"])
+    return stats
+
+
+def compress_documents(session: Session, batch_size: int = 100, dry_run: bool = False) -> Dict:
+    """Rewrite the documents that are not stored with the configured codec and
+    dictionary (plain text rows, or another codec), committing every batch.
+
+    Returns:
+        Dict: documents rewritten, their stored size before and after
+    """
+    codec = get_codec()
+    result = {"documents": 0, "bytes_before": 0, "bytes_after": 0}
+    pending: List[Dict] = []
+
+    def flush():
+        if pending and not dry_run:
+            session.execute(update(Document), pending)
+            session.commit()
+        pending.clear()
+
+    for id, value in _stored_contents(session, batch_size):
+        if codec.is_current(value):
+            continue
+        text = codec.decompress(value)
+        result["documents"] += 1
+        result["bytes_before"] += _stored_size(value)
+        result["bytes_after"] += len(codec.compress(text))
+        pending.append({"id": id, "content": text})
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return result
@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import IO, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy import select
+
+
+class BlobStore(ABC):
+    """Content-addressed storage for the raw uploaded files.
+
+    Blobs are keyed by the SHA-256 digest of their bytes (`Document.content_hash`):
+    identical uploads are stored once, and a blob is referenced by every `Document`
+    carrying its digest. Unreferenced blobs are removed by `collect_garbage`.
+    """
+
+    @staticmethod
+    def key(digest: str) -> str:
+        """Relative path of a blob: two levels of fan-out, then the full digest."""
+        return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put(self, digest: str, stream: IO[bytes]):
+        """Store the bytes of `stream` under `digest`. If already stored, only refresh its
+        last modified time: the blob is referenced again and must outlive the GC grace period.
+        """
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes:
+        """Return the bytes stored under `digest` (KeyError if missing)."""
+
+    @abstractmethod
+    def delete(self, digest: str):
+        ...
+
+    @abstractmethod
+    def list(self) -> Iterator[Tuple[str, datetime]]:
+        """Yield (digest, last modified, UTC) for every stored blob."""
+
+
+class LocalBlobStore(BlobStore):
+    """Blob store on a local (or network mounted) directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, *self.key(digest).split("/"))
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest: str, stream: IO[bytes]):
+        path = self._path(digest)
+        try:
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file then rename, readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(stream, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, digest: str) -> bytes:
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(digest)
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> Iterator[Tuple[str, datetime]]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith(".tmp-"):
+                    continue
+                mtime = os.path.getmtime(os.path.join(dirpath, name))
+                yield name, datetime.fromtimestamp(mtime, tz=timezone.utc)
+
+
+class S3BlobStore(BlobStore):
+    """Blob store on an S3-compatible bucket (AWS S3, MinIO, R2 ...).
+
+    Args:
+        bucket (str): bucket name
+        prefix (str, optional): key prefix inside the bucket
+        client (optional): boto3 S3 client. Built from the environment
+            (and `endpoint_url` for S3-compatible services) when omitted.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", client=None, endpoint_url: Optional[str] = None):
+        if client is None:
+            import boto3  # optional dependency, only needed for this backend
+
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _object_key(self, digest: str) -> str:
+        return f"{self.prefix}/{self.key(digest)}" if self.prefix else self.key(digest)
+
+    def exists(self, digest: str) -> bool:
+        key = self._object_key(digest)
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(obj["Key"] == key for obj in response.get("Contents", []))
+
+    def put(self, digest: str, stream: IO[bytes]):
+        key = self._object_key(digest)
+        if self.exists(digest):
+            # copy in place: refreshes LastModified without uploading the bytes again
+            self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                                    MetadataDirective="REPLACE")
+            return
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=stream.read())
+
+    def get(self, digest: str) -> bytes:
+        if not self.exists(digest):
+            raise KeyError(digest)
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(digest))
+        data: bytes = response["Body"].read()
+        return data
+
+    def delete(self, digest: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(digest))
+
+    def list(self) -> Iterator[Tuple[str, datetime]]:
+        kwargs = {"Bucket": self.bucket, "Prefix": f"{self.prefix}/" if self.prefix else ""}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for obj in response.get("Contents", []):
+                yield obj["Key"].rsplit("/", 1)[-1], obj["LastModified"]
+            if not response.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def create_blob_store(url: Optional[str], endpoint_url: Optional[str] = None) -> Optional[BlobStore]:
+    """Build a blob store from its URL: `file:///path`, a plain path, or `s3://bucket/prefix`.
+    Returns None (raw files are not kept) when `url` is empty.
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3BlobStore(parsed.netloc, prefix=parsed.path, endpoint_url=endpoint_url)
+    if parsed.scheme in ("", "file"):
+        return LocalBlobStore(parsed.path if parsed.scheme else url)
+    raise ValueError(f"Unsupported blob store URL: {url}")
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> Optional[BlobStore]:
+    """Return the configured blob store, or None if raw files are not kept."""
+    return _blob_store
+
+
+def init_blob_store(app):
+    global _blob_store
+    _blob_store = create_blob_store(app.config.get("BLOB_STORE_URL"), app.config.get("S3_ENDPOINT_URL"))
+
+
+def collect_garbage(store: BlobStore, session, grace_period: timedelta = timedelta(hours=1), dry_run: bool = False):
+    """Delete the blobs no `Document` references any more.
+
+    A blob's reference count is the number of documents carrying its digest. Blobs
+    younger than `grace_period` are kept: their document may not be committed yet
+    (`put` refreshes the modified time of a blob uploaded again). The references of
+    a blob are checked again right before it is deleted, for documents committed
+    while the store was being listed.
+
+    Returns:
+        List[str]: digests of the deleted (or, with dry_run, deletable) blobs
+    """
+    from ..models import Document
+
+    referenced = set(
+        session.execute(select(Document.content_hash).where(Document.content_hash.isnot(None)).distinct()).scalars()
+    )
+    cutoff = datetime.now(timezone.utc) - grace_period
+    deleted = []
+    for digest, modified_at in store.list():
+        if digest in referenced or modified_at > cutoff:
+            continue
+        if session.execute(select(Document.id).where(Document.content_hash == digest).limit(1)).first():
+            continue
+        if not dry_run:
+            store.delete(digest)
+        deleted.append(digest)
+    return deleted
@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..db import LocalSession
+from ..models import LLMCall, LLMCallOutcome
+from .condense import count_tokens
+from .providers import LLMProvider
+
+# Price of each model in USD per million (input, output) tokens, used to estimate the
+# cost of the calls. LLM_PRICE_INPUT / LLM_PRICE_OUTPUT override it for the configured model.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "stub-v1": (0.0, 0.0),
+}
+
+# Upper bounds of the prompt size buckets of `summarize(group_by="prompt_size")`, in characters
+PROMPT_SIZE_BUCKETS = (2000, 4000, 8000, 16000, 32000)
+
+# Number of LLM calls in flight in this process
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+
+def init_telemetry(app):
+    app.extensions["llm_telemetry"] = bool(app.config.get("LLM_TELEMETRY"))
+
+
+def _recording() -> bool:
+    """Calls are only recorded inside an application with LLM_TELEMETRY (the rows go to
+    its database): the setting of an app never applies to calls made outside of it.
+    """
+    return has_app_context() and bool(current_app.extensions.get("llm_telemetry"))
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """Estimated cost of a call in USD, None if the prices of the model are unknown."""
+    price_input, price_output = os.getenv("LLM_PRICE_INPUT"), os.getenv("LLM_PRICE_OUTPUT")
+    if price_input is not None and price_output is not None:
+        prices = (float(price_input), float(price_output))
+    elif model in PRICES:
+        prices = PRICES[model]
+    else:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1_000_000
+
+
+class CallRecord:
+    """Measures of one LLM call, completed by the caller inside `track_call`."""
+
+    def __init__(self, provider: LLMProvider, mode: str, prompt: str, nb_requested: int,
+                 document_chars: Optional[int] = None):
+        self.provider = provider
+        self.mode = mode
+        self.prompt = prompt
+        self.nb_requested = nb_requested
+        self.document_chars = document_chars
+        self.outcome = LLMCallOutcome.ok
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.output = ""
+        self.nb_questions = 0
+        self.concurrency = 1
+        self.started = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+
+    def add_output(self, piece: str):
+        """Append a piece of the response (the first one dates the time to first token)."""
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.started) * 1000
+        self.output += piece
+
+    def fail(self, outcome: LLMCallOutcome, error: object):
+        self.outcome = outcome
+        self.error = str(error)[:500]
+
+    def to_row(self, latency_ms: float, usage: Optional[Tuple[int, int]]) -> LLMCall:
+        if usage is not None:
+            input_tokens, output_tokens = usage
+        else:
+            input_tokens, output_tokens = count_tokens(self.prompt), count_tokens(self.output)
+        return LLMCall(
+            provider=self.provider.name,
+            model=self.provider.model,
+            mode=self.mode,
+            outcome=self.outcome,
+            error=self.error,
+            latency_ms=round(latency_ms, 1),
+            first_token_ms=round(self.first_token_ms, 1) if self.first_token_ms is not None else None,
+            attempts=max(self.attempts, 1),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            tokens_estimated=usage is None,
+            cost=estimate_cost(self.provider.model, input_tokens, output_tokens),
+            prompt_chars=len(self.prompt),
+            document_chars=self.document_chars,
+            nb_requested=self.nb_requested,
+            nb_questions=self.nb_questions,
+            concurrency=self.concurrency,
+        )
+
+
+def _save(record: CallRecord, latency_ms: float, usage: Optional[Tuple[int, int]]):
+    # telemetry never fails a generation
+    try:
+        with LocalSession() as session:
+            session.add(record.to_row(latency_ms, usage))
+            session.commit()
+    except Exception as e:
+        print("LLM call telemetry not recorded:", e)
+
+
+@contextmanager
+def track_call(
+    provider: LLMProvider,
+    mode: str,
+    prompt: str,
+    nb_requested: int,
+    document_chars: Optional[int] = None,
+) -> Iterator[CallRecord]:
+    """Time an LLM call and record it as an `LLMCall` row.
+
+    The caller fills in the record (attempts, response, questions, outcome); an exception
+    escaping the block is recorded as an error, and closing a stream early as cancelled.
+    Token counts are those reported by the provider, approximated from the text otherwise.
+    """
+    global _inflight
+    record = CallRecord(provider, mode, prompt, nb_requested, document_chars)
+    provider.pop_usage()  # drop the counts of a previous call of this thread
+    with _inflight_lock:
+        _inflight += 1
+        record.concurrency = _inflight
+    try:
+        yield record
+    except GeneratorExit:
+        record.outcome = LLMCallOutcome.cancelled
+        raise
+    except Exception as e:
+        record.fail(LLMCallOutcome.error, e)
+        raise
+    finally:
+        latency_ms = (time.perf_counter() - record.started) * 1000
+        with _inflight_lock:
+            _inflight -= 1
+        usage = provider.pop_usage()
+        if _recording():
+            _save(record, latency_ms, usage)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """p-th percentile (0-100) of the values, nearest-rank method."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def _prompt_size_bucket(call: LLMCall) -> str:
+    lower = 0
+    for upper in PROMPT_SIZE_BUCKETS:
+        if call.prompt_chars < upper:
+            return f"{lower // 1000}k-{upper // 1000}k"
+        lower = upper
+    return f">={lower // 1000}k"
+
+
+# Keys the calls can be grouped by in `summarize`
+GROUP_KEYS: Dict[str, Callable[[LLMCall], str]] = {
+    "model": lambda call: f"{call.provider}/{call.model}",
+    "mode": lambda call: call.mode,
+    "prompt_size": _prompt_size_bucket,
+    "concurrency": lambda call: str(call.concurrency),
+}
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def summarize(session: Session, since: Optional[datetime] = None, group_by: str = "model") -> List[dict]:
+    """Aggregates of the recorded LLM calls.
+
+    Grouping by prompt size or by concurrency shows how latency, throughput and failures
+    evolve with LLM_MAX_CHUNK_CHARS and LLM_MAX_CONCURRENCY. The concurrency of a call is
+    the number of calls in flight in its process when it started: with several web or job
+    worker processes, the load on the provider is the sum over the processes (and
+    LLM_MAX_CONCURRENCY bounds one generation, not the process).
+
+    Args:
+        session (Session): database session
+        since (datetime, optional): only the calls made after this date (naive UTC)
+        group_by (str, optional): "model", "mode", "prompt_size" or "concurrency"
+
+    Returns:
+        List[dict]: one dict per group: number of calls, failure rate and outcomes,
+        latency p50/p95 (ms), mean tokens, output tokens per second, questions per call
+        and estimated cost
+    """
+    key = GROUP_KEYS[group_by]
+    query = select(LLMCall).order_by(LLMCall.created_at)
+    if since is not None:
+        query = query.where(LLMCall.created_at >= since)
+
+    groups: Dict[str, List[LLMCall]] = defaultdict(list)
+    for call in session.scalars(query):
+        groups[key(call)].append(call)
+
+    summaries = []
+    for name in sorted(groups, key=lambda name: (len(name), name)):
+        calls = groups[name]
+        outcomes: Dict[str, int] = defaultdict(int)
+        for call in calls:
+            outcomes[call.outcome.value] += 1
+        completed = [call for call in calls if call.outcome == LLMCallOutcome.ok]
+        latencies = [call.latency_ms for call in completed]
+        first_tokens = [call.first_token_ms for call in completed if call.first_token_ms is not None]
+        costs = [call.cost for call in calls if call.cost is not None]
+        nb_questions = sum(call.nb_questions for call in calls)
+        failed = len(calls) - len(completed) - outcomes.get(LLMCallOutcome.cancelled.value, 0)
+        output_seconds = sum(latencies) / 1000
+        summaries.append({
+            group_by: name,
+            "calls": len(calls),
+            "failure_rate": round(failed / len(calls), 3),
+            "outcomes": dict(outcomes),
+            "retries": sum(call.attempts - 1 for call in calls),
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p95_ms": percentile(latencies, 95),
+            "first_token_p50_ms": percentile(first_tokens, 50),
+            "input_tokens_mean": _mean([call.input_tokens for call in calls]),
+            "output_tokens_mean": _mean([call.output_tokens for call in calls]),
+            "output_tokens_per_s": (
+                round(sum(call.output_tokens for call in completed) / output_seconds, 1) if output_seconds else None
+            ),
+            "questions_per_call": round(nb_questions / len(calls), 2),
+            "cost": round(sum(costs), 6) if costs else None,
+            "cost_per_question": round(sum(costs) / nb_questions, 6) if costs and nb_questions else None,
+        })
+    return summaries
@@ -1,11 +1,15 @@
 import os
+from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 Base = declarative_base()
 LocalSession = sessionmaker()
 
+# Postgres advisory lock taken while the schema is upgraded at startup
+SCHEMA_LOCK_KEY = 7_412_305
+
 def init_db(app):
     database_url = app.config['DATABASE_URL']
     print("DATABASE_URL used:", database_url)
@@ -24,5 +28,197 @@ def init_db(app):
                 )
         
     LocalSession.configure(bind=engine)
-    Base.metadata.create_all(engine)
-    
\ No newline at end of file
+    upgrade_schema(engine)
+
+
+def upgrade_schema(engine):
+    """Bring the database to the schema of the models before the app uses it: the missing
+    tables, columns and indexes are created, and on Postgres the former column types are
+    converted (the new code cannot query them). Processes starting together (web and job
+    workers) upgrade one at a time, the next ones find nothing left: two of them creating
+    the same index would fail the boot of one.
+
+    Returns:
+        List[str]: the SQL statements executed
+    """
+    with _schema_lock(engine):
+        statements = migrate_uuid_columns(engine) + migrate_compressed_columns(engine)
+        statements += add_missing_columns(engine)
+        Base.metadata.create_all(engine)
+        create_missing_indexes(engine)
+    if statements:
+        print(f"Database schema upgraded ({len(statements)} statements)")
+    return statements
+
+
+@contextmanager
+def _schema_lock(engine):
+    """Postgres advisory lock held while the schema is upgraded (SQLite serializes its writers)."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def add_missing_columns(engine, dry_run: bool = False):
+    """Add the columns declared on the models that the tables of an existing database lack
+    (`create_all` only creates the missing tables). The existing rows get NULL: the new
+    columns are nullable, and filled on first use.
+
+    Raises:
+        RuntimeError: a missing column is NOT NULL, it cannot be added to existing rows
+
+    Returns:
+        List[str]: the SQL statements (executed unless dry_run)
+    """
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable:
+                raise RuntimeError(
+                    f'Column "{table.name}"."{column.name}" is missing from the database and is NOT NULL: '
+                    "it has to be added by hand"
+                )
+            statements.append(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=engine.dialect)}'
+            )
+
+    if not dry_run:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    return statements
+
+
+def create_missing_indexes(engine):
+    """Create the indexes declared on the models that an existing database lacks
+    (`create_all` only creates the indexes of the tables it creates).
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    
+
+def migrate_uuid_columns(engine, dry_run: bool = False):
+    """Convert the id and foreign key columns of an existing Postgres database from text
+    to the native `uuid` type (16 bytes instead of 37, in the tables and their indexes).
+
+    The foreign keys are dropped, the columns converted, then the foreign keys are
+    recreated, in one transaction. Existing ids are kept: the random (v4) ids of old
+    rows remain valid, new rows get time-ordered (v7) ids. Other databases store the
+    ids as text, they have nothing to migrate.
+
+    Returns:
+        List[str]: the SQL statements (executed unless dry_run)
+    """
+    from sqlalchemy import inspect
+
+    from .ids import GUID
+
+    if engine.dialect.name != "postgresql":
+        return []
+
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    columns = {
+        (table.name, column.name)
+        for table in Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, GUID) and table.name in existing
+    }
+    to_convert = sorted(
+        (table, column["name"])
+        for table in {table for table, _ in columns}
+        for column in inspector.get_columns(table)
+        if (table, column["name"]) in columns and str(column["type"]).upper() != "UUID"
+    )
+    if not to_convert:
+        return []
+
+    foreign_keys = [
+        (table, fk)
+        for table in sorted({table for table, _ in columns})
+        for fk in inspector.get_foreign_keys(table)
+        if any((table, name) in columns for name in fk["constrained_columns"])
+    ]
+    statements = [f'ALTER TABLE "{table}" DROP CONSTRAINT "{fk["name"]}"' for table, fk in foreign_keys]
+    statements += [
+        f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE uuid USING "{column}"::uuid'
+        for table, column in to_convert
+    ]
+    for table, fk in foreign_keys:
+        ondelete = fk.get("options", {}).get("ondelete")
+        statements.append(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{fk["name"]}" '
+            f'FOREIGN KEY ({", ".join(fk["constrained_columns"])}) '
+            f'REFERENCES "{fk["referred_table"]}" ({", ".join(fk["referred_columns"])})'
+            + (f" ON DELETE {ondelete}" if ondelete else "")
+        )
+
+    if not dry_run:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    return statements
+
+
+def migrate_compressed_columns(engine, dry_run: bool = False):
+    """Convert the compressed text columns (`CompressedText`) of an existing Postgres
+    database from text to `bytea`. The rows keep their plain text (as UTF-8 bytes),
+    read unchanged until they are rewritten compressed. The columns are also stored
+    EXTERNAL: their values are already compressed, TOAST should not try again.
+    SQLite stores the compressed values in the former text columns as they are.
+
+    Returns:
+        List[str]: the SQL statements (executed unless dry_run)
+    """
+    from sqlalchemy import inspect
+
+    from .compression import CompressedText
+
+    if engine.dialect.name != "postgresql":
+        return []
+
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    statements = []
+    with engine.connect() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            types = {column["name"]: str(column["type"]).upper() for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if not isinstance(column.type, CompressedText) or column.name not in types:
+                    continue
+                if types[column.name] != "BYTEA":
+                    statements.append(
+                        f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" '
+                        f'TYPE bytea USING convert_to("{column.name}", \'UTF8\')'
+                    )
+                storage = connection.execute(
+                    text("SELECT attstorage FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) "
+                         "AND attname = :column"),
+                    {"table": table.name, "column": column.name},
+                ).scalar()
+                if storage != "e":
+                    statements.append(f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" SET STORAGE EXTERNAL')
+
+    if not dry_run:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    return statements
@@ -1,14 +1,16 @@
-import uuid
 import enum
+from typing import Optional
 
-from sqlalchemy import Column, Text, Boolean, DateTime as DateTimeType, ForeignKey, Enum, JSON, Float, Integer
-from datetime import datetime
+from sqlalchemy import Column, Text, Boolean, DateTime as DateTimeType, ForeignKey, Enum, JSON, Float, Integer, Index, LargeBinary
+from datetime import datetime, timezone
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy.orm import relationship, Mapped, mapped_column, deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
+from .compression import CompressedText
 from .db import Base
+from .ids import GUID, new_id
 
 
 # Enum for the type of questions
@@ -17,12 +19,17 @@ class QuestionType(str, enum.Enum):
     open_question = "open_question"
 
 
+def _utcnow() -> datetime:
+    # naive UTC, set client-side (also compared in Python by the workers: stale job detection)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 # Users Table
 class User(Base, UserMixin):
     __tablename__ = "users"
 
     # Primary key
-    id: Mapped[str] = mapped_column(Text, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
 
     # Other keys
     username: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
@@ -44,17 +51,24 @@ class User(Base, UserMixin):
 # Document Table
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # documents and results pages: the documents of a user, most recent first
+        Index("ix_documents_user_id_created_at", "user_id", "created_at"),
+    )
 
     # Primary key
-    id: Mapped[str] = mapped_column(Text, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
 
     # Other keys
     title = Column(Text, nullable=False)
-    content = Column(Text, nullable=False)
+    # extracted markdown, stored compressed; only loaded (and decompressed) when accessed
+    content = deferred(Column(CompressedText, nullable=False))
+    # SHA-256 of the uploaded bytes, used to reuse the extraction of identical files
+    content_hash = Column(Text, nullable=True, index=True)
     created_at = Column(DateTimeType, server_default=func.now())
 
     # Foreign Keys
-    user_id = Column(Text, ForeignKey("users.id"), nullable=True)
+    user_id = Column(GUID, ForeignKey("users.id"), nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="documents")
@@ -64,18 +78,31 @@ class Document(Base):
 # Question Table
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # generation, quiz pages, deduplication and grounding: the questions of a document
+        Index("ix_questions_document_id", "document_id"),
+    )
 
     # Primary key
-    id: Mapped[str] = mapped_column(Text, primary_key=True, default= lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
 
     # Other keys
     type: Mapped[QuestionType] = mapped_column(Enum(QuestionType), nullable=False)
     question: Mapped[str] = mapped_column(Text, nullable=False)
     choices = Column(JSON, nullable=True)
-    answer = Column(Text, nullable=True)
+    answer: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # MinHash of the question and its choices (app/core/dedupe.py), computed on first use if NULL
+    signature: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    # Passage of Document.content supporting the question (app/core/grounding.py):
+    # character span and score (0-1), located on first use if NULL
+    source_start: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    source_end: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    source_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # NULL for the questions generated before the column existed (older than the others)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTimeType, nullable=True, default=_utcnow)
 
     # Foreign Keys
-    document_id = Column(Text, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(GUID, ForeignKey("documents.id"), nullable=False)
 
     # Relationships
     document = relationship("Document", back_populates="questions")
@@ -85,9 +112,14 @@ class Question(Base):
 # Result Table
 class Result(Base):
     __tablename__ = "results"
-    
+    __table_args__ = (
+        # cascades from a question or a quiz session to its results
+        Index("ix_results_question_id", "question_id"),
+        Index("ix_results_quiz_session_id", "quiz_session_id"),
+    )
+
     # Primary key
-    id: Mapped[str] = mapped_column(Text, primary_key=True, default= lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
 
     # Other keys
     user_answer = Column(Text, nullable=False)
@@ -96,9 +128,9 @@ class Result(Base):
     reviewed_at = Column(DateTimeType, server_default=func.now())
 
     # Foreign Keys
-    question_id = Column(Text, ForeignKey("questions.id"), nullable=False)
-    user_id = Column(Text, ForeignKey("users.id"), nullable=True)
-    quiz_session_id = Column(Text, ForeignKey("quiz_sessions.id"), nullable=True)
+    question_id = Column(GUID, ForeignKey("questions.id"), nullable=False)
+    user_id = Column(GUID, ForeignKey("users.id"), nullable=True)
+    quiz_session_id = Column(GUID, ForeignKey("quiz_sessions.id"), nullable=True)
 
     # Relationships
     question = relationship("Question", back_populates="results")
@@ -108,9 +140,13 @@ class Result(Base):
 # QuizSession Table
 class QuizSession(Base):
     __tablename__ = "quiz_sessions"
+    __table_args__ = (
+        # results chart: the sessions of a user on a document, in chronological order
+        Index("ix_quiz_sessions_user_id_document_id_played_at", "user_id", "document_id", "played_at"),
+    )
 
     # Primary key
-    id: Mapped[str] = mapped_column(Text, primary_key=True, default= lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
 
     # Other keys
     score = Column(Float, nullable=False)
@@ -118,10 +154,94 @@ class QuizSession(Base):
     played_at = Column(DateTimeType, server_default=func.now())
 
     # Foreign Keys
-    user_id = Column(Text, ForeignKey("users.id"), nullable=True)
-    document_id = Column(Text, ForeignKey("documents.id"), nullable=False)
+    user_id = Column(GUID, ForeignKey("users.id"), nullable=True)
+    document_id = Column(GUID, ForeignKey("documents.id"), nullable=False)
 
     # Relationships
     user = relationship("User", back_populates="quiz_sessions")
     document = relationship("Document")
-    results = relationship("Result", back_populates="quiz_session", cascade="all, delete-orphan") 
\ No newline at end of file
+    results = relationship("Result", back_populates="quiz_session", cascade="all, delete-orphan") 
+
+# Enum for the state of a background job
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+# Job Table (background work queue, see app/core/jobs.py)
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    # Primary key
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
+
+    # Other keys
+    kind: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), nullable=False, default=JobStatus.queued)
+    payload: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    progress: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    locked_by: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Set while the job is queued or running ("generate_quiz:<document_id>"), cleared when it
+    # finishes: the unique constraint allows a single in-flight job per key across workers
+    active_key: Mapped[Optional[str]] = mapped_column(Text, nullable=True, unique=True)
+    created_at: Mapped[datetime] = mapped_column(DateTimeType, nullable=False, default=_utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTimeType, nullable=True)
+    # Refreshed while the job runs: a running job without a recent heartbeat is stale
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTimeType, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTimeType, nullable=True)
+
+    # Foreign Keys
+    user_id = Column(GUID, ForeignKey("users.id"), nullable=True)
+
+
+# Enum for the outcome of an LLM call
+class LLMCallOutcome(str, enum.Enum):
+    ok = "ok"
+    empty = "empty"  # no text returned
+    invalid = "invalid"  # the response is not a valid question list
+    error = "error"  # failed, retries included
+    cancelled = "cancelled"  # stream closed by the reader before its end
+
+
+# LLMCall Table (one row per LLM call, see app/core/telemetry.py)
+class LLMCall(Base):
+    __tablename__ = "llm_calls"
+    __table_args__ = (
+        Index("ix_llm_calls_created_at", "created_at"),
+    )
+
+    # Primary key
+    id: Mapped[str] = mapped_column(GUID, primary_key=True, default=new_id)
+
+    # Other keys
+    provider: Mapped[str] = mapped_column(Text, nullable=False)
+    model: Mapped[str] = mapped_column(Text, nullable=False)
+    # "generate" (whole response) or "stream"
+    mode: Mapped[str] = mapped_column(Text, nullable=False)
+    outcome: Mapped[LLMCallOutcome] = mapped_column(Enum(LLMCallOutcome), nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    # time to the first piece of a stream
+    first_token_ms: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    input_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    output_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    # True when the API did not report the token counts (approximated from the text)
+    tokens_estimated: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # estimated, in USD (NULL for a model without known prices)
+    cost: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    prompt_chars: Mapped[int] = mapped_column(Integer, nullable=False)
+    document_chars: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    nb_requested: Mapped[int] = mapped_column(Integer, nullable=False)
+    nb_questions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # LLM calls in flight in the process when this one started (itself included)
+    concurrency: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    created_at: Mapped[datetime] = mapped_column(DateTimeType, nullable=False, default=_utcnow)
@@ -1,17 +1,24 @@
+import io
 import os
-import uuid
-from flask import Blueprint, request, jsonify
+import zipfile
+from flask import Blueprint, request, jsonify, send_file
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 
 from ..db import LocalSession
-from ..models import Document
-from ..core.extraction import extract_text_from_file
+from ..ids import new_id
+from ..models import Document, Question
+from ..core.extraction import DocumentTooLargeError, hash_upload, spool_and_hash
+from ..core.engine import ExtractionTimeoutError, extraction_engine
+from ..core.grounding import GroundingIndex, coverage, grounding_of
+from ..core.storage import get_blob_store
 
 bp = Blueprint("documents", __name__, url_prefix="/api/documents")
 
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Maximum number of files accepted by one batch upload (zip entries included)
+MAX_BATCH_FILES = 100
+# Maximum total size of the files of one batch, once zip entries are uncompressed
+MAX_BATCH_BYTES = 200 * 1024 * 1024
 
 
 @bp.route("/upload", methods=["POST"])
@@ -26,13 +33,34 @@ def upload_document():
         return jsonify({"error": "No file sent"}), 400
     filename = secure_filename(file.filename)
 
-    # Step 2: Save file
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(file_path)
+    # Step 2: Hash the upload where werkzeug has spooled it (no copy)
+    try:
+        buffer, content_hash = hash_upload(file.stream, max_size=extraction_engine.max_input_size)
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
 
-    # Step 3: extract text
+    # Step 3: reuse the markdown of an identical upload, otherwise extract text
+    #         in the extraction process pool
     try:
-        content = extract_text_from_file(file_path)
+        with buffer:
+            with LocalSession() as session:
+                cached = (
+                    session.query(Document.content)
+                    .filter_by(content_hash=content_hash)
+                    .first()
+                )
+            if cached is not None:
+                content = cached.content
+            else:
+                content = extraction_engine.extract(buffer.read(), filename=filename, mimetype=file.mimetype)
+
+            # keep the original file, stored once per content hash
+            store = get_blob_store()
+            if store is not None:
+                buffer.seek(0)
+                store.put(content_hash, buffer)
+    except ExtractionTimeoutError as e:
+        return jsonify({"error": f"Could not extract text: {str(e)}"}), 504
     except Exception as e:
         return jsonify({"error": f"Could not extract text: {str(e)}"}), 500
 
@@ -40,9 +68,10 @@ def upload_document():
     try:
         with LocalSession() as session:
             document = Document(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 title=filename,
                 content=content,
+                content_hash=content_hash,
                 user_id=current_user.id,
             )
             session.add(document)
@@ -58,6 +87,185 @@ def upload_document():
         return jsonify({"error": f"Database error: {str(e)}"}), 500
 
 
+def _iter_batch_files(files):
+    """Yield (filename, stream, spool) for every uploaded file, expanding zip archives.
+    The zip entries are closed once iterated: `spool` tells they must be copied.
+    """
+    for file in files:
+        if os.path.splitext(file.filename or "")[1].lower() != ".zip":
+            yield file.filename, file.stream, False
+            continue
+        with zipfile.ZipFile(file.stream) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                    continue
+                with archive.open(info) as entry:
+                    yield name, entry, True
+
+
+def _close_buffers(items):
+    for item in items:
+        if "buffer" in item:
+            item["buffer"].close()
+
+
+@bp.route("/upload/batch", methods=["POST"])
+@login_required
+def upload_documents_batch():
+    """Upload several files (or zip archives of files) at once.
+       Files are extracted in parallel, all the documents are saved in one transaction
+       and the status of every file is returned.
+    """
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No file sent"}), 400
+
+    # Step 1: hash every file (zip entries spooled first), within the count and
+    #         total size limits of a batch (a small zip can expand to gigabytes)
+    items = []
+    error = None
+    remaining = MAX_BATCH_BYTES
+    try:
+        for name, stream, spool in _iter_batch_files(files):
+            if len(items) >= MAX_BATCH_FILES:
+                error = jsonify({"error": f"Too many files (maximum {MAX_BATCH_FILES})"}), 413
+                break
+            item = {"title": secure_filename(name), "status": "error"}
+            try:
+                item["buffer"], item["content_hash"] = (spool_and_hash if spool else hash_upload)(
+                    stream, max_size=min(extraction_engine.max_input_size, remaining)
+                )
+            except DocumentTooLargeError as e:
+                if remaining < extraction_engine.max_input_size:
+                    error = jsonify({"error": f"Batch too large (maximum {MAX_BATCH_BYTES} bytes)"}), 413
+                    break
+                item["error"] = str(e)
+            else:
+                remaining -= item["buffer"].seek(0, os.SEEK_END)
+                item["buffer"].seek(0)
+            items.append(item)
+    except zipfile.BadZipFile as e:
+        error = jsonify({"error": f"Invalid zip archive: {str(e)}"}), 400
+    except BaseException:
+        _close_buffers(items)
+        raise
+    if error is not None:
+        _close_buffers(items)
+        return error
+
+    try:
+        # Step 2: reuse known extractions, submit the others to the process pool in parallel
+        hashes = {item["content_hash"] for item in items if "content_hash" in item}
+        with LocalSession() as session:
+            contents = dict(
+                session.query(Document.content_hash, Document.content)
+                .filter(Document.content_hash.in_(hashes))
+                .all()
+            ) if hashes else {}
+        futures = {}
+        for item in items:
+            content_hash = item.get("content_hash")
+            if content_hash is None or content_hash in contents or content_hash in futures:
+                continue
+            futures[content_hash] = extraction_engine.submit(item["buffer"].read(), filename=item["title"])
+
+        # Step 3: collect the extractions and keep the original files
+        store = get_blob_store()
+        for item in items:
+            content_hash = item.get("content_hash")
+            if content_hash is None:
+                continue
+            try:
+                if content_hash not in contents:
+                    contents[content_hash] = extraction_engine.result(futures[content_hash])
+                if store is not None:
+                    item["buffer"].seek(0)
+                    store.put(content_hash, item["buffer"])
+                item["status"] = "ok"
+            except Exception as e:
+                futures.pop(content_hash, None)
+                item["error"] = f"Could not extract text: {str(e)}"
+    finally:
+        _close_buffers(items)
+
+    # Step 4: save every extracted document in a single transaction
+    try:
+        with LocalSession() as session:
+            documents = []
+            for item in items:
+                if item["status"] != "ok":
+                    continue
+                document = Document(
+                    id=new_id(),
+                    title=item["title"],
+                    content=contents[item["content_hash"]],
+                    content_hash=item["content_hash"],
+                    user_id=current_user.id,
+                )
+                item["document_id"] = document.id
+                documents.append(document)
+            session.add_all(documents)
+            session.commit()
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    results = [
+        {key: item[key] for key in ("title", "status", "document_id", "error") if key in item}
+        for item in items
+    ]
+    nb_saved = sum(1 for item in items if item["status"] == "ok")
+    return jsonify({
+        "message": f"{nb_saved}/{len(items)} documents loaded successfully",
+        "documents": results,
+    }), 201 if nb_saved else 422
+
+
+@bp.route("/<string:document_id>/file", methods=["GET"])
+@login_required
+def download_document(document_id):
+    """Download the original uploaded file from the blob store"""
+    with LocalSession() as session:
+        document = session.get(Document, document_id)
+        if not document:
+            return jsonify({"error": "Not found"}), 404
+        if current_user.id != document.user_id:
+            return jsonify({"error": "Not authorized"}), 403
+        title, content_hash = document.title, document.content_hash
+
+    store = get_blob_store()
+    if store is None or not content_hash:
+        return jsonify({"error": "Original file not stored"}), 404
+    try:
+        data = store.get(content_hash)
+    except KeyError:
+        return jsonify({"error": "Original file not stored"}), 404
+    return send_file(io.BytesIO(data), download_name=title, as_attachment=True)
+
+
+@bp.route("/<string:document_id>/coverage", methods=["GET"])
+@login_required
+def document_coverage(document_id):
+    """Coverage of the sections of a document by its questions, and the questions
+       without support in the text
+    """
+    with LocalSession() as session:
+        document = session.get(Document, document_id)
+        if not document:
+            return jsonify({"error": "Not found"}), 404
+        if current_user.id != document.user_id:
+            return jsonify({"error": "Not authorized"}), 403
+
+        # the passages of the questions generated before grounding are located on the fly,
+        # they are stored by the next top-up of the document (read-only endpoint)
+        sources = GroundingIndex(document.content)
+        questions = session.query(Question).filter_by(document_id=document_id).order_by(Question.id).all()
+        summary = coverage(document.content, [(question.id, grounding_of(question, sources)) for question in questions])
+
+    summary["document_id"] = document_id
+    return jsonify(summary), 200
+
+
 @bp.route("/<string:document_id>", methods=["DELETE"])
 @login_required
 def delete_document(document_id):
@@ -1,19 +1,171 @@
-import uuid
-from flask import Blueprint, request, jsonify
-from flask_login import login_required
+import json
+import time
+from typing import Optional
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from flask_login import login_required, current_user
 from ..db import LocalSession
-from ..models import Document, Question, QuestionType
-from ..core.llm import generate_mcq
+from ..ids import new_id
+from ..models import Document, Job, JobStatus, Question, QuestionType
+from ..core.dedupe import MinHashIndex, encode_signature, load_index, question_signature
+from ..core.grounding import GroundingIndex, ensure_grounding, uncovered_text
+from ..core.bulk import insert_objects
+from ..core.llm import generate_mcq, stream_mcq
+from ..core.jobs import JobError, enqueue_once, fail_if_stale, get_active, job_handler, run_job, set_progress
 
 bp = Blueprint("quizzes", __name__, url_prefix="/api/quizzes")
 
+# Number of MCQs generated per document (and default size of a top-up)
+NB_QUESTIONS = 10
+# Maximum number of questions of a single top-up (`count` parameter)
+MAX_TOPUP_QUESTIONS = 50
+
+# Interval between two checks of a generation followed by another request, in seconds
+FOLLOW_POLL_INTERVAL = 1.0
+# A stream stops following a generation after this many seconds (the job goes on)
+FOLLOW_MAX_SECONDS = 15 * 60
+
+
+def _generation_key(document_id: str) -> str:
+    """Active key of the generation jobs of a document: one in flight at a time."""
+    return f"generate_quiz:{document_id}"
+
+
+def _generation_args():
+    """Read the `mode` (`topup` appends questions to a generated document) and `count`
+    query parameters. Returns (topup, nb_questions, error message).
+    """
+    topup = request.args.get("mode") == "topup"
+    count = request.args.get("count", str(NB_QUESTIONS))
+    if not count.isdigit() or not 1 <= int(count) <= MAX_TOPUP_QUESTIONS:
+        return topup, 0, f"Parameter 'count' must be between 1 and {MAX_TOPUP_QUESTIONS}"
+    return topup, int(count), None
+
+
+def _new_question(index: MinHashIndex, sources: GroundingIndex, q: dict, document_id: str) -> Optional[Question]:
+    """Build the Question of a generated MCQ, or None if it is a near-duplicate of a
+    question of the document (`index`, updated with the new question). Its source
+    passage is located in the document text (`sources`).
+    """
+    question = Question(
+        id=new_id(),
+        type=QuestionType.qcm,
+        document_id=document_id,
+        question=q.get("question", "") or "",
+        choices=q.get("answers"),
+        answer=q.get("correct_answer"),
+    )
+    signature = question_signature(question.question, question.choices)
+    if index.add_if_new(question.id, signature) is not None:
+        return None
+    question.signature = encode_signature(signature)
+    ensure_grounding(question, sources)
+    return question
+
+
+def _initial_status() -> JobStatus:
+    """Status of a new generation job: with JOBS_EAGER the request runs it itself, so it
+    starts `running` (a worker does not claim it, and its heartbeat is watched).
+    """
+    return JobStatus.running if current_app.config.get("JOBS_EAGER") else JobStatus.queued
+
+
+def _existing_questions(session, document_id: str):
+    """Questions already generated for a document, oldest first. The questions generated
+    before `created_at` existed have none and come first (their ids are not time-ordered).
+    """
+    return (
+        session.query(Question)
+        .filter_by(document_id=document_id)
+        .order_by(Question.created_at.asc().nulls_first(), Question.id)
+        .all()
+    )
+
+
+def _generation_text(sources: GroundingIndex, existing) -> str:
+    """Text given to the model: the whole document, or for a top-up the sections that
+    no existing question is grounded in (the whole document once all are covered).
+    """
+    if not existing:
+        return sources.text
+    return uncovered_text(sources.text, [ensure_grounding(question, sources) for question in existing])
+
+
+def _save_streamed_questions(session, job, index: MinHashIndex, sources: GroundingIndex, text: str,
+                             nb_questions: int, existing) -> int:
+    """Stream the generation of a job, saving each question as soon as the model has
+    produced it: /generate/stream followers send it right away. Returns the number saved.
+    """
+    document_id = job.payload["document_id"]
+    nb_saved = 0
+    try:
+        for q in stream_mcq(text, nb_questions=nb_questions, existing=existing):
+            question = _new_question(index, sources, q, document_id)
+            if question is None:
+                continue
+            session.add(question)
+            nb_saved += 1
+            set_progress(session, job, 10 + 80 * nb_saved // nb_questions)  # commits the question
+    except Exception as e:
+        if not nb_saved:
+            raise
+        # the questions already saved (and sent) are kept: no retry on top of them
+        raise JobError(f"Generation interrupted after {nb_saved} questions: {e}")
+    return nb_saved
+
+
+@job_handler("generate_quiz")
+def generate_quiz_job(session, job):
+    """Generate the MCQs of a document (runs in the job worker)."""
+    document = session.get(Document, job.payload["document_id"])
+    if not document:
+        raise JobError("Document not found")
+
+    existing = _existing_questions(session, document.id)
+    if existing and not job.payload.get("topup"):
+        raise JobError("Already generated MCQs for this document.")
+
+    sources = GroundingIndex(document.content)
+    set_progress(session, job, 10)
+    text = _generation_text(sources, existing)
+    nb_questions = job.payload.get("nb_questions", NB_QUESTIONS)
+    existing_texts = [question.question for question in existing] or None
+    index = load_index(session, document.id)
+    if job.payload.get("stream"):
+        nb_saved = _save_streamed_questions(session, job, index, sources, text, nb_questions, existing_texts)
+    else:
+        questions = generate_mcq(
+            text,
+            nb_questions=nb_questions,
+            progress=lambda done, total: set_progress(session, job, 10 + 80 * done // total),
+            existing=existing_texts,
+        )
+        new_questions = [
+            question for question in (_new_question(index, sources, q, document.id) for q in questions) if question
+        ]
+        insert_objects(session, new_questions)
+        nb_saved = len(new_questions)
+    if not nb_saved:
+        raise JobError("No new question has been generated" if existing else "No question has been generated")
+
+    result = {"nb_questions": nb_saved}
+    if existing:
+        result["topup"] = True
+    return result
+
 
 @bp.route("/generate", methods=["POST"])
 @login_required
 def generate_quiz():
+    """Queue the generation of the MCQs of a document and return the job id.
+       With JOBS_EAGER (dev / tests), the job runs in the request instead.
+       With `mode=topup`, `count` new questions are appended to a generated document.
+    """
     document_id = request.args.get("document_id")
     if not document_id:
         return jsonify({"error": "Parameter 'document_id' required!"}), 400
+    topup, nb_questions, error = _generation_args()
+    if error:
+        return jsonify({"error": error}), 400
 
     session = LocalSession()
     try:
@@ -21,31 +173,180 @@ def generate_quiz():
         if not document:
             return jsonify({"error": "Document not found"}), 404
 
-        existing = session.query(Question).filter_by(document_id=document_id).first()
-        if existing:
-            return jsonify({"error": "Already generated MCQs for this document."}), 409
-
-        # call with correct kwarg name
-        questions = generate_mcq(document.content, nb_questions=10)
-        if not questions:
-            return jsonify({"error": "No question has been generated"}), 500
-
-        for q in questions:
-            question = Question(
-                id=str(uuid.uuid4()),
-                type=QuestionType.qcm,
-                document_id=document.id,
-                question=q.get("question", "") or "",
-                choices=q.get("answers"),
-                answer=q.get("correct_answer"),
+        job = get_active(session, _generation_key(document_id))
+        created = False
+        if job is None:
+            existing = session.query(Question).filter_by(document_id=document_id).first()
+            if existing and not topup:
+                return jsonify({"error": "Already generated MCQs for this document."}), 409
+
+            job, created = enqueue_once(
+                session,
+                "generate_quiz",
+                _generation_key(document.id),
+                {"document_id": document.id, "nb_questions": nb_questions, "topup": topup},
+                user_id=current_user.id,
+                status=_initial_status(),
             )
-            session.add(question)
-        session.commit()
-        return jsonify({"message": f"{len(questions)} MCQs generated"}), 201
+
+        if not created:
+            # another request is generating this document: attach to its job
+            return jsonify({
+                "message": "Quiz generation already in progress",
+                "job_id": job.id,
+                "status": job.status.value,
+                "status_url": url_for("quizzes.job_status", job_id=job.id),
+            }), 202
+
+        if not current_app.config.get("JOBS_EAGER"):
+            return jsonify({
+                "message": "Quiz generation queued",
+                "job_id": job.id,
+                "status": job.status.value,
+                "status_url": url_for("quizzes.job_status", job_id=job.id),
+            }), 202
+
+        job = run_job(session, job, retry=False)
+        if job.status != JobStatus.succeeded:
+            return jsonify({"error": job.error, "job_id": job.id}), 500
+        verb = "added" if job.result.get("topup") else "generated"
+        return jsonify({
+            "message": f"{job.result['nb_questions']} MCQs {verb}",
+            "job_id": job.id,
+        }), 201
 
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
 
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _question_event(question: Question, index: int, total: int) -> str:
+    return _sse("question", {
+        "index": index,
+        "total": total,
+        "id": question.id,
+        "question": question.question,
+        "choices": question.choices,
+    })
+
+
+def _follow_generation(job_id: str, document_id: str, run_eagerly: bool = False):
+    """Send the questions of a generation job as they are saved, until the job finishes.
+    For a top-up, only the questions saved after attaching are sent. With `run_eagerly`
+    (JOBS_EAGER, dev / tests), the job is run here first instead of by the worker.
+    A running job without heartbeat is failed (its document is released), and the stream
+    gives up after FOLLOW_MAX_SECONDS.
+    """
+    deadline = time.monotonic() + FOLLOW_MAX_SECONDS
+    sent = set()
+    with LocalSession() as session:
+        job = session.get(Job, job_id)
+        payload = (job.payload if job else None) or {}
+        total = payload.get("nb_questions", NB_QUESTIONS)
+        verb = "added" if payload.get("topup") else "generated"
+        previous = set()
+        if payload.get("topup"):
+            previous = {id for (id,) in session.query(Question.id).filter_by(document_id=document_id)}
+        if run_eagerly and job is not None:
+            run_job(session, job, retry=False)
+        while True:
+            job = session.get(Job, job_id, populate_existing=True)
+            for question in session.query(Question).filter_by(document_id=document_id).order_by(Question.id):
+                if question.id not in sent and question.id not in previous:
+                    sent.add(question.id)
+                    yield _question_event(question, len(sent), total)
+
+            if job is None or job.status in (JobStatus.succeeded, JobStatus.failed):
+                if job is not None and job.status == JobStatus.succeeded and sent:
+                    yield _sse("done", {"message": f"{len(sent)} MCQs {verb}", "nb_questions": len(sent)})
+                else:
+                    error = (job.error if job else None) or "No question has been generated"
+                    yield _sse("error", {"error": error, "nb_questions": len(sent)})
+                return
+
+            session.rollback()  # end the read transaction: the next check sees the new rows
+            if fail_if_stale(session, job_id):
+                continue  # reported as failed by the next check
+            if time.monotonic() > deadline:
+                yield _sse("error", {
+                    "error": "Generation still in progress, check its status later",
+                    "nb_questions": len(sent),
+                    "job_id": job_id,
+                    "status_url": url_for("quizzes.job_status", job_id=job_id),
+                })
+                return
+            time.sleep(FOLLOW_POLL_INTERVAL)
+
+
+@bp.route("/generate/stream", methods=["GET"])
+@login_required
+def generate_quiz_stream():
+    """Stream the MCQs of a document as Server-Sent Events while the job worker generates them.
+
+    The generation is queued like with /generate (or the stream attaches to the one in
+    progress), and the worker saves each question as soon as the model has produced it.
+    The stream sends every saved question as a `question` event and ends with a `done`
+    event (or an `error` event). Accepts the same `mode=topup` and `count` parameters.
+    """
+    document_id = request.args.get("document_id")
+    if not document_id:
+        return jsonify({"error": "Parameter 'document_id' required!"}), 400
+    topup, nb_questions, error = _generation_args()
+    if error:
+        return jsonify({"error": error}), 400
+
+    with LocalSession() as session:
+        document = session.get(Document, document_id)
+        if not document:
+            return jsonify({"error": "Document not found"}), 404
+
+        job = get_active(session, _generation_key(document_id))
+        created = False
+        if job is None:
+            existing = session.query(Question).filter_by(document_id=document_id).first()
+            if existing and not topup:
+                return jsonify({"error": "Already generated MCQs for this document."}), 409
+
+            job, created = enqueue_once(
+                session,
+                "generate_quiz",
+                _generation_key(document_id),
+                {"document_id": document_id, "nb_questions": nb_questions, "topup": topup, "stream": True},
+                user_id=current_user.id,
+                status=_initial_status(),
+            )
+        job_id = job.id
+
+    events = _follow_generation(job_id, document_id, run_eagerly=created and current_app.config.get("JOBS_EAGER"))
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/jobs/<string:job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """Status and progress of a generation job"""
+    with LocalSession() as session:
+        job = session.get(Job, job_id)
+        if not job or job.user_id != current_user.id:
+            return jsonify({"error": "Job not found"}), 404
+
+        return jsonify({
+            "job_id": job.id,
+            "kind": job.kind,
+            "status": job.status.value,
+            "progress": job.progress,
+            "result": job.result,
+            "error": job.error,
+        }), 200
@@ -1,9 +1,10 @@
-import uuid
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user  # type: ignore[import-untyped]
 
 from ..db import LocalSession
+from ..ids import new_id
 from ..models import Result, QuizSession
+from ..core.bulk import insert_rows
 
 bp = Blueprint("results", __name__, url_prefix="/api/results")
 
@@ -24,7 +25,7 @@ def save_results():
     try:
         # create gloabl quiz session
         quiz_session = QuizSession(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=current_user.id,
             document_id=document_id,
             score=score,
@@ -33,23 +34,18 @@ def save_results():
         session.add(quiz_session)
         session.flush()
 
-        # save each result individually
-        for item in answers:
-            question_id = item.get("question_id")
-            user_answer = item.get("user_answer", "")
-            is_correct = item.get("is_correct", False)
-
-            if not question_id:
-                continue
-            
-            result = Result(
-                id=str(uuid.uuid4()),
-                question_id=question_id,
-                user_id= current_user.id,
-                user_answer=user_answer,
-                is_correct=is_correct,
-            )
-            session.add(result)
+        # save the results in one INSERT
+        insert_rows(session, Result, [
+            {
+                "question_id": item["question_id"],
+                "user_id": current_user.id,
+                "quiz_session_id": quiz_session.id,
+                "user_answer": item.get("user_answer", ""),
+                "is_correct": item.get("is_correct", False),
+            }
+            for item in answers
+            if item.get("question_id")
+        ])
         session.commit()
 
         return jsonify({
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, jsonify, request
-from sqlalchemy.orm import joinedload
+from sqlalchemy import func
+from sqlalchemy.orm import defer
 from flask_login import login_required, current_user
 
 from ..db import LocalSession
@@ -7,6 +8,35 @@ from ..models import Document, QuizSession, Question
 
 bp = Blueprint("ui", __name__)
 
+
+def _user_documents(session):
+    """Documents of the current user, newest first, without their extracted text.
+
+    List pages only show titles and dates: `content` (up to hundreds of KB per
+    document) is not selected, and reading it raises instead of lazy-loading.
+    """
+    return (
+        session.query(Document)
+        .options(defer(Document.content, raiseload=True))
+        .filter_by(user_id=current_user.id)
+        .order_by(Document.created_at.desc())
+        .all()
+    )
+
+
+def _question_counts(session, document_ids):
+    """Number of questions of each document, in one grouped query (documents without any are absent)."""
+    if not document_ids:
+        return {}
+    rows = (
+        session.query(Question.document_id, func.count(Question.id))
+        .filter(Question.document_id.in_(document_ids))
+        .group_by(Question.document_id)
+        .all()
+    )
+    return dict(rows)
+
+
 @bp.route("/")
 def home():
     return render_template("home.html")
@@ -15,15 +45,10 @@ def home():
 @login_required
 def show_documents():
     with LocalSession() as session:
-        docs = (
-            session.query(Document)
-            .options(joinedload(Document.questions))
-            .filter_by(user_id=current_user.id)
-            .order_by(Document.created_at.desc())
-            .all()
-        )
+        docs = _user_documents(session)
+        question_counts = _question_counts(session, [doc.id for doc in docs])
 
-        return render_template("documents.html", documents=docs)
+        return render_template("documents.html", documents=docs, question_counts=question_counts)
     
 @bp.route("/upload")
 @login_required
@@ -92,12 +117,7 @@ def show_results():
     """HTML Page for results visualization
     """
     with LocalSession() as session:
-        documents = (
-            session.query(Document)
-            .filter_by(user_id=current_user.id)
-            .order_by(Document.created_at.desc())
-            .all()
-        )
+        documents = _user_documents(session)
     return render_template("results.html", documents=documents)
 
 
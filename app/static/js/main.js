@@ -37,13 +37,21 @@ document.addEventListener("DOMContentLoaded", () => {
       const status = document.getElementById("uploadStatus");
       status.textContent = "📤 Uploading...";
 
+      // Several files or a zip archive go through the batch endpoint
+      const files = formData.getAll("file");
+      const isBatch = files.length > 1 || files.some((f) => f.name.toLowerCase().endsWith(".zip"));
+
       try {
-        const res = await fetch("/api/documents/upload", { method: "POST", body: formData });
+        const url = isBatch ? "/api/documents/upload/batch" : "/api/documents/upload";
+        const res = await fetch(url, { method: "POST", body: formData });
         const data = await res.json();
 
         if (res.ok) {
-          status.textContent = "✅ Document uploaded successfully!";
-          setTimeout(() => (window.location.href = "/documents"), 1000);
+          const failed = (data.documents || []).filter((d) => d.status !== "ok");
+          status.textContent = isBatch
+            ? `✅ ${data.message}` + (failed.length ? ` (failed: ${failed.map((d) => d.title).join(", ")})` : "")
+            : "✅ Document uploaded successfully!";
+          setTimeout(() => (window.location.href = "/documents"), failed.length ? 3000 : 1000);
         } else {
           status.textContent = "❌ " + (data.error || "Upload error.");
         }
@@ -76,55 +84,121 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
+  // --- Background jobs ---
+  async function waitForJob(statusUrl, btn, interval = 2000) {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, interval));
+      const res = await fetch(statusUrl);
+      const job = await res.json();
+      if (!res.ok) return { status: "failed", error: job.error };
+      if (job.status === "succeeded" || job.status === "failed") return job;
+      btn.textContent = `⏳ Generating... ${job.progress}%`;
+    }
+  }
+
   // --- Quiz generation ---
-  const genButtons = document.querySelectorAll("[data-generate]");
-  genButtons.forEach((btn) => {
-    btn.addEventListener("click", async () => {
-      const docId = btn.dataset.generate;
-      btn.disabled = true;
-      const oldText = btn.textContent;
-      btn.textContent = "⏳ Generating...";
+  function markGenerated(docId) {
+    // Update the DOM: swap buttons without page refresh
+    const playDisabledBtn = document.querySelector(`[data-play-disabled="${docId}"]`);
+    const generateBtn = document.querySelector(`[data-generate-btn="${docId}"]`);
+
+    if (playDisabledBtn && generateBtn) {
+      // Create new Play link
+      const playLink = document.createElement("a");
+      playLink.href = `/quizzes/play/${docId}`;
+      playLink.className = "btn btn-green hover:brightness-105";
+      playLink.textContent = "Play";
+
+      // Create new top-up button
+      const topupBtn = document.createElement("button");
+      topupBtn.dataset.topup = docId;
+      topupBtn.className = "btn btn-yellow hover:brightness-105";
+      topupBtn.title = "Generate more questions";
+      topupBtn.textContent = "+ More";
+      topupBtn.addEventListener("click", () => runGeneration(topupBtn, docId, true));
+
+      // Replace buttons
+      playDisabledBtn.replaceWith(playLink);
+      generateBtn.replaceWith(topupBtn);
+    }
+  }
 
-      try {
-        const res = await fetch(`/api/quizzes/generate?document_id=${docId}`, { method: "POST" });
-        const data = await res.json();
+  // Streamed generation: questions arrive one by one as Server-Sent Events
+  function streamGeneration(query, btn) {
+    return new Promise((resolve) => {
+      const source = new EventSource(`/api/quizzes/generate/stream?${query}`);
+      let nbReceived = 0;
 
-        if (res.ok) {
-          showToast(data.message || "Quiz generated successfully!", "success");
-          
-          // Update the DOM: swap buttons without page refresh
-          const playDisabledBtn = document.querySelector(`[data-play-disabled="${docId}"]`);
-          const generateBtn = document.querySelector(`[data-generate-btn="${docId}"]`);
-          
-          if (playDisabledBtn && generateBtn) {
-            // Create new Play link
-            const playLink = document.createElement("a");
-            playLink.href = `/quizzes/play/${docId}`;
-            playLink.className = "btn btn-green hover:brightness-105";
-            playLink.textContent = "Play";
-            
-            // Create new Generated button
-            const generatedBtn = document.createElement("button");
-            generatedBtn.disabled = true;
-            generatedBtn.className = "btn btn-yellow opacity-60 cursor-not-allowed";
-            generatedBtn.title = "Quiz already generated";
-            generatedBtn.textContent = "Generated";
-            
-            // Replace buttons
-            playDisabledBtn.replaceWith(playLink);
-            generateBtn.replaceWith(generatedBtn);
-          }
-        } else {
-          showToast(data.error || "Error during generation.", "error");
+      source.addEventListener("question", (e) => {
+        const data = JSON.parse(e.data);
+        nbReceived = data.index;
+        btn.textContent = `⏳ ${data.index}/${data.total} questions...`;
+      });
+      source.addEventListener("done", (e) => {
+        source.close();
+        resolve({ ok: true, data: JSON.parse(e.data) });
+      });
+      source.addEventListener("error", (e) => {
+        source.close();
+        // server-sent error event, or connection refused (document missing, already generated ...)
+        const data = e.data ? JSON.parse(e.data) : { error: "Error during generation." };
+        resolve({ ok: false, partial: nbReceived > 0, data });
+      });
+    });
+  }
+
+  // Generate the quiz of a document, or append new questions to it (top-up)
+  async function runGeneration(btn, docId, topup) {
+    btn.disabled = true;
+    const oldText = btn.textContent;
+    btn.textContent = "⏳ Generating...";
+    const query = `document_id=${docId}` + (topup ? "&mode=topup" : "");
+
+    try {
+      let data, ok;
+      if (window.EventSource) {
+        const outcome = await streamGeneration(query, btn);
+        data = outcome.data;
+        ok = outcome.ok;
+        if (!ok && outcome.partial && !topup) markGenerated(docId);
+      } else {
+        const res = await fetch(`/api/quizzes/generate?${query}`, { method: "POST" });
+        data = await res.json();
+        ok = res.ok;
+
+        // Queued generation: poll the job until the worker is done
+        if (res.status === 202) {
+          data = await waitForJob(data.status_url, btn);
+          ok = data.status === "succeeded";
+          if (ok) data.message = `${data.result.nb_questions} MCQs ${data.result.topup ? "added" : "generated"}`;
+        }
+      }
+
+      if (ok) {
+        showToast(data.message || "Quiz generated successfully!", "success");
+        if (topup) {
           btn.textContent = oldText;
           btn.disabled = false;
+        } else {
+          markGenerated(docId);
         }
-      } catch (err) {
-        showToast("Server connection error.", "error");
+      } else {
+        showToast(data.error || "Error during generation.", "error");
         btn.textContent = oldText;
         btn.disabled = false;
       }
-    });
+    } catch (err) {
+      showToast("Server connection error.", "error");
+      btn.textContent = oldText;
+      btn.disabled = false;
+    }
+  }
+
+  document.querySelectorAll("[data-generate]").forEach((btn) => {
+    btn.addEventListener("click", () => runGeneration(btn, btn.dataset.generate, false));
+  });
+  document.querySelectorAll("[data-topup]").forEach((btn) => {
+    btn.addEventListener("click", () => runGeneration(btn, btn.dataset.topup, true));
   });
 
   // --- Strict Quiz Mode: one question at a time ---
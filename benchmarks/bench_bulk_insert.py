@@ -0,0 +1,96 @@
+"""Insert throughput of generated questions and saved results: ORM unit of work vs bulk INSERT.
+
+Usage:
+    uv run python benchmarks/bench_bulk_insert.py [--rows 500] [--batches 20] [--url postgresql://...]
+
+Each batch inserts `--rows` questions (the MCQs of a chunked generation) and as
+many results (a long quiz) in one transaction, with:
+    - orm:  session.add() per object, flushed by the unit of work (former code path)
+    - bulk: app.core.bulk (one executemany INSERT, client-side ids)
+The database is a temporary SQLite file by default; pass a Postgres URL with --url
+to compare both engines.
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.bulk import insert_objects, insert_rows
+from app.db import Base
+from app.models import Document, Question, QuestionType, Result, User
+
+CHOICES = ["Mitochondrie", "Noyau", "Ribosome", "Appareil de Golgi"]
+
+
+def _questions(document_id: str, rows: int):
+    return [
+        Question(id=str(uuid.uuid4()), type=QuestionType.qcm, question=f"Question {i} sur la cellule ?",
+                 choices=CHOICES, answer=CHOICES[0], document_id=document_id)
+        for i in range(rows)
+    ]
+
+
+def _results(user_id: str, question_ids):
+    return [
+        {"question_id": question_id, "user_id": user_id, "user_answer": CHOICES[1], "is_correct": False}
+        for question_id in question_ids
+    ]
+
+
+def orm_batch(session, document_id: str, user_id: str, rows: int):
+    questions = _questions(document_id, rows)
+    for question in questions:
+        session.add(question)
+    for row in _results(user_id, [question.id for question in questions]):
+        session.add(Result(id=str(uuid.uuid4()), **row))
+    session.commit()
+
+
+def bulk_batch(session, document_id: str, user_id: str, rows: int):
+    ids = insert_objects(session, _questions(document_id, rows))
+    insert_rows(session, Result, _results(user_id, ids))
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=500, help="questions (and results) per batch")
+    parser.add_argument("--batches", type=int, default=20, help="timed batches per path")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as session:
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        document = Document(title="Cours", content="...", user_id=user.id)
+        session.add(document)
+        session.commit()
+        user_id, document_id = user.id, document.id
+
+    print(f"{engine.dialect.name}: {args.batches} batches of {args.rows} questions + {args.rows} results\n")
+    print(f"{'path':<8}{'per batch':>12}{'rows/s':>12}")
+    timings = {}
+    for name, batch in (("orm", orm_batch), ("bulk", bulk_batch)):
+        with Session() as session:
+            batch(session, document_id, user_id, args.rows)  # warm-up
+            start = time.perf_counter()
+            for _ in range(args.batches):
+                batch(session, document_id, user_id, args.rows)
+            timings[name] = (time.perf_counter() - start) / args.batches
+        print(f"{name:<8}{timings[name] * 1000:>10.1f}ms{2 * args.rows / timings[name]:>12.0f}")
+    print(f"\nspeedup: {timings['orm'] / timings['bulk']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
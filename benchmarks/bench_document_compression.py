@@ -0,0 +1,148 @@
+"""Storage and read cost of the document texts per compression codec.
+
+Usage:
+    uv run python benchmarks/bench_document_compression.py [--documents 200] [--kb 150] [--corpus DIR]
+
+The texts are generated course-like markdown (headings, paragraphs over a Zipf
+vocabulary, bullet lists, tables) unless --corpus points to a directory of extracted
+.md / .txt files. For each codec the script prints the compression ratio, the
+compression and decompression throughput, then stores every text in a temporary
+SQLite database through `Document.content` and reports the size of the table and
+the time to load all the texts back:
+    - none: former storage (plain text, with the 6-byte header)
+    - zlib-1 / zlib-6 / zlib-9: zlib levels
+    - zlib-6+dict: with a shared dictionary built from the texts (`build_dictionary`)
+    - zstd-3 / zstd-3+dict: when the zstandard package is installed
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, select, text
+
+from app import compression
+from app.compression import TextCodec, build_dictionary, zstandard
+from app.db import Base
+from app.models import Document, User
+
+WORDS = 3000
+# lines found in most extracted courses (page furniture, recurring sections)
+BOILERPLATE = [
+    "Universite de Lorraine - Faculte des Sciences et Technologies",
+    "Licence 2 - Semestre 3 - Annee universitaire 2024-2025",
+    "## Objectifs du chapitre",
+    "## Points cles a retenir",
+    "## Exercices d'application",
+    "Document reserve a l'usage des etudiants inscrits au cours.",
+    "| Terme | Definition |",
+    "|---|---|",
+]
+
+
+def make_courses(count: int, kb: int):
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyzéè") for _ in range(rng.randint(2, 11)))
+                  for _ in range(WORDS)]
+    weights = [1 / (rank + 1) for rank in range(WORDS)]
+
+    def sentence():
+        words = rng.choices(vocabulary, weights, k=rng.randint(8, 25))
+        return " ".join(words).capitalize() + "."
+
+    courses = []
+    for _ in range(count):
+        parts, size, section = ["\n".join(BOILERPLATE[:2])], 0, 0
+        while size < kb * 1024:
+            section += 1
+            block = [f"## {section}. {sentence()[:-1]}", " ".join(sentence() for _ in range(rng.randint(3, 8)))]
+            if section % 3 == 0:
+                block.append(rng.choice(BOILERPLATE[2:5]))
+                block.append("\n".join(f"- {sentence()}" for _ in range(rng.randint(3, 6))))
+            if section % 5 == 0:
+                block.append(BOILERPLATE[5])
+                block.append("\n".join(BOILERPLATE[6:]) + "\n" + "\n".join(
+                    f"| {rng.choice(vocabulary)} | {sentence()} |" for _ in range(rng.randint(3, 8))))
+            parts.append("\n\n".join(block))
+            size += sum(len(part) for part in block)
+        courses.append("\n\n".join(parts))
+    return courses
+
+
+def load_corpus(directory: str):
+    texts = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".md", ".txt")):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                texts.append(f.read())
+    return texts
+
+
+def measure_codec(codec: TextCodec, texts):
+    start = time.perf_counter()
+    values = [codec.compress(course) for course in texts]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for value in values:
+        codec.decompress(value)
+    decompress_time = time.perf_counter() - start
+    return sum(len(value) for value in values), compress_time, decompress_time
+
+
+def measure_database(codec: TextCodec, texts):
+    """Size of the documents table and time to load every text, with `codec` installed."""
+    compression._codec = codec
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": "bench", "username": "bench", "email": "bench@example.com",
+                                           "password_hash": "x"}])
+        connection.execute(insert(Document), [
+            {"title": f"Course {i}", "content": course, "user_id": "bench"} for i, course in enumerate(texts)
+        ])
+        size = connection.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'documents'")).scalar()
+    with engine.connect() as connection:
+        connection.execute(select(Document.content)).fetchall()  # warm-up
+        start = time.perf_counter()
+        connection.execute(select(Document.content)).fetchall()
+        load_time = time.perf_counter() - start
+    engine.dispose()
+    return size, load_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200, help="generated documents")
+    parser.add_argument("--kb", type=int, default=150, help="size of a generated document")
+    parser.add_argument("--corpus", default=None, help="directory of extracted .md / .txt files to use instead")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus) if args.corpus else make_courses(args.documents, args.kb)
+    text_bytes = sum(len(course.encode("utf-8")) for course in texts)
+    dictionary = build_dictionary(texts[:50])
+
+    variants = [
+        ("none", TextCodec(codec="none")),
+        ("zlib-1", TextCodec(level=1)),
+        ("zlib-6", TextCodec(level=6)),
+        ("zlib-9", TextCodec(level=9)),
+        ("zlib-6+dict", TextCodec(level=6, dictionary=dictionary)),
+    ]
+    if zstandard is not None:
+        variants += [
+            ("zstd-3", TextCodec(codec="zstd")),
+            ("zstd-3+dict", TextCodec(codec="zstd", dictionary=dictionary)),
+        ]
+
+    print(f"{len(texts)} documents, {text_bytes / 2**20:.1f} MB of text, {len(dictionary)} byte dictionary\n")
+    print(f"{'codec':<13}{'ratio':>7}{'comp MB/s':>11}{'decomp MB/s':>13}{'table MB':>10}{'load all':>11}")
+    for name, codec in variants:
+        stored, compress_time, decompress_time = measure_codec(codec, texts)
+        table_size, load_time = measure_database(codec, texts)
+        print(f"{name:<13}{text_bytes / stored:>7.2f}{text_bytes / 2**20 / compress_time:>11.0f}"
+              f"{text_bytes / 2**20 / decompress_time:>13.0f}{table_size / 2**20:>10.1f}{load_time * 1000:>9.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Extraction throughput per format: format dispatch (fast paths) vs plain MarkItDown.
+
+Usage:
+    uv run python benchmarks/bench_extraction.py [--pages 50] [--repeat 3]
+
+Sample documents are generated on the fly (reportlab / python-docx), nothing is
+written to disk. For each format, the script prints the mean time per document
+and the throughput (input KB/s) of both paths.
+"""
+import argparse
+import io
+import time
+
+from app.core.extraction import extract_text_from_file
+
+PARAGRAPH = (
+    "La photosynthese est le processus par lequel les plantes convertissent "
+    "l'energie lumineuse en energie chimique. "
+) * 4
+
+
+def make_txt(pages: int) -> bytes:
+    return "\n\n".join(PARAGRAPH for _ in range(pages * 5)).encode()
+
+
+def make_md(pages: int) -> bytes:
+    return "\n\n".join(f"## Section {i}\n\n{PARAGRAPH}" for i in range(pages * 5)).encode()
+
+
+def make_pdf(pages: int) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for page in range(pages):
+        text = c.beginText(40, 800)
+        for line in range(45):
+            text.textLine(f"Page {page} ligne {line} : {PARAGRAPH[:80]}")
+        c.drawText(text)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def make_docx(pages: int) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    for i in range(pages * 5):
+        doc.add_heading(f"Section {i}", level=2)
+        doc.add_paragraph(PARAGRAPH)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+FORMATS = {
+    "notes.txt": make_txt,
+    "notes.md": make_md,
+    "course.pdf": make_pdf,
+    "course.docx": make_docx,
+}
+
+
+def _markitdown(data: bytes, filename: str) -> str:
+    from markitdown import MarkItDown
+
+    return MarkItDown().convert(io.BytesIO(data)).text_content
+
+
+def _dispatch(data: bytes, filename: str) -> str:
+    return extract_text_from_file(io.BytesIO(data), filename=filename)
+
+
+def _time(func, data: bytes, filename: str, repeat: int) -> float:
+    func(data, filename)  # warm-up: imports and converter registry
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(data, filename)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50, help="size of the generated documents")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per format and path")
+    args = parser.parse_args()
+
+    print(f"{'format':<8}{'size':>10}{'markitdown':>14}{'dispatch':>12}{'KB/s before':>14}{'KB/s after':>13}{'speedup':>9}")
+    for filename, make in FORMATS.items():
+        data = make(args.pages)
+        size_kb = len(data) / 1024
+        before = _time(_markitdown, data, filename, args.repeat)
+        after = _time(_dispatch, data, filename, args.repeat)
+        print(
+            f"{filename.rsplit('.', 1)[1]:<8}{len(data) // 1024:>8}KB"
+            f"{before * 1000:>12.1f}ms{after * 1000:>10.1f}ms"
+            f"{size_kb / before:>14.1f}{size_kb / after:>13.1f}{before / after:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Query plans and latency of the hot queries on a large database.
+
+Usage:
+    uv run python benchmarks/bench_query_plans.py [--results 2000000] [--url sqlite:///bench.db] [--compare]
+
+The database (a temporary SQLite file by default, or any DATABASE_URL such as
+postgresql://...) is seeded with users, documents, questions, quiz sessions and
+`--results` results. Each hot query of the pages is then explained and timed:
+the script exits with status 1 if a query plan scans a table or sorts instead of
+walking an index. With `--compare`, the secondary indexes are dropped and the
+queries timed again, to show the linear growth they prevent.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import defer
+
+from app.db import Base
+from app.models import Document, Question, QuestionType, QuizSession, Result, User
+
+BATCH_SIZE = 10_000
+
+# name -> (statement builder, index expected in its plan)
+HOT_QUERIES = {
+    "documents page": (
+        lambda ids: select(Document).options(defer(Document.content))
+        .where(Document.user_id == ids["user"]).order_by(Document.created_at.desc()),
+        "ix_documents_user_id_created_at",
+    ),
+    "question counts": (
+        lambda ids: select(Question.document_id, func.count(Question.id))
+        .where(Question.document_id.in_([ids["document"]])).group_by(Question.document_id),
+        "ix_questions_document_id",
+    ),
+    "quiz questions": (
+        lambda ids: select(Question).where(Question.document_id == ids["document"]),
+        "ix_questions_document_id",
+    ),
+    "results chart": (
+        lambda ids: select(QuizSession)
+        .where(QuizSession.user_id == ids["user"], QuizSession.document_id == ids["document"])
+        .order_by(QuizSession.played_at.asc()),
+        "ix_quiz_sessions_user_id_document_id_played_at",
+    ),
+    "results of a question": (
+        lambda ids: select(Result).where(Result.question_id == ids["question"]),
+        "ix_results_question_id",
+    ),
+    "results of a session": (
+        lambda ids: select(Result).where(Result.quiz_session_id == ids["quiz_session"]),
+        "ix_results_quiz_session_id",
+    ),
+}
+
+
+def _insert(connection, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed(engine, nb_results: int, nb_users: int, documents_per_user: int, questions_per_document: int):
+    """Fill the database; returns ids of a user, document, question and quiz session to query."""
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    users = [str(uuid.uuid4()) for _ in range(nb_users)]
+    documents = [(str(uuid.uuid4()), user) for user in users for _ in range(documents_per_user)]
+    questions = [(str(uuid.uuid4()), document) for document, _ in documents for _ in range(questions_per_document)]
+
+    with engine.begin() as connection:
+        _insert(connection, User, [
+            {"id": user, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i, user in enumerate(users)
+        ])
+        _insert(connection, Document, [
+            {"id": document, "title": f"Course {i}", "content": "...", "user_id": user,
+             "created_at": start + timedelta(minutes=i)}
+            for i, (document, user) in enumerate(documents)
+        ])
+        _insert(connection, Question, [
+            {"id": question, "type": QuestionType.qcm, "question": "?", "choices": ["a", "b", "c", "d"],
+             "answer": "a", "document_id": document}
+            for question, document in questions
+        ])
+
+    owners = dict(documents)
+    questions_per_session = 10
+    quiz_session = None
+    with engine.begin() as connection:
+        for batch_start in range(0, nb_results, BATCH_SIZE):
+            sessions, results = [], []
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, nb_results)):
+                if i % questions_per_session == 0:
+                    document_index = rng.randrange(len(documents))
+                    document = documents[document_index][0]
+                    quiz_session = {"id": str(uuid.uuid4()), "user_id": owners[document], "document_id": document,
+                                    "score": rng.random() * 10, "total_questions": questions_per_session,
+                                    "played_at": start + timedelta(seconds=i)}
+                    sessions.append(quiz_session)
+                question = questions[document_index * questions_per_document + rng.randrange(questions_per_document)][0]
+                results.append({"id": str(uuid.uuid4()), "user_answer": "a", "is_correct": rng.random() < 0.5,
+                                "question_id": question, "user_id": quiz_session["user_id"],
+                                "quiz_session_id": quiz_session["id"]})
+            connection.execute(insert(QuizSession), sessions)
+            connection.execute(insert(Result), results)
+
+    # the user and document of the last quiz session have some history
+    return {"user": quiz_session["user_id"], "document": quiz_session["document_id"],
+            "question": question, "quiz_session": quiz_session["id"]}
+
+
+def explain(connection, statement) -> str:
+    compiled = statement.compile(connection, compile_kwargs={"literal_binds": True})
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))
+        return "\n".join(row[-1] for row in rows)
+    return "\n".join(row[0] for row in connection.execute(text(f"EXPLAIN {compiled}")))
+
+
+def uses_index(plan: str, index_name: str) -> bool:
+    """Whether a plan walks `index_name`, without scanning a table or sorting."""
+    if index_name not in plan:
+        return False
+    lines = plan.splitlines()
+    # SQLite: "SCAN results" / "USE TEMP B-TREE FOR ORDER BY"; Postgres: "Seq Scan" / "Sort"
+    return not any(
+        (line.strip().startswith("SCAN") and "USING" not in line)
+        or "TEMP B-TREE" in line
+        or "Seq Scan" in line
+        or line.strip().startswith("Sort")
+        or "->  Sort" in line
+        for line in lines
+    )
+
+
+def time_query(connection, statement, repeat: int) -> float:
+    connection.execute(statement).fetchall()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        connection.execute(statement).fetchall()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--results", type=int, default=2_000_000, help="number of results to seed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--documents-per-user", type=int, default=20)
+    parser.add_argument("--questions-per-document", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--compare", action="store_true", help="also time the queries without the indexes")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    start = time.perf_counter()
+    ids = seed(engine, args.results, args.users, args.documents_per_user, args.questions_per_document)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    print(f"Seeded {args.results} results in {time.perf_counter() - start:.0f}s ({engine.dialect.name})\n")
+
+    failures = []
+    timings = {}
+    print(f"{'query':<24}{'index':>8}{'time':>12}")
+    with engine.connect() as connection:
+        for name, (build, index_name) in HOT_QUERIES.items():
+            statement = build(ids)
+            plan = explain(connection, statement)
+            ok = uses_index(plan, index_name)
+            if not ok:
+                failures.append((name, plan))
+            timings[name] = time_query(connection, statement, args.repeat)
+            print(f"{name:<24}{'yes' if ok else 'NO':>8}{timings[name] * 1000:>10.2f}ms")
+
+    if args.compare:
+        indexes = [index for table in Base.metadata.sorted_tables for index in table.indexes
+                   if index.name in {index_name for _, index_name in HOT_QUERIES.values()}]
+        for index in indexes:
+            index.drop(engine)
+        print(f"\n{'query':<24}{'no index':>12}{'indexed':>12}{'speedup':>10}")
+        with engine.connect() as connection:
+            for name, (build, _) in HOT_QUERIES.items():
+                before = time_query(connection, build(ids), max(1, args.repeat // 10))
+                print(f"{name:<24}{before * 1000:>10.2f}ms{timings[name] * 1000:>10.2f}ms"
+                      f"{before / timings[name]:>9.0f}x")
+        for index in indexes:
+            index.create(engine)
+
+    for name, plan in failures:
+        print(f"\n{name}: no index scan\n{plan}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
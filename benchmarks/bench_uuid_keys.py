@@ -0,0 +1,114 @@
+"""Insert throughput and index size of a large `results` table per primary key format.
+
+Usage:
+    uv run python benchmarks/bench_uuid_keys.py [--rows 1000000] [--url postgresql://...]
+
+Each variant fills a copy of the `results` table (primary key, question and session
+foreign keys, each indexed) in batches, then reports the insert rate and the size of
+the table and its indexes:
+    - uuid4 text: former keys, 36 random characters
+    - uuid7 text: time-ordered keys, same storage (SQLite and other databases)
+    - uuid4 / uuid7 native: 16-byte Postgres `uuid` keys (Postgres only: the app stores
+      the ids as text on SQLite, the storage gain of native keys is a Postgres one)
+The database is a temporary SQLite file by default; pass a Postgres URL with --url.
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import Column, Index, MetaData, Table, Text, create_engine, insert, text
+from sqlalchemy.dialects import postgresql
+
+from app.ids import uuid7
+
+BATCH_SIZE = 10_000
+
+
+def _key_type(native: bool):
+    return postgresql.UUID(as_uuid=True) if native else Text
+
+
+def _key(generate, native: bool):
+    value = generate()
+    return value if native else str(value)
+
+
+def _size(engine, table: str) -> dict:
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            row = connection.execute(text(
+                f"SELECT pg_relation_size('{table}'), pg_indexes_size('{table}')"
+            )).one()
+            return {"table": row[0], "indexes": row[1]}
+        sizes = dict(connection.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all())
+    table_size = sizes.pop(table, 0)
+    indexes = sum(size for name, size in sizes.items() if name.startswith((f"ix_{table}", f"sqlite_autoindex_{table}")))
+    return {"table": table_size, "indexes": indexes}
+
+
+def run(engine, name: str, generate, native: bool, rows: int) -> dict:
+    metadata = MetaData()
+    key_type = _key_type(native)
+    table = Table(
+        f"bench_{name}", metadata,
+        Column("id", key_type, primary_key=True),
+        Column("question_id", key_type, nullable=False),
+        Column("quiz_session_id", key_type),
+        Column("user_answer", Text, nullable=False),
+    )
+    Index(f"ix_bench_{name}_question_id", table.c.question_id)
+    Index(f"ix_bench_{name}_quiz_session_id", table.c.quiz_session_id)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    # results reference a bounded set of questions, sessions are created as quizzes are played
+    questions = [_key(generate, native) for _ in range(5000)]
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        session = None
+        for batch_start in range(0, rows, BATCH_SIZE):
+            batch = []
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, rows)):
+                if i % 10 == 0:
+                    session = _key(generate, native)
+                batch.append({"id": _key(generate, native), "question_id": questions[i % len(questions)],
+                              "quiz_session_id": session, "user_answer": "a"})
+            connection.execute(insert(table), batch)
+    elapsed = time.perf_counter() - start
+
+    sizes = _size(engine, table.name)
+    metadata.drop_all(engine)
+    return {"rate": rows / elapsed, **sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows inserted per variant")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    variants = [
+        ("uuid4_text", uuid.uuid4, False),
+        ("uuid7_text", uuid7, False),
+    ]
+    if engine.dialect.name == "postgresql":
+        variants += [
+            ("uuid4_native", uuid.uuid4, True),
+            ("uuid7_native", uuid7, True),
+        ]
+
+    print(f"{engine.dialect.name}: {args.rows} results per variant\n")
+    print(f"{'keys':<14}{'rows/s':>10}{'table MB':>10}{'indexes MB':>12}")
+    for name, generate, native in variants:
+        result = run(engine, name, generate, native, args.rows)
+        print(f"{name:<14}{result['rate']:>10.0f}{result['table'] / 2**20:>10.1f}{result['indexes'] / 2**20:>12.1f}")
+    if engine.dialect.name != "postgresql":
+        print("\nNative uuid keys are measured on Postgres only (--url): the app stores ids as text here.")
+
+
+if __name__ == "__main__":
+    main()
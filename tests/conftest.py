@@ -24,6 +24,7 @@ def app(test_db_url, monkeypatch):
     monkeypatch.setenv("DATABASE_URL", test_db_url)
     monkeypatch.setenv("FLASK_ENV", "testing")
     monkeypatch.setenv("GEMINI_API_KEY", "test-api-key")  # Mock API key
+    monkeypatch.setenv("JOBS_EAGER", "1")  # Run background jobs inside the request
     
     app = create_app()
     app.config["TESTING"] = True
@@ -195,13 +196,49 @@ def mock_generate_mcq_empty():
         yield
 
 
+@pytest.fixture
+def stub_provider(monkeypatch):
+    """Generate questions with the deterministic offline LLM provider"""
+    from app.core import llm
+    from app.core.providers import StubProvider
+
+    provider = StubProvider(latency=0)
+    monkeypatch.setattr(llm, "_provider", provider)
+    monkeypatch.setattr(llm, "response_cache", None)
+    return provider
+
+
 @pytest.fixture
 def mock_extract_text():
-    """Mock the extract_text_from_file function"""
-    with patch("app.routes.documents.extract_text_from_file", return_value="Extracted text content"):
+    """Mock the text extraction run by the extraction engine"""
+    with patch("app.routes.documents.extraction_engine.extract", return_value="Extracted text content"):
         yield "Extracted text content"
 
 
+@pytest.fixture
+def inline_extraction(monkeypatch):
+    """Run the extraction engine inline with a fake extractor (no process pool)"""
+    from app.core.engine import extraction_engine
+
+    def fake_extractor(data, filename=None, mimetype=None, **kwargs):
+        if data.startswith(b"BROKEN"):
+            raise ValueError("Unreadable document")
+        return f"Extracted text of {filename}"
+
+    monkeypatch.setattr(extraction_engine, "max_workers", 0)
+    monkeypatch.setattr(extraction_engine, "extractor", fake_extractor)
+    return fake_extractor
+
+
+@pytest.fixture
+def blob_store(tmp_path, monkeypatch):
+    """Configure a local blob store for the raw uploads"""
+    from app.core import storage
+    store = storage.LocalBlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(storage, "_blob_store", store)
+    return store
+
+
 # ------------------------------------------------
 # File Upload Fixtures
 # ------------------------------------------------
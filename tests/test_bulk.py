@@ -0,0 +1,64 @@
+"""
+Tests for the bulk insert helpers
+"""
+from sqlalchemy import event
+
+from app.core.bulk import insert_objects, insert_rows
+from app.models import Question, QuestionType, Result
+
+
+def _count_inserts(engine):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def test_insert_rows(db_session, test_questions, test_user):
+    rows = [
+        {"question_id": question.id, "user_id": test_user.id, "user_answer": "Option A", "is_correct": True}
+        for question in test_questions
+    ]
+    rows[0]["id"] = "given-id"
+
+    statements, stop = _count_inserts(db_session.bind)
+    try:
+        ids = insert_rows(db_session, Result, rows)
+        db_session.commit()
+    finally:
+        stop()
+
+    assert len(statements) == 1
+    assert ids[0] == "given-id"
+    assert len(set(ids)) == 3
+    results = db_session.query(Result).all()
+    assert {result.id for result in results} == set(ids)
+    assert all(result.reviewed_at is not None for result in results)  # server default
+
+
+def test_insert_objects(db_session, test_document):
+    questions = [
+        Question(type=QuestionType.qcm, question=f"Q{i}?", choices=["a", "b"], answer="a",
+                 signature=b"\x00\x01", document_id=test_document.id)
+        for i in range(5)
+    ]
+
+    ids = insert_objects(db_session, questions)
+    db_session.commit()
+
+    assert [question.id for question in questions] == ids
+    saved = db_session.get(Question, ids[2])
+    assert saved.question == "Q2?"
+    assert saved.type == QuestionType.qcm
+    assert saved.choices == ["a", "b"]
+    assert saved.signature == b"\x00\x01"
+    assert saved.source_score is None
+
+
+def test_insert_nothing(db_session):
+    assert insert_rows(db_session, Result, []) == []
+    assert insert_objects(db_session, []) == []
@@ -0,0 +1,222 @@
+"""
+Tests for the compressed storage of the document texts
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import event, select, text, type_coerce
+from sqlalchemy.types import NullType
+
+from app import compression
+from app.compression import MIN_SIZE, TextCodec, build_dictionary
+from app.core.recompress import compress_documents, content_stats
+from app.db import Base, migrate_compressed_columns, upgrade_schema
+from app.models import Document
+
+COURSE = "\n\n".join(
+    f"## Chapitre {i}\n\nLa photosynthese convertit l'energie lumineuse en energie chimique "
+    f"dans les chloroplastes (etape {i}).\n\n| Terme | Definition |\n|---|---|"
+    for i in range(40)
+)
+
+
+@pytest.fixture
+def codec(monkeypatch):
+    """Install a codec for the column type, restored after the test"""
+    def install(new_codec):
+        monkeypatch.setattr(compression, "_codec", new_codec)
+        return new_codec
+    return install
+
+
+def _stored(session, document_id):
+    stored = type_coerce(Document.content, NullType())
+    return session.execute(select(stored).where(Document.id == document_id)).scalar_one()
+
+
+def test_round_trip():
+    codec = TextCodec()
+    value = codec.compress(COURSE)
+    assert value[:2] == b"\x00z"
+    assert len(value) < len(COURSE) / 4
+    assert codec.decompress(value) == COURSE
+    assert codec.format(value) == "zlib"
+
+
+def test_short_texts_are_not_compressed():
+    codec = TextCodec()
+    value = codec.compress("é" * 10)
+    assert len(value) < MIN_SIZE
+    assert codec.format(value) == "none"
+    assert codec.decompress(value) == "é" * 10
+
+
+def test_plain_values_are_read_unchanged():
+    codec = TextCodec()
+    assert codec.decompress(COURSE) == COURSE
+    assert codec.decompress(COURSE.encode()) == COURSE
+    assert codec.decompress(memoryview(COURSE.encode())) == COURSE
+    assert codec.format(COURSE) == "plain"
+
+
+def test_shared_dictionary():
+    dictionary = build_dictionary([COURSE, COURSE.replace("photosynthese", "respiration")], size=1024)
+    assert 0 < len(dictionary) <= 1024
+    assert b"|---|---|" in dictionary
+
+    with_dictionary = TextCodec(dictionary=dictionary)
+    value = with_dictionary.compress(COURSE)
+    assert len(value) < len(TextCodec().compress(COURSE))
+    assert with_dictionary.decompress(value) == COURSE
+
+    # the dictionary is needed to read the values it compressed
+    with pytest.raises(ValueError, match="dictionary"):
+        TextCodec().decompress(value)
+
+
+def test_codecs_read_each_other():
+    value = TextCodec(codec="none").compress(COURSE)
+    assert TextCodec().decompress(value) == COURSE
+    assert TextCodec(codec="none").decompress(TextCodec(level=9).compress(COURSE)) == COURSE
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        TextCodec(codec="lz4")
+
+
+def test_zstd():
+    pytest.importorskip("zstandard")
+    dictionary = build_dictionary([COURSE, COURSE.upper()])
+    for codec in (TextCodec(codec="zstd"), TextCodec(codec="zstd", dictionary=dictionary)):
+        value = codec.compress(COURSE)
+        assert codec.format(value) == "zstd"
+        assert codec.decompress(value) == COURSE
+
+
+def test_is_current():
+    codec = TextCodec()
+    assert codec.is_current(codec.compress(COURSE))
+    assert codec.is_current(codec.compress("short"))
+    assert not codec.is_current(COURSE)
+    assert not codec.is_current(TextCodec(codec="none").compress(COURSE))
+    assert not codec.is_current(TextCodec(dictionary=b"|---|---|").compress(COURSE))
+
+
+def test_document_content_is_stored_compressed(db_session, test_user):
+    document = Document(title="Cours", content=COURSE, user_id=test_user.id)
+    db_session.add(document)
+    db_session.commit()
+
+    stored = _stored(db_session, document.id)
+    assert stored.startswith(b"\x00z")
+    assert len(stored) < len(COURSE) / 4
+
+    db_session.expire_all()
+    assert db_session.get(Document, document.id).content == COURSE
+    assert db_session.scalar(select(Document.content).where(Document.id == document.id)) == COURSE
+
+
+def test_content_is_loaded_on_access(db_session, test_document):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db_session.expire_all()
+    event.listen(db_session.bind, "before_cursor_execute", before_execute)
+    try:
+        document = db_session.get(Document, test_document.id)
+        assert document.title == "Test Document"
+        assert not any("documents.content," in statement for statement in statements)
+        assert document.content == "This is test content for a document."
+        assert any("documents.content" in statement for statement in statements)
+    finally:
+        event.remove(db_session.bind, "before_cursor_execute", before_execute)
+
+
+def _insert_plain(session, user_id, content):
+    """A row written before compression: plain text in the column"""
+    document = Document(title="Legacy", content="", user_id=user_id)
+    session.add(document)
+    session.commit()
+    session.execute(text("UPDATE documents SET content = :content WHERE id = :id"),
+                    {"content": content, "id": document.id})
+    session.commit()
+    session.expire_all()
+    return document.id
+
+
+def test_plain_rows_are_readable_and_compressed(db_session, test_user):
+    document_id = _insert_plain(db_session, test_user.id, COURSE)
+    assert db_session.get(Document, document_id).content == COURSE
+
+    stats = content_stats(db_session)
+    assert stats["formats"] == {"plain": 1}
+    assert stats["stored_bytes"] == stats["text_bytes"] == len(COURSE.encode())
+
+    result = compress_documents(db_session, batch_size=1, dry_run=True)
+    assert result["documents"] == 1
+    assert _stored(db_session, document_id) == COURSE
+
+    result = compress_documents(db_session, batch_size=1)
+    assert result["documents"] == 1
+    assert result["bytes_after"] < result["bytes_before"] / 4
+    assert compress_documents(db_session)["documents"] == 0
+
+    stats = content_stats(db_session)
+    assert stats["formats"] == {"zlib": 1}
+    assert stats["stored_bytes"] == result["bytes_after"]
+    db_session.expire_all()
+    assert db_session.get(Document, document_id).content == COURSE
+
+
+def test_compress_with_new_dictionary(db_session, test_user, codec):
+    document = Document(title="Cours", content=COURSE, user_id=test_user.id)
+    db_session.add(document)
+    db_session.commit()
+
+    # a dictionary is configured: the documents are rewritten with it
+    with_dictionary = codec(TextCodec(dictionary=build_dictionary([COURSE, COURSE.lower()])))
+    assert compress_documents(db_session)["documents"] == 1
+    assert with_dictionary.is_current(_stored(db_session, document.id))
+    db_session.expire_all()
+    assert db_session.get(Document, document.id).content == COURSE
+
+
+def test_migrate_is_postgres_only(db_session):
+    assert migrate_compressed_columns(db_session.bind) == []
+
+
+def test_content_column_is_converted_at_startup():
+    """Uploads bind bytea: an existing Postgres text column is converted before the app runs"""
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    statement = 'ALTER TABLE "documents" ALTER COLUMN "content" TYPE bytea'
+    with patch("app.db.migrate_uuid_columns", return_value=[]), \
+            patch("app.db.migrate_compressed_columns", return_value=[statement]) as migrate, \
+            patch("app.db.add_missing_columns", return_value=[]), \
+            patch.object(Base.metadata, "create_all"), patch("app.db.create_missing_indexes"):
+        assert upgrade_schema(engine) == [statement]
+    migrate.assert_called_once_with(engine)
+
+
+def test_stats_command(runner, db_session, test_user):
+    _insert_plain(db_session, test_user.id, COURSE)
+    result = runner.invoke(args=["documents", "compress"])
+    assert "1 document(s) rewritten with zlib" in result.output
+
+    result = runner.invoke(args=["documents", "stats"])
+    assert result.exit_code == 0
+    assert "1 document(s): 1 zlib" in result.output
+    assert "less read per text loaded" in result.output
+
+
+def test_build_dict_command(runner, db_session, test_user, tmp_path):
+    for i in range(2):
+        db_session.add(Document(title=f"Cours {i}", content=COURSE, user_id=test_user.id))
+    db_session.commit()
+    output = tmp_path / "documents.dict"
+    result = runner.invoke(args=["documents", "build-dict", str(output), "--size", "2048"])
+    assert result.exit_code == 0
+    assert 0 < len(output.read_bytes()) <= 2048
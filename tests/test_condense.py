@@ -0,0 +1,96 @@
+"""
+Tests for the token budgeting and condensation of the prompt text
+"""
+from app.core.condense import (
+    clean_text, condense, count_tokens, fit_to_budget, flatten_tables, strip_boilerplate,
+)
+
+CONTENTS = [
+    "Cells are the basic unit of life.",
+    "Mitochondria produce the energy of the cell.",
+    "The nucleus holds the genetic material.",
+]
+PAGES = "\n".join(
+    f"Biology course - Chapter 1\n\n{content}\n\n{i} / 3\n\nUniversity of Nowhere, 2024"
+    for i, content in enumerate(CONTENTS, start=1)
+)
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("Bees pollinate flowers.") == 5
+    assert count_tokens("a " * 300) > count_tokens("a " * 100)
+
+
+def test_strip_boilerplate():
+    text = strip_boilerplate(PAGES)
+    assert "Biology course" not in text
+    assert "University of Nowhere" not in text
+    assert "/ 3" not in text
+    for content in CONTENTS:
+        assert content in text
+
+
+def test_repeated_content_lines_and_numbers_are_kept():
+    """Short lines repeated inside the pages and numeric answers are course content"""
+    exercises = "\n\n".join(
+        f"Question {i}: compute {i} x 10.\n\nExemple :\n\nRésultat :\n\n{i * 10}\n\n1.\n\n50"
+        for i in (3, 9, 2)
+    )
+    text = strip_boilerplate(f"Intro of the chapter.\n\n{exercises}\n\nEnd of the chapter.")
+    assert text.count("Exemple :") == 3
+    assert text.count("Résultat :") == 3
+    assert text.count("\n50\n") == 3
+    assert "\n90\n" in text
+    assert text.count("1.") == 3
+
+
+def test_page_numbers_need_a_label_or_a_run():
+    assert strip_boilerplate("Intro\n\nPage 4\n\nMore") == "Intro\n\n\nMore"
+    assert strip_boilerplate("A\n7\nB\n8\nC\n9\nD") == "A\nB\nC\nD"
+    assert strip_boilerplate("A\n7\nB\n12\nC") == "A\n7\nB\n12\nC"
+
+
+def test_repeated_headings_and_list_items_are_kept():
+    text = "\n".join(f"## Exercises\n- True\n{content}" for content in CONTENTS)
+    assert strip_boilerplate(text) == text
+
+
+def test_flatten_tables():
+    table = "| Name | Role |\n|------|:----:|\n| ATP  | energy |\n|  | |"
+    assert flatten_tables(table) == "Name; Role\nATP; energy\n"
+
+
+def test_clean_text_whitespace():
+    assert clean_text("A   line  \n\n\n\n   another\tline ") == "A line\n\nanother line"
+
+
+def test_fit_to_budget_covers_every_section():
+    sections = [
+        f"# Chapter {i}\n\n" + "\n\n".join(f"Paragraph {j} of chapter {i} about topic {i}." for j in range(20))
+        for i in range(4)
+    ]
+    text = "\n\n".join(sections)
+
+    condensed = fit_to_budget(text, 200)
+
+    assert count_tokens(condensed) <= 200
+    for i in range(4):
+        assert f"Paragraph 0 of chapter {i}" in condensed
+    assert "Paragraph 19" not in condensed
+
+
+def test_condense_reports_saved_tokens():
+    text = PAGES + "\n| a | b |\n|---|---|"
+    result = condense(text, budget=count_tokens(text) - 1)
+    assert result.tokens == count_tokens(result.text)
+    assert result.saved_tokens > 0
+    assert result.original_tokens == count_tokens(text)
+    assert "University of Nowhere" not in result.text
+
+
+def test_condense_within_budget_is_unchanged():
+    for budget in (0, 1000):
+        result = condense(PAGES, budget=budget)
+        assert result.text == PAGES
+        assert result.saved_tokens == 0
@@ -0,0 +1,88 @@
+"""
+Tests for the near-duplicate question index
+"""
+import random
+import time
+
+from app.core.dedupe import (
+    MinHashIndex, decode_signature, dedupe_document, encode_signature, question_signature, similarity,
+)
+from app.models import Question, QuestionType, Result
+
+CHOICES = ["Mitochondria", "Nucleus", "Ribosome", "Golgi apparatus"]
+
+
+def test_paraphrase_is_similar():
+    original = question_signature("Which organelle produces the energy of the cell?", CHOICES)
+    paraphrase = question_signature("Which organelle produces most of the energy of a cell?", CHOICES)
+    other = question_signature("When was the first vaccine developed?", ["1796", "1885", "1921", "1955"])
+
+    assert similarity(original, paraphrase) >= 0.6
+    assert similarity(original, other) < 0.2
+
+
+def test_signature_roundtrip():
+    signature = question_signature("Qu'est-ce qu'une cellule ?", ["a", "b"])
+    assert decode_signature(encode_signature(signature)) == signature
+
+
+def test_index_rejects_near_duplicates():
+    index = MinHashIndex(threshold=0.6)
+    assert index.add_if_new("q1", question_signature("Which organelle produces the energy of the cell?", CHOICES)) is None
+    assert index.add_if_new("q2", question_signature("Which organelle produces energy in the cell?", CHOICES)) == "q1"
+    assert index.add_if_new("q3", question_signature("Where is the DNA of the cell stored?", CHOICES)) is None
+    assert len(index) == 2
+
+
+def test_index_lookup_scales():
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    index = MinHashIndex()
+    for i in range(5000):
+        index.add(str(i), question_signature(" ".join(rng.sample(vocabulary, 12)), rng.sample(vocabulary, 4)))
+
+    start = time.perf_counter()
+    for _ in range(200):
+        index.find_duplicate(question_signature(" ".join(rng.sample(vocabulary, 12))))
+    # lookups compare a few candidates, not the whole bank
+    assert time.perf_counter() - start < 1.0
+
+
+def test_dedupe_document(db_session, test_document, test_user):
+    texts = [
+        "Which organelle produces the energy of the cell?",
+        "Where is the DNA of the cell stored?",
+        "Which organelle produces energy in the cell?",
+        "Which organelle produces the energy of a cell?",
+    ]
+    questions = [
+        Question(type=QuestionType.qcm, question=text, choices=CHOICES, answer="Mitochondria", document_id=test_document.id)
+        for text in texts
+    ]
+    db_session.add_all(questions)
+    db_session.flush()
+    # an answered duplicate is kept
+    db_session.add(Result(user_answer="Nucleus", question_id=questions[3].id, user_id=test_user.id))
+    db_session.commit()
+
+    duplicates, deleted = dedupe_document(db_session, test_document.id, dry_run=True)
+    assert [(d.question, k.question) for d, k in duplicates] == [(texts[2], texts[0]), (texts[3], texts[0])]
+    assert deleted == 0
+
+    duplicates, deleted = dedupe_document(db_session, test_document.id)
+    db_session.commit()
+    assert deleted == 1
+    remaining = {q.question for q in db_session.query(Question).filter_by(document_id=test_document.id)}
+    assert remaining == {texts[0], texts[1], texts[3]}
+    assert all(q.signature is not None for q in db_session.query(Question))
+
+
+def test_dedupe_command(runner, db_session, test_document):
+    for text in ("Which organelle produces the energy of the cell?", "Which organelle produces energy in the cell?"):
+        db_session.add(Question(type=QuestionType.qcm, question=text, choices=CHOICES, document_id=test_document.id))
+    db_session.commit()
+
+    result = runner.invoke(args=["questions", "dedupe"])
+
+    assert result.exit_code == 0
+    assert "1 near-duplicate question(s) found, 1 deleted" in result.output
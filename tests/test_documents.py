@@ -1,6 +1,14 @@
 """
 Tests for document routes
 """
+import time
+
+
+def _slow_extractor(data, filename=None, mimetype=None, **kwargs):
+    """Picklable extractor stuck on the documents starting with SLOW"""
+    if data.startswith(b"SLOW"):
+        time.sleep(30)
+    return f"Extracted text of {filename}"
 
 
 class TestUploadDocument:
@@ -69,7 +77,7 @@ class TestUploadDocument:
         
         # Mock extraction to raise an error
         from unittest.mock import patch
-        with patch("app.routes.documents.extract_text_from_file", side_effect=Exception("Extraction failed")):
+        with patch("app.routes.documents.extraction_engine.extract", side_effect=Exception("Extraction failed")):
             with open(invalid_file, "rb") as f:
                 response = authenticated_client.post(
                     "/api/documents/upload",
@@ -82,6 +90,385 @@ class TestUploadDocument:
             assert "error" in data
             assert "Could not extract text" in data["error"]
 
+    def test_upload_extraction_timeout(self, authenticated_client, sample_pdf_file):
+        """Test upload when the extraction engine times out"""
+        from unittest.mock import patch
+        from app.core.engine import ExtractionTimeoutError
+        with patch("app.routes.documents.extraction_engine.extract", side_effect=ExtractionTimeoutError("too slow")):
+            with open(sample_pdf_file, "rb") as f:
+                response = authenticated_client.post(
+                    "/api/documents/upload",
+                    data={"file": (f, "sample.pdf")},
+                    content_type="multipart/form-data"
+                )
+
+        assert response.status_code == 504
+        assert "Could not extract text" in response.get_json()["error"]
+
+    def test_upload_too_large(self, authenticated_client, tmp_path, monkeypatch):
+        """Test upload above the extraction engine input limit"""
+        from app.core.engine import extraction_engine
+        monkeypatch.setattr(extraction_engine, "max_input_size", 10)
+        big_file = tmp_path / "big.txt"
+        big_file.write_text("x" * 100)
+        with open(big_file, "rb") as f:
+            response = authenticated_client.post(
+                "/api/documents/upload",
+                data={"file": (f, "big.txt")},
+                content_type="multipart/form-data"
+            )
+
+        assert response.status_code == 413
+        assert "error" in response.get_json()
+
+    def test_upload_same_file_reuses_extraction(self, authenticated_client, sample_pdf_file, db_session):
+        """Test that re-uploading identical bytes skips text extraction"""
+        from unittest.mock import patch
+        with patch("app.routes.documents.extraction_engine.extract", return_value="Extracted once") as mock_extract:
+            for _ in range(2):
+                with open(sample_pdf_file, "rb") as f:
+                    response = authenticated_client.post(
+                        "/api/documents/upload",
+                        data={"file": (f, "sample.pdf")},
+                        content_type="multipart/form-data"
+                    )
+                assert response.status_code == 201
+
+        assert mock_extract.call_count == 1
+
+        from app.models import Document
+        documents = db_session.query(Document).all()
+        assert len(documents) == 2
+        assert documents[0].content_hash == documents[1].content_hash
+        assert all(d.content == "Extracted once" for d in documents)
+
+    def test_upload_passes_bytes_without_saving(self, authenticated_client, sample_pdf_file, tmp_path, monkeypatch):
+        """Test that the upload bytes go straight to the extractor, nothing is written in the working directory"""
+        from unittest.mock import patch
+        monkeypatch.chdir(tmp_path)
+        with patch("app.routes.documents.extraction_engine.extract", return_value="text") as mock_extract:
+            with open(sample_pdf_file, "rb") as f:
+                response = authenticated_client.post(
+                    "/api/documents/upload",
+                    data={"file": (f, "sample.pdf")},
+                    content_type="multipart/form-data"
+                )
+
+        assert response.status_code == 201
+        assert mock_extract.call_args.args[0] == sample_pdf_file.read_bytes()
+        assert mock_extract.call_args.kwargs["filename"] == "sample.pdf"
+        assert not (tmp_path / "uploads").exists()
+
+    def test_upload_is_hashed_in_place(self, authenticated_client, sample_pdf_file, mock_extract_text, db_session):
+        """Test that the upload spooled by werkzeug is hashed and read as is, not copied again"""
+        import hashlib
+        from unittest.mock import patch
+        with patch("app.routes.documents.spool_and_hash") as mock_spool:
+            with open(sample_pdf_file, "rb") as f:
+                response = authenticated_client.post(
+                    "/api/documents/upload",
+                    data={"file": (f, "sample.pdf")},
+                    content_type="multipart/form-data"
+                )
+
+        assert response.status_code == 201
+        mock_spool.assert_not_called()
+        from app.models import Document
+        document = db_session.get(Document, response.get_json()["document_id"])
+        assert document.content_hash == hashlib.sha256(sample_pdf_file.read_bytes()).hexdigest()
+
+    def test_upload_keeps_original_in_blob_store(self, authenticated_client, sample_pdf_file, mock_extract_text, blob_store, db_session):
+        """Test that the raw file is stored once under its content hash"""
+        for _ in range(2):
+            with open(sample_pdf_file, "rb") as f:
+                response = authenticated_client.post(
+                    "/api/documents/upload",
+                    data={"file": (f, "sample.pdf")},
+                    content_type="multipart/form-data"
+                )
+            assert response.status_code == 201
+
+        from app.models import Document
+        document = db_session.get(Document, response.get_json()["document_id"])
+        assert blob_store.get(document.content_hash) == sample_pdf_file.read_bytes()
+        assert len(list(blob_store.list())) == 1
+
+
+class TestUploadDocumentsBatch:
+    """Tests for POST /api/documents/upload/batch"""
+
+    def test_batch_success(self, authenticated_client, inline_extraction, db_session):
+        """Test uploading several files at once"""
+        import io
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(io.BytesIO(b"first"), "a.txt"), (io.BytesIO(b"second"), "b.txt")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data["message"] == "2/2 documents loaded successfully"
+        assert [d["status"] for d in data["documents"]] == ["ok", "ok"]
+
+        from app.models import Document
+        document = db_session.get(Document, data["documents"][1]["document_id"])
+        assert document.title == "b.txt"
+        assert document.content == "Extracted text of b.txt"
+
+    def test_batch_zip_archive(self, authenticated_client, inline_extraction, db_session):
+        """Test uploading a zip archive of a course folder"""
+        import io
+        import zipfile
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("course/chapter1.txt", "chapter 1")
+            zf.writestr("course/chapter2.txt", "chapter 2")
+            zf.writestr("__MACOSX/course/._chapter1.txt", "junk")
+            zf.writestr("course/", "")
+        archive.seek(0)
+
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(archive, "course.zip")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 201
+        titles = [d["title"] for d in response.get_json()["documents"]]
+        assert titles == ["chapter1.txt", "chapter2.txt"]
+
+        from app.models import Document
+        assert db_session.query(Document).count() == 2
+
+    def test_batch_partial_failure(self, authenticated_client, inline_extraction, db_session):
+        """Test that a broken file does not prevent the others from being saved"""
+        import io
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(io.BytesIO(b"BROKEN"), "bad.pdf"), (io.BytesIO(b"good"), "good.txt")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 201
+        documents = response.get_json()["documents"]
+        assert documents[0]["status"] == "error"
+        assert "Could not extract text" in documents[0]["error"]
+        assert documents[1]["status"] == "ok"
+
+        from app.models import Document
+        assert db_session.query(Document).count() == 1
+
+    def test_batch_duplicates_extracted_once(self, authenticated_client, inline_extraction):
+        """Test that identical files in one batch are extracted once"""
+        import io
+        from unittest.mock import patch
+        from app.core.engine import extraction_engine
+        with patch.object(extraction_engine, "submit", wraps=extraction_engine.submit) as mock_submit:
+            response = authenticated_client.post(
+                "/api/documents/upload/batch",
+                data={"files": [(io.BytesIO(b"same"), "a.txt"), (io.BytesIO(b"same"), "b.txt")]},
+                content_type="multipart/form-data"
+            )
+
+        assert response.status_code == 201
+        assert mock_submit.call_count == 1
+        assert [d["status"] for d in response.get_json()["documents"]] == ["ok", "ok"]
+
+    def test_batch_all_failed(self, authenticated_client, inline_extraction):
+        """Test batch where no file could be extracted"""
+        import io
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(io.BytesIO(b"BROKEN"), "bad.pdf")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 422
+
+    def test_batch_invalid_zip(self, authenticated_client, inline_extraction):
+        """Test batch with a corrupted zip archive"""
+        import io
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(io.BytesIO(b"not a zip"), "course.zip")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 400
+        assert "Invalid zip archive" in response.get_json()["error"]
+
+    def test_batch_slow_file_does_not_fail_the_others(self, authenticated_client, monkeypatch):
+        """Test that a file timing out in the worker processes only fails itself"""
+        import io
+        from app.core.engine import extraction_engine
+        monkeypatch.setattr(extraction_engine, "extractor", _slow_extractor)
+        monkeypatch.setattr(extraction_engine, "max_workers", 2)
+        monkeypatch.setattr(extraction_engine, "timeout", 1.0)
+        extraction_engine.shutdown()
+        try:
+            response = authenticated_client.post(
+                "/api/documents/upload/batch",
+                data={"files": [(io.BytesIO(b"SLOW"), "slow.pdf"), (io.BytesIO(b"one"), "one.txt"),
+                                (io.BytesIO(b"two"), "two.txt")]},
+                content_type="multipart/form-data"
+            )
+        finally:
+            extraction_engine.shutdown()
+
+        assert response.status_code == 201
+        documents = response.get_json()["documents"]
+        assert [d["status"] for d in documents] == ["error", "ok", "ok"]
+        assert "longer than" in documents[0]["error"]
+
+    def test_batch_too_many_files(self, authenticated_client, inline_extraction, monkeypatch):
+        """Test that the files already spooled are closed when the batch is rejected"""
+        import io
+        from app.routes import documents
+        buffers = []
+        original = documents.hash_upload
+
+        def hash_upload(stream, max_size=None):
+            buffer, digest = original(stream, max_size=max_size)
+            buffers.append(buffer)
+            return buffer, digest
+
+        monkeypatch.setattr(documents, "hash_upload", hash_upload)
+        monkeypatch.setattr(documents, "MAX_BATCH_FILES", 2)
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(io.BytesIO(f"file {i}".encode()), f"{i}.txt") for i in range(3)]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 413
+        assert "Too many files" in response.get_json()["error"]
+        assert len(buffers) == 2
+        assert all(buffer.closed for buffer in buffers)
+
+    def test_batch_total_size_limit(self, authenticated_client, inline_extraction, monkeypatch, db_session):
+        """Test that a zip expanding past the batch size limit is rejected"""
+        import io
+        import zipfile
+        from app.models import Document
+        from app.routes import documents
+        monkeypatch.setattr(documents, "MAX_BATCH_BYTES", 1000)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f"chapter{i}.txt", "a" * 400)
+        archive.seek(0)
+
+        response = authenticated_client.post(
+            "/api/documents/upload/batch",
+            data={"files": [(archive, "course.zip")]},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 413
+        assert "Batch too large" in response.get_json()["error"]
+        assert db_session.query(Document).count() == 0
+
+    def test_batch_missing_files(self, authenticated_client):
+        """Test batch upload without files"""
+        response = authenticated_client.post("/api/documents/upload/batch")
+
+        assert response.status_code == 400
+        assert "No file sent" in response.get_json()["error"]
+
+    def test_batch_unauthenticated(self, client):
+        """Test batch upload without authentication"""
+        response = client.post("/api/documents/upload/batch", follow_redirects=False)
+
+        assert response.status_code == 302
+
+
+class TestDownloadDocument:
+    """Tests for GET /api/documents/<document_id>/file"""
+
+    def test_download_success(self, authenticated_client, sample_pdf_file, mock_extract_text, blob_store):
+        """Test downloading the original file"""
+        with open(sample_pdf_file, "rb") as f:
+            response = authenticated_client.post(
+                "/api/documents/upload",
+                data={"file": (f, "sample.pdf")},
+                content_type="multipart/form-data"
+            )
+        document_id = response.get_json()["document_id"]
+
+        response = authenticated_client.get(f"/api/documents/{document_id}/file")
+
+        assert response.status_code == 200
+        assert response.data == sample_pdf_file.read_bytes()
+
+    def test_download_not_stored(self, authenticated_client, test_document):
+        """Test downloading when no original file was kept"""
+        response = authenticated_client.get(f"/api/documents/{test_document.id}/file")
+
+        assert response.status_code == 404
+        assert "error" in response.get_json()
+
+    def test_download_unauthorized(self, client, test_user2, test_document):
+        """Test downloading another user's document"""
+        client.post("/auth/login", data={
+            "email": test_user2.email,
+            "password": "testpassword123"
+        })
+        response = client.get(f"/api/documents/{test_document.id}/file")
+
+        assert response.status_code == 403
+
+
+class TestDocumentCoverage:
+    """Tests for GET /api/documents/<document_id>/coverage"""
+
+    def test_coverage(self, authenticated_client, test_document, db_session):
+        from app.models import Question, QuestionType
+        test_document.content = "# Bees\nBees pollinate flowering plants.\n\n# Honey\nHoney is made from nectar."
+        supported = Question(type=QuestionType.qcm, question="Which insects pollinate flowering plants?",
+                             choices=["Bees", "Ants"], answer="Bees", document_id=test_document.id)
+        unsupported = Question(type=QuestionType.qcm, question="What is the capital of France?",
+                               choices=["Paris", "Rome"], answer="Paris", document_id=test_document.id)
+        db_session.add_all([supported, unsupported])
+        db_session.commit()
+
+        response = authenticated_client.get(f"/api/documents/{test_document.id}/coverage")
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["nb_questions"] == 2
+        assert data["nb_sections"] == 2
+        assert data["coverage"] == 0.5
+        assert [section["title"] for section in data["sections"] if section["nb_questions"]] == ["Bees"]
+        assert data["unsupported"] == [unsupported.id]
+
+        # read-only: the located passages are not stored
+        db_session.refresh(supported)
+        assert supported.source_score is None
+
+    def test_coverage_uses_stored_passages(self, authenticated_client, test_document, db_session):
+        from app.core.grounding import GroundingIndex, ensure_grounding
+        from app.models import Question, QuestionType
+        test_document.content = "# Bees\nBees pollinate flowering plants.\n\n# Honey\nHoney is made from nectar."
+        question = Question(type=QuestionType.qcm, question="Which insects pollinate flowering plants?",
+                            choices=["Bees", "Ants"], answer="Bees", document_id=test_document.id)
+        ensure_grounding(question, GroundingIndex(test_document.content))
+        db_session.add(question)
+        db_session.commit()
+        assert test_document.content[question.source_start:question.source_end].startswith("Bees pollinate")
+
+        data = authenticated_client.get(f"/api/documents/{test_document.id}/coverage").get_json()
+        assert [section["nb_questions"] for section in data["sections"]] == [1, 0]
+
+    def test_coverage_unauthorized(self, client, test_user2, test_document):
+        client.post("/auth/login", data={"email": test_user2.email, "password": "testpassword123"})
+        response = client.get(f"/api/documents/{test_document.id}/coverage")
+        assert response.status_code == 403
+
+    def test_coverage_not_found(self, authenticated_client):
+        response = authenticated_client.get("/api/documents/unknown/coverage")
+        assert response.status_code == 404
+
 
 class TestDeleteDocument:
     """Tests for DELETE /api/documents/<document_id>"""
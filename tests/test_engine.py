@@ -0,0 +1,148 @@
+import os
+import time
+
+import pytest
+
+from app.core import engine as engine_module
+from app.core.engine import ExtractionEngine, ExtractionTimeoutError
+from app.core.extraction import DocumentTooLargeError
+
+
+def _slow_extractor(data: bytes, **kwargs) -> str:
+    """Picklable extractor that never finishes within the test timeouts"""
+    time.sleep(30)
+    return data.decode()
+
+
+def _decode(data: bytes, **kwargs) -> str:
+    return data.decode()
+
+
+def _slow_if_marked(data: bytes, **kwargs) -> str:
+    """Picklable extractor stuck on the documents starting with SLOW"""
+    if data.startswith(b"SLOW"):
+        time.sleep(30)
+    return data.decode()
+
+
+def _crash_if_marked(data: bytes, **kwargs) -> str:
+    if data.startswith(b"CRASH"):
+        os._exit(1)
+    return data.decode()
+
+
+# ------------------------------------------------
+# Inline mode (max_workers=0)
+# ------------------------------------------------
+def test_inline_extract():
+    engine = ExtractionEngine(max_workers=0)
+    assert engine.extract(b"HELLO ENGINE") == "HELLO ENGINE"
+
+
+def test_inline_extract_propagates_errors():
+    def failing(data, **kwargs):
+        raise ValueError("broken document")
+
+    engine = ExtractionEngine(max_workers=0, extractor=failing)
+    with pytest.raises(ValueError):
+        engine.extract(b"data")
+
+
+def test_max_input_size():
+    engine = ExtractionEngine(max_workers=0, max_input_size=4)
+    with pytest.raises(DocumentTooLargeError):
+        engine.extract(b"HELLO ENGINE")
+
+
+# ------------------------------------------------
+# Worker processes mode
+# ------------------------------------------------
+def test_pool_extract():
+    engine = ExtractionEngine(max_workers=2)
+    try:
+        futures = [engine.submit(f"DOC {i}".encode()) for i in range(4)]
+        assert [engine.result(f) for f in futures] == [f"DOC {i}" for i in range(4)]
+    finally:
+        engine.shutdown()
+
+
+def test_pool_timeout_replaces_worker():
+    engine = ExtractionEngine(max_workers=1, timeout=0.5, extractor=_slow_extractor)
+    try:
+        with pytest.raises(ExtractionTimeoutError):
+            engine.extract(b"HELLO")
+
+        # the stuck worker was killed, the next job gets a fresh process
+        engine.extractor = _decode
+        assert engine.extract(b"AFTER TIMEOUT") == "AFTER TIMEOUT"
+    finally:
+        engine.shutdown()
+
+
+def test_timeout_only_fails_the_stuck_job():
+    """A slow file and normal files in the same batch: only the slow one fails"""
+    engine = ExtractionEngine(max_workers=2, timeout=1.0, extractor=_slow_if_marked)
+    try:
+        slow = engine.submit(b"SLOW DOC")
+        normal = [engine.submit(f"DOC {i}".encode()) for i in range(4)]
+        assert [engine.result(f) for f in normal] == [f"DOC {i}" for i in range(4)]
+        with pytest.raises(ExtractionTimeoutError):
+            engine.result(slow)
+    finally:
+        engine.shutdown()
+
+
+def test_timeout_starts_with_the_job():
+    """Jobs queued behind a stuck one get the full timeout once they start"""
+    engine = ExtractionEngine(max_workers=1, timeout=1.0, extractor=_slow_if_marked)
+    try:
+        slow = engine.submit(b"SLOW DOC")
+        queued = engine.submit(b"QUEUED DOC")
+        with pytest.raises(ExtractionTimeoutError):
+            engine.result(slow)
+        assert engine.result(queued) == "QUEUED DOC"
+    finally:
+        engine.shutdown()
+
+
+def test_crashed_worker_only_fails_its_job():
+    engine = ExtractionEngine(max_workers=2, extractor=_crash_if_marked)
+    try:
+        crash = engine.submit(b"CRASH DOC")
+        normal = [engine.submit(f"DOC {i}".encode()) for i in range(4)]
+        with pytest.raises(RuntimeError, match="died"):
+            engine.result(crash)
+        assert [engine.result(f) for f in normal] == [f"DOC {i}" for i in range(4)]
+        assert engine.extract(b"AFTER CRASH") == "AFTER CRASH"
+    finally:
+        engine.shutdown()
+
+
+def test_pool_propagates_errors():
+    engine = ExtractionEngine(max_workers=1, extractor=_decode)
+    try:
+        with pytest.raises(UnicodeDecodeError):
+            engine.extract(b"\xff\xfe")
+        assert engine.extract(b"STILL ALIVE") == "STILL ALIVE"
+    finally:
+        engine.shutdown()
+
+
+def test_default_workers_share_the_cpus(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert ExtractionEngine().max_workers == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert ExtractionEngine().max_workers == 1
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert ExtractionEngine().max_workers == 8
+
+
+def test_workers_are_not_forked_from_the_web_worker():
+    """The web workers are threaded: the extraction processes are not plain forks of them"""
+    assert engine_module._context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_max_chars_budget():
+    engine = ExtractionEngine(max_workers=0, max_chars=5)
+    assert engine.extract(b"HELLO ENGINE", filename="notes.txt") == "HELLO"
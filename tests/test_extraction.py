@@ -1,7 +1,19 @@
 import pytest
 from pathlib import Path
 
-from app.core.extraction import extract_text_from_file
+import hashlib
+import io
+
+from app.core.extraction import (
+    ConverterRegistry,
+    DocumentTooLargeError,
+    copy_and_hash,
+    extract_text_from_file,
+    extract_text_within_budget,
+    hash_upload,
+    iter_text_chunks,
+    spool_and_hash,
+)
 
 
 # ------------------------------------------------
@@ -103,3 +115,147 @@ def test_real_files_stream(file_path):
         markdown = extract_text_from_file(f)
     assert isinstance(markdown, str)
     assert len(markdown) >= 0
+
+
+# ------------------------------------------------
+# Test functions: hashing while copying
+# ------------------------------------------------
+def test_copy_and_hash():
+    data = b"HELLO HASH" * 10000
+    dst = io.BytesIO()
+    digest = copy_and_hash(io.BytesIO(data), dst)
+    assert dst.getvalue() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+
+
+# ------------------------------------------------
+# Test functions: converter registry
+# ------------------------------------------------
+def test_registry_builds_converter_once():
+    registry = ConverterRegistry()
+    first = registry.get(".pdf")
+    assert first is not None
+    assert registry.get("PDF") is first
+    assert registry.get(mimetype="application/pdf") is first
+
+
+def test_registry_unknown_format():
+    registry = ConverterRegistry()
+    assert registry.get(".unknown") is None
+    assert registry.get(mimetype="application/octet-stream") is None
+
+
+def test_temp_docx_stream_with_filename(temp_docx):
+    with open(temp_docx, "rb") as f:
+        markdown = extract_text_from_file(f, filename="course.docx")
+    assert "HELLO WORD" in markdown
+
+
+def test_wrong_extension_falls_back(temp_pdf):
+    with open(temp_pdf, "rb") as f:
+        markdown = extract_text_from_file(f, filename="course.docx")
+    assert "HELLO PDF" in markdown
+
+
+# ------------------------------------------------
+# Test functions: streaming extraction
+# ------------------------------------------------
+@pytest.fixture
+def multipage_pdf(tmp_path):
+    """Create a 3 pages PDF document"""
+    file_path = tmp_path / "pages.pdf"
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(str(file_path))
+    for i in range(3):
+        c.drawString(100, 750, f"PAGE NUMBER {i + 1}")
+        c.showPage()
+    c.save()
+    return file_path
+
+
+def test_iter_text_chunks_pdf_pages(multipage_pdf):
+    calls = []
+    chunks = list(iter_text_chunks(str(multipage_pdf), progress=lambda done, total: calls.append((done, total))))
+    assert len(chunks) == 3
+    assert "PAGE NUMBER 2" in chunks[1]
+    assert calls == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_iter_text_chunks_markdown_sections():
+    text = b"# Intro\nhello\n\n# Part 2\nworld\n"
+    chunks = list(iter_text_chunks(io.BytesIO(text), filename="course.md"))
+    assert chunks == ["# Intro\nhello", "# Part 2\nworld"]
+
+
+def test_iter_text_chunks_empty(empty_file):
+    assert list(iter_text_chunks(str(empty_file), filename="empty.pdf")) == []
+
+
+def test_extract_text_within_budget_stops_early(multipage_pdf):
+    calls = []
+    markdown = extract_text_within_budget(
+        str(multipage_pdf), max_chars=10, progress=lambda done, total: calls.append(done)
+    )
+    assert len(markdown) <= 10
+    assert markdown.startswith("PAGE")
+    assert calls == [1]  # pages 2 and 3 were never decoded
+
+
+# ------------------------------------------------
+# Test functions: fast-path dispatch
+# ------------------------------------------------
+def test_fast_path_markdown_skips_markitdown():
+    from unittest.mock import patch
+    with patch("app.core.extraction.converter_registry.get", side_effect=AssertionError("markitdown used")):
+        markdown = extract_text_from_file(io.BytesIO("# Titre\n\nCours été".encode()), filename="cours.md")
+    assert markdown == "# Titre\n\nCours été"
+
+
+def test_fast_path_pdf_skips_markitdown(temp_pdf):
+    from unittest.mock import patch
+    with patch("app.core.extraction.converter_registry.get", side_effect=AssertionError("markitdown used")):
+        markdown = extract_text_from_file(str(temp_pdf))
+    assert "HELLO PDF" in markdown
+
+
+def test_fast_path_non_utf8_text_falls_back():
+    markdown = extract_text_from_file(io.BytesIO("Cours d'été".encode("latin-1")), filename="cours.txt")
+    assert "Cours d" in markdown
+
+
+def test_spool_and_hash():
+    data = b"HELLO SPOOL" * 1000
+    buffer, digest = spool_and_hash(io.BytesIO(data))
+    with buffer:
+        assert buffer.read() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+
+
+def test_spool_and_hash_too_large():
+    with pytest.raises(DocumentTooLargeError):
+        spool_and_hash(io.BytesIO(b"x" * 100), max_size=10)
+
+
+def test_hash_upload_in_place():
+    data = b"HELLO UPLOAD" * 1000
+    stream = io.BytesIO(data)
+    buffer, digest = hash_upload(stream)
+    assert buffer is stream
+    assert buffer.read() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+
+
+def test_hash_upload_too_large():
+    with pytest.raises(DocumentTooLargeError):
+        hash_upload(io.BytesIO(b"x" * 100), max_size=10)
+
+
+def test_hash_upload_spools_unseekable_streams():
+    class Unseekable(io.BytesIO):
+        def seekable(self):
+            return False
+
+    buffer, digest = hash_upload(Unseekable(b"STREAMED"))
+    with buffer:
+        assert buffer.read() == b"STREAMED"
+    assert digest == hashlib.sha256(b"STREAMED").hexdigest()
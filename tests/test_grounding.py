@@ -0,0 +1,79 @@
+"""
+Tests for the source-span grounding index and the coverage map
+"""
+from app.core.grounding import GroundingIndex, coverage, section_spans, uncovered_text
+
+COURSE = """# Cells
+The mitochondria is the powerhouse of the cell. It produces ATP through cellular respiration.
+
+# Plants
+Photosynthesis converts light energy into chemical energy in the chloroplasts of plant cells.
+
+# History
+The first vaccine was developed by Edward Jenner in 1796 against smallpox.
+"""
+
+
+def test_locate_source_passage():
+    index = GroundingIndex(COURSE)
+    grounding = index.locate("Who developed the first vaccine?", "Edward Jenner")
+
+    assert grounding.supported
+    assert COURSE[grounding.start:grounding.end] == "The first vaccine was developed by Edward Jenner"
+
+
+def test_paraphrase_is_supported():
+    grounding = GroundingIndex(COURSE).locate("Where does photosynthesis take place?", "In the chloroplasts")
+
+    assert grounding.supported
+    assert "chloroplasts" in COURSE[grounding.start:grounding.end]
+
+
+def test_unsupported_question():
+    grounding = GroundingIndex(COURSE).locate("What is the capital of France?", "Paris")
+
+    assert not grounding.supported
+    assert grounding.start is None
+
+
+def test_section_spans():
+    assert [COURSE[start:end].split("\n")[0] for start, end in section_spans(COURSE)] == [
+        "# Cells", "# Plants", "# History",
+    ]
+
+    # no headings: groups of paragraphs
+    paragraphs = "\n\n".join(f"Paragraph {i} " + "word " * 100 for i in range(10))
+    spans = section_spans(paragraphs)
+    assert 1 < len(spans) < 10
+    assert "".join(paragraphs[start:end] for start, end in spans) == paragraphs
+
+
+def test_coverage_and_uncovered_sections():
+    index = GroundingIndex(COURSE)
+    groundings = [
+        ("q1", index.locate("Which organelle is the powerhouse of the cell?", "The mitochondria")),
+        ("q2", index.locate("What is the capital of France?", "Paris")),
+    ]
+    summary = coverage(COURSE, groundings)
+
+    assert summary["nb_sections"] == 3
+    assert summary["nb_covered"] == 1
+    assert [section["nb_questions"] for section in summary["sections"]] == [1, 0, 0]
+    assert summary["unsupported"] == ["q2"]
+
+    remaining = uncovered_text(COURSE, [grounding for _, grounding in groundings])
+    assert remaining.startswith("# Plants")
+    assert "mitochondria" not in remaining
+
+    # every section covered: the whole text
+    everything = [index.locate(question) for question in ("mitochondria", "photosynthesis", "vaccine")]
+    assert uncovered_text(COURSE, everything) == COURSE
+
+
+def test_index_lookup_scales():
+    sentences = [f"Topic {i} explains the concept number {i} with the keyword term{i}." for i in range(20000)]
+    index = GroundingIndex(" ".join(sentences))
+
+    grounding = index.locate("Which concept does topic 12345 explain?", "term12345")
+    assert "term12345" in index.text[grounding.start:grounding.end]
+    assert grounding.supported
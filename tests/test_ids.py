@@ -0,0 +1,77 @@
+"""
+Tests for the time-ordered ids and the GUID column type
+"""
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from app.db import Base, migrate_uuid_columns, upgrade_schema
+from app.ids import GUID, new_id, uuid7, uuid7_time
+from app.models import Result
+
+
+def test_uuid7_layout():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert before <= uuid7_time(str(value)) <= after
+
+
+def test_uuid7_explicit_time():
+    assert uuid7_time(str(uuid7(1_700_000_000_000))) == 1_700_000_000_000
+
+
+def test_ids_are_increasing():
+    ids = [new_id() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_models_get_uuid7_ids(test_user, test_document):
+    assert uuid.UUID(test_user.id).version == 7
+    assert test_document.id > test_user.id
+
+
+def test_guid_column_types():
+    assert "id UUID NOT NULL" in str(CreateTable(Result.__table__).compile(dialect=postgresql.dialect()))
+    assert "question_id UUID NOT NULL" in str(CreateTable(Result.__table__).compile(dialect=postgresql.dialect()))
+    assert "id TEXT NOT NULL" in str(CreateTable(Result.__table__).compile(dialect=sqlite.dialect()))
+
+
+def test_guid_bind_values():
+    guid = GUID()
+    value = new_id()
+    assert guid.process_bind_param(value.upper(), postgresql.dialect()) == value
+    # anything else matches no row instead of failing the query
+    assert guid.process_bind_param("unknown", postgresql.dialect()) is None
+    assert guid.process_bind_param("unknown", sqlite.dialect()) == "unknown"
+
+
+def test_migrate_is_postgres_only(db_session):
+    assert migrate_uuid_columns(db_session.bind) == []
+
+
+def test_upgrade_schema_of_a_current_database(db_session):
+    assert upgrade_schema(db_session.bind) == []
+
+
+def test_upgrade_schema_migrates_under_a_lock():
+    """An existing Postgres database is converted at startup, one process at a time"""
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    connection = engine.connect.return_value.__enter__.return_value
+    with patch("app.db.migrate_uuid_columns", return_value=["ALTER TABLE ..."]) as migrate, \
+            patch("app.db.migrate_compressed_columns", return_value=[]), \
+            patch("app.db.add_missing_columns", return_value=[]), \
+            patch.object(Base.metadata, "create_all"), patch("app.db.create_missing_indexes"):
+        assert upgrade_schema(engine) == ["ALTER TABLE ..."]
+
+    migrate.assert_called_once_with(engine)
+    locks = [str(call.args[0]) for call in connection.execute.call_args_list]
+    assert locks == ["SELECT pg_advisory_lock(:key)", "SELECT pg_advisory_unlock(:key)"]
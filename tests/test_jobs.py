@@ -0,0 +1,193 @@
+"""
+Tests for the database-backed job queue
+"""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core import jobs
+from app.core.jobs import (
+    JobError, claim_next, enqueue, enqueue_once, requeue_stale, run_job, set_progress, work,
+)
+from app.models import Job, JobStatus
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Register test job handlers"""
+    calls = []
+
+    def ok(session, job):
+        set_progress(session, job, 50)
+        calls.append(job.payload)
+        return {"doubled": job.payload["value"] * 2}
+
+    def expected_failure(session, job):
+        raise JobError("Nothing to do")
+
+    def crash(session, job):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setitem(jobs.HANDLERS, "ok", ok)
+    monkeypatch.setitem(jobs.HANDLERS, "expected_failure", expected_failure)
+    monkeypatch.setitem(jobs.HANDLERS, "crash", crash)
+    return calls
+
+
+class TestQueue:
+    """Tests for enqueue / claim_next"""
+
+    def test_claim_oldest_first(self, db_session):
+        first = enqueue(db_session, "ok", {"value": 1})
+        second = enqueue(db_session, "ok", {"value": 2})
+        db_session.commit()
+
+        claimed = claim_next(db_session, "worker-1")
+        assert claimed.id == first.id
+        assert claimed.status == JobStatus.running
+        assert claimed.locked_by == "worker-1"
+        assert claimed.attempts == 1
+
+        assert claim_next(db_session, "worker-2").id == second.id
+        assert claim_next(db_session, "worker-3") is None
+
+    def test_requeue_stale(self, db_session):
+        job = enqueue(db_session, "ok", {"value": 1})
+        db_session.commit()
+        claim_next(db_session, "dead-worker")
+
+        assert requeue_stale(db_session, stale_after=timedelta(hours=1)) == 0
+        assert requeue_stale(db_session, stale_after=timedelta(seconds=-1)) == 1
+        assert db_session.get(Job, job.id, populate_existing=True).status == JobStatus.queued
+
+    def test_heartbeat_keeps_long_jobs_alive(self, db_session):
+        from datetime import datetime
+        job = enqueue(db_session, "ok", {"value": 1})
+        db_session.commit()
+        claim_next(db_session, "busy-worker")
+        db_session.execute(update(Job).values(started_at=datetime(2000, 1, 1), heartbeat_at=datetime(2000, 1, 1)))
+        db_session.commit()
+
+        jobs._Heartbeat(job.id).beat()
+
+        assert requeue_stale(db_session, stale_after=timedelta(minutes=1)) == 0
+        assert db_session.get(Job, job.id, populate_existing=True).status == JobStatus.running
+
+    def test_fail_if_stale(self, db_session):
+        job, _ = enqueue_once(db_session, "ok", "generate:doc", status=JobStatus.running)
+
+        assert not jobs.fail_if_stale(db_session, job.id, stale_after=timedelta(minutes=1))
+        assert jobs.fail_if_stale(db_session, job.id, stale_after=timedelta(seconds=-1))
+
+        job = db_session.get(Job, job.id, populate_existing=True)
+        assert job.status == JobStatus.failed
+        assert job.active_key is None
+
+    def test_requeue_stale_gives_up_after_max_attempts(self, db_session):
+        job, _ = enqueue_once(db_session, "ok", "generate:doc", {"value": 1})
+        for _ in range(jobs.MAX_ATTEMPTS - 1):
+            claim_next(db_session, "crashing-worker")
+            assert requeue_stale(db_session, stale_after=timedelta(seconds=-1)) == 1
+
+        claim_next(db_session, "crashing-worker")
+        assert requeue_stale(db_session, stale_after=timedelta(seconds=-1)) == 0
+
+        job = db_session.get(Job, job.id, populate_existing=True)
+        assert job.status == JobStatus.failed
+        assert job.attempts == jobs.MAX_ATTEMPTS
+        assert "Worker lost" in job.error
+        assert job.active_key is None
+        assert claim_next(db_session, "worker") is None
+
+
+class TestRunJob:
+    """Tests for run_job"""
+
+    def test_success(self, db_session, handlers):
+        enqueue(db_session, "ok", {"value": 21})
+        db_session.commit()
+
+        job = run_job(db_session, claim_next(db_session, "w"))
+
+        assert job.status == JobStatus.succeeded
+        assert job.result == {"doubled": 42}
+        assert job.progress == 100
+        assert job.finished_at is not None
+
+    def test_expected_failure_is_not_retried(self, db_session, handlers):
+        enqueue(db_session, "expected_failure")
+        db_session.commit()
+
+        job = run_job(db_session, claim_next(db_session, "w"))
+
+        assert job.status == JobStatus.failed
+        assert job.error == "Nothing to do"
+
+    def test_unexpected_failure_is_retried(self, db_session, handlers):
+        enqueue(db_session, "crash")
+        db_session.commit()
+
+        for _ in range(jobs.MAX_ATTEMPTS - 1):
+            job = run_job(db_session, claim_next(db_session, "w"))
+            assert job.status == JobStatus.queued
+        job = run_job(db_session, claim_next(db_session, "w"))
+
+        assert job.status == JobStatus.failed
+        assert job.attempts == jobs.MAX_ATTEMPTS
+        assert "LLM unavailable" in job.error
+
+    def test_unknown_kind(self, db_session):
+        enqueue(db_session, "unknown")
+        db_session.commit()
+
+        job = run_job(db_session, claim_next(db_session, "w"))
+
+        assert job.status == JobStatus.failed
+        assert "No handler" in job.error
+
+
+class TestSingleFlight:
+    """Tests for enqueue_once (one in-flight job per active key)"""
+
+    def test_duplicate_attaches_to_inflight_job(self, db_session):
+        job, created = enqueue_once(db_session, "ok", "doc-1", {"value": 1})
+        duplicate, duplicate_created = enqueue_once(db_session, "ok", "doc-1", {"value": 1})
+        other, other_created = enqueue_once(db_session, "ok", "doc-2", {"value": 2})
+
+        assert created and not duplicate_created and other_created
+        assert duplicate.id == job.id
+        assert other.id != job.id
+        assert db_session.query(Job).count() == 2
+
+    @pytest.mark.parametrize("kind, status", [("ok", JobStatus.succeeded), ("expected_failure", JobStatus.failed)])
+    def test_key_released_when_finished(self, db_session, handlers, kind, status):
+        job, _ = enqueue_once(db_session, kind, "doc-1", {"value": 1})
+        job = run_job(db_session, claim_next(db_session, "worker-1"))
+        assert job.status == status
+        assert job.active_key is None
+
+        again, created = enqueue_once(db_session, kind, "doc-1", {"value": 1})
+        assert created and again.id != job.id
+
+    def test_key_kept_while_retrying(self, db_session, handlers):
+        enqueue_once(db_session, "crash", "doc-1")
+        job = run_job(db_session, claim_next(db_session, "worker-1"))
+        assert job.status == JobStatus.queued
+        assert job.active_key == "doc-1"
+
+    def test_created_running(self, db_session):
+        job, _ = enqueue_once(db_session, "ok", "doc-1", status=JobStatus.running)
+        assert job.attempts == 1
+        assert claim_next(db_session, "worker-1") is None
+
+
+def test_work_drains_queue(db_session, handlers):
+    for value in range(3):
+        enqueue(db_session, "ok", {"value": value})
+    db_session.commit()
+
+    assert work(worker_id="w", max_jobs=10) == 3
+    assert handlers == [{"value": 0}, {"value": 1}, {"value": 2}]
+    statuses = {job.status for job in db_session.query(Job).populate_existing()}
+    assert statuses == {JobStatus.succeeded}
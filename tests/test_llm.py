@@ -1,5 +1,8 @@
 import pytest 
-from app.core.llm import generate_mcq
+from unittest.mock import patch
+
+from app.core.condense import condense
+from app.core.llm import MCQStreamParser, generate_mcq, split_into_chunks, stream_mcq, _allocate_questions
 
 TEXT = """ 
 Bees play a crucial role in pollination, which is essential for the reproduction of many plants. 
@@ -53,3 +56,125 @@ def test_generate_mcq_output_structure():
         correct_answer_clean = q["correct_answer"].strip().rstrip('.')
         answers_clean = [ans.strip().rstrip('.') for ans in q["answers"]]
         assert correct_answer_clean in answers_clean or q["correct_answer"] in q["answers"]
+
+
+# --------------------------------------------------------------------------------------------------
+# Unit tests: map-reduce generation of long documents
+# --------------------------------------------------------------------------------------------------
+
+LONG_TEXT = "\n\n".join(f"# Chapter {i}\n\n" + f"Content of chapter {i}. " * 50 for i in range(6))
+
+
+def test_split_into_chunks_respects_max_size():
+    chunks = split_into_chunks(LONG_TEXT, max_chars=2000)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert chunks[0].startswith("# Chapter 0")
+    # nothing is lost
+    assert sum(chunk.count("Content of chapter") for chunk in chunks) == 300
+
+
+def test_split_into_chunks_huge_paragraph():
+    chunks = split_into_chunks("x" * 2500, max_chars=1000)
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+
+
+def test_short_text_is_a_single_chunk():
+    assert split_into_chunks(TEXT, max_chars=5000) == [TEXT.strip()]
+
+
+def test_allocate_questions_proportional():
+    assert _allocate_questions(["a" * 100, "b" * 300], 8) == [2, 6]
+    assert sum(_allocate_questions(["a" * 10] * 3, 10)) == 10
+    assert sorted(_allocate_questions(["a" * 10] * 4, 2)) == [0, 0, 1, 1]
+
+
+def _fake_generate(text, nb_questions, existing=None, document_chars=None):
+    chapter = text.split("\n")[0]
+    questions = [
+        {"question": f"{chapter} question {i}?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"}
+        for i in range(nb_questions)
+    ]
+    # every chunk also returns the same paraphrased question
+    questions.append({"question": "What is this course about ?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"})
+    return questions
+
+
+def test_generate_mcq_map_reduce():
+    progress = []
+    with patch("app.core.llm._generate_single", side_effect=_fake_generate) as mock_single:
+        quiz = generate_mcq(LONG_TEXT, nb_questions=6, max_chunk_chars=2000, max_concurrency=3,
+                            progress=lambda done, total: progress.append((done, total)))
+
+    assert mock_single.call_count > 1
+    assert sum(call.args[1] for call in mock_single.call_args_list) == 6
+    assert len(quiz) == 6
+    assert quiz[0]["question"].startswith("# Chapter 0")
+    questions = [q["question"] for q in quiz]
+    assert len(set(questions)) == len(questions)
+    assert progress[-1] == (mock_single.call_count, mock_single.call_count)
+
+
+def test_generate_mcq_short_text_single_call():
+    with patch("app.core.llm._generate_single", return_value=[]) as mock_single:
+        generate_mcq(TEXT, nb_questions=3)
+    mock_single.assert_called_once_with(condense(TEXT).text, 3, None, len(TEXT))
+
+
+def test_generate_mcq_failed_chunk():
+    def flaky(text, nb_questions, existing=None, document_chars=None):
+        if "Chapter 0" in text:
+            raise RuntimeError("timeout")
+        return _fake_generate(text, nb_questions)
+
+    with patch("app.core.llm._generate_single", side_effect=flaky):
+        quiz = generate_mcq(LONG_TEXT, nb_questions=6, max_chunk_chars=2000)
+
+    assert quiz
+    assert not any("Chapter 0" in q["question"] for q in quiz)
+
+
+def test_stream_parser_yields_complete_questions():
+    document = (
+        '{"questions": [{"question": "A {brace} \\"quoted\\"?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"},'
+        ' {"question": "Broken", "answers": "x", "correct_answer": "x"},'
+        ' {"question": "B?", "answers": ["a", "b", "c", "d"], "correct_answer": "b"}]}'
+    )
+    parser = MCQStreamParser()
+    received = []
+    for i in range(0, len(document), 7):
+        received.append(parser.feed(document[i:i + 7]))
+
+    questions = [q for batch in received for q in batch]
+    assert [q["question"] for q in questions] == ['A {brace} "quoted"?', "B?"]
+    # the first question is out before the end of the stream
+    first = next(i for i, batch in enumerate(received) if batch)
+    assert first < len(received) // 2
+
+
+def test_stream_mcq_deduplicates_and_stops(stub_provider):
+    with patch.object(stub_provider, "stream", return_value=iter([
+        '{"questions": [{"question": "Q1", "answers": ["a","b","c","d"], "correct_answer": "a"},',
+        '{"question": "q1!", "answers": ["a","b","c","d"], "correct_answer": "a"},',
+        '{"question": "Q2", "answers": ["a","b","c","d"], "correct_answer": "a"},',
+        '{"question": "Q3", "answers": ["a","b","c","d"], "correct_answer": "a"}]}',
+    ])):
+        questions = list(stream_mcq("Some course", nb_questions=2))
+
+    assert [q["question"] for q in questions] == ["Q1", "Q2"]
+
+
+def test_generate_mcq_topup_skips_existing():
+    existing = ["What is this course about?"]
+    with patch("app.core.llm._generate_single", side_effect=_fake_generate) as mock_single:
+        quiz = generate_mcq(LONG_TEXT, nb_questions=6, max_chunk_chars=2000, existing=existing)
+
+    assert all(call.args[2] == existing for call in mock_single.call_args_list)
+    assert "What is this course about ?" not in [q["question"] for q in quiz]
+
+
+def test_build_prompt_lists_existing_questions():
+    from app.core.llm import _build_prompt
+    prompt = _build_prompt("Course", 3, existing=["Old question?"])
+    assert "- Old question?" in prompt
+    assert "Old question?" not in _build_prompt("Course", 3)
@@ -0,0 +1,156 @@
+"""
+Tests for the persistent LLM response cache
+"""
+import json
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import llm
+from app.core import llm_cache
+from app.core.llm_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "llm-cache"))
+
+
+class TestResponseCache:
+    """Tests for ResponseCache"""
+
+    def test_key_depends_on_every_field(self):
+        key = ResponseCache.make_key("model", "prompt", 10)
+        assert key == ResponseCache.make_key("model", "prompt", 10)
+        assert key != ResponseCache.make_key("other-model", "prompt", 10)
+        assert key != ResponseCache.make_key("model", "other prompt", 10)
+        assert key != ResponseCache.make_key("model", "prompt", 5)
+
+    def test_set_get_and_counters(self, cache):
+        assert cache.get("k") is None
+        cache.set("k", [{"question": "Q?"}])
+        assert cache.get("k") == [{"question": "Q?"}]
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["entries"] == 1
+
+    def test_persistent_across_instances(self, cache):
+        cache.set("k", ["value"])
+        assert ResponseCache(cache.directory).get("k") == ["value"]
+
+    def test_age_eviction(self, tmp_path):
+        cache = ResponseCache(str(tmp_path), max_age=60)
+        cache.set("old", ["value"])
+        path = os.path.join(cache.directory, "old.json")
+        with open(path) as f:
+            entry = json.load(f)
+        entry["created_at"] -= 120
+        with open(path, "w") as f:
+            json.dump(entry, f)
+
+        assert cache.get("old") is None
+        assert not os.path.exists(path)
+
+    def test_size_eviction_least_recently_used(self, tmp_path):
+        cache = ResponseCache(str(tmp_path), max_bytes=300)
+        cache.set("a", "x" * 80)
+        cache.set("b", "x" * 80)
+        # "a" is used, "b" becomes the least recently used entry
+        past = time.time() - 10
+        os.utime(os.path.join(cache.directory, "b.json"), (past, past))
+        cache.set("c", "x" * 80)
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_directory_scanned_only_when_needed(self, cache, monkeypatch):
+        monkeypatch.setattr(llm_cache, "EVICT_EVERY", 10)
+        with patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for i in range(20):
+                cache.set(f"k{i}", ["value"])
+        # first write (size unknown), then every 10 writes
+        assert evict.call_count == 3
+
+    def test_counters_shared_by_processes(self, cache, monkeypatch):
+        monkeypatch.setattr(llm_cache, "FLUSH_EVERY", 2)
+        other = ResponseCache(cache.directory)
+        cache.set("k", ["value"])
+        for _ in range(3):
+            other.get("k")
+        other.get("missing")
+        cache.get("missing")
+
+        stats = ResponseCache(cache.directory).stats()
+        assert (stats["hits"], stats["misses"]) == (3, 1)
+        assert (cache.stats()["hits"], cache.stats()["misses"]) == (3, 2)
+
+    def test_counters_compacted_by_eviction(self, cache, monkeypatch):
+        monkeypatch.setattr(llm_cache, "FLUSH_EVERY", 1)
+        for _ in range(5):
+            cache.get("missing")
+        cache.evict()
+
+        with open(os.path.join(cache.directory, llm_cache.COUNTERS_FILE)) as f:
+            assert f.read() == "0 5\n"
+        cache.get("missing")
+        assert cache.stats()["misses"] == 6
+
+    def test_hit_on_entry_evicted_meanwhile(self, cache):
+        """Another process removing the entry after it was read does not fail the lookup"""
+        cache.set("k", ["value"])
+        with patch.object(llm_cache.os, "utime", side_effect=FileNotFoundError):
+            assert cache.get("k") == ["value"]
+
+    def test_stats_command(self, app, runner, cache, monkeypatch):
+        monkeypatch.setattr(llm, "response_cache", cache)
+        cache.set("k", ["value"])
+        cache.get("k")
+        cache.get("missing")
+
+        result = runner.invoke(args=["llm-cache", "stats"])
+
+        assert result.exit_code == 0
+        assert "1 entries" in result.output
+        assert "1 hits, 1 misses (50% hit rate)" in result.output
+
+    def test_clear(self, cache):
+        cache.set("k", ["value"])
+        cache.clear()
+        assert cache.stats()["entries"] == 0
+
+
+def test_generate_mcq_uses_cache(cache, monkeypatch):
+    from app.core import llm
+    monkeypatch.setattr(llm, "response_cache", cache)
+    provider = MagicMock(name="provider")
+    provider.generate.return_value = json.dumps({"questions": [
+        {"question": "Q?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"}
+    ]})
+
+    with patch.object(llm, "_provider", provider):
+        first = llm.generate_mcq("Some course", nb_questions=1)
+        second = llm.generate_mcq("Some course", nb_questions=1)
+        llm.generate_mcq("Some course", nb_questions=2)
+
+    assert first == second
+    assert provider.generate.call_count == 2
+    assert cache.hits == 1
+
+
+def test_generate_mcq_does_not_cache_failures(cache, monkeypatch):
+    from app.core import llm
+    monkeypatch.setattr(llm, "response_cache", cache)
+    provider = MagicMock(name="provider")
+    provider.generate.return_value = "not json"
+
+    with patch.object(llm, "_provider", provider):
+        assert llm.generate_mcq("Some course", nb_questions=1) == []
+        assert llm.generate_mcq("Some course", nb_questions=1) == []
+
+    assert provider.generate.call_count == 2
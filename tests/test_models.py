@@ -2,6 +2,7 @@
 Tests for database models
 """
 import pytest
+from sqlalchemy import inspect, select, text
 from app.models import User, Document, Question, QuizSession, Result, QuestionType
 
 
@@ -286,3 +287,145 @@ class TestResultModel:
         assert result.question.id == question.id
         assert result.question.question == question.question
 
+
+
+class TestIndexes:
+    """The hot queries of the pages walk an index (EXPLAIN QUERY PLAN)"""
+
+    HOT_QUERIES = [
+        (lambda: select(Document).where(Document.user_id == "u").order_by(Document.created_at.desc()),
+         "ix_documents_user_id_created_at"),
+        (lambda: select(Question).where(Question.document_id == "d"), "ix_questions_document_id"),
+        (lambda: select(QuizSession).where(QuizSession.user_id == "u", QuizSession.document_id == "d")
+         .order_by(QuizSession.played_at.asc()),
+         "ix_quiz_sessions_user_id_document_id_played_at"),
+        (lambda: select(Result).where(Result.question_id == "q"), "ix_results_question_id"),
+        (lambda: select(Result).where(Result.quiz_session_id == "s"), "ix_results_quiz_session_id"),
+    ]
+
+    @pytest.mark.parametrize("build, index_name", HOT_QUERIES)
+    def test_query_uses_index(self, db_session, build, index_name):
+        statement = build().compile(db_session.bind, compile_kwargs={"literal_binds": True})
+        plan = [row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {statement}"))]
+
+        assert any(index_name in line for line in plan), plan
+        assert not any(line.startswith("SCAN") or "TEMP B-TREE" in line for line in plan), plan
+
+    def test_missing_indexes_are_created(self, db_session):
+        from app.db import create_missing_indexes
+
+        db_session.execute(text("DROP INDEX ix_results_question_id"))
+        db_session.commit()
+        create_missing_indexes(db_session.bind)
+
+        assert "ix_results_question_id" in {index["name"] for index in inspect(db_session.bind).get_indexes("results")}
+
+    def test_indexes_are_created_under_the_schema_lock(self):
+        """Web and job workers booting together do not race to create the same index"""
+        from unittest.mock import MagicMock, patch
+
+        from app.db import Base, upgrade_schema
+
+        engine = MagicMock()
+        engine.dialect.name = "postgresql"
+        events = []
+        engine.connect.return_value.__enter__.return_value.execute.side_effect = (
+            lambda statement, params: events.append(str(statement).split("(")[0])
+        )
+        with patch("app.db.migrate_uuid_columns", return_value=[]), \
+                patch("app.db.migrate_compressed_columns", return_value=[]), \
+                patch("app.db.add_missing_columns", return_value=[]), \
+                patch.object(Base.metadata, "create_all", side_effect=lambda engine: events.append("create_all")), \
+                patch("app.db.create_missing_indexes", side_effect=lambda engine: events.append("indexes")):
+            upgrade_schema(engine)
+
+        assert events == ["SELECT pg_advisory_lock", "create_all", "indexes", "SELECT pg_advisory_unlock"]
+
+
+# Schema of the databases created before the columns added since (content_hash ...)
+BASELINE_SCHEMA = [
+    "CREATE TABLE users (id TEXT NOT NULL PRIMARY KEY, username TEXT NOT NULL UNIQUE, email TEXT NOT NULL UNIQUE, "
+    "password_hash TEXT NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE documents (id TEXT NOT NULL PRIMARY KEY, title TEXT NOT NULL, content TEXT NOT NULL, "
+    "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), user_id TEXT REFERENCES users (id))",
+    "CREATE TABLE questions (id TEXT NOT NULL PRIMARY KEY, type VARCHAR(6) NOT NULL, question TEXT NOT NULL, "
+    "choices JSON, answer TEXT, document_id TEXT NOT NULL REFERENCES documents (id))",
+    "CREATE TABLE quiz_sessions (id TEXT NOT NULL PRIMARY KEY, score FLOAT NOT NULL, total_questions INTEGER NOT NULL, "
+    "played_at DATETIME DEFAULT (CURRENT_TIMESTAMP), user_id TEXT REFERENCES users (id), "
+    "document_id TEXT NOT NULL REFERENCES documents (id))",
+    "CREATE TABLE results (id TEXT NOT NULL PRIMARY KEY, user_answer TEXT NOT NULL, is_correct BOOLEAN, "
+    "evaluation TEXT, reviewed_at DATETIME DEFAULT (CURRENT_TIMESTAMP), question_id TEXT NOT NULL "
+    "REFERENCES questions (id), user_id TEXT REFERENCES users (id), quiz_session_id TEXT REFERENCES quiz_sessions (id))",
+    "INSERT INTO users (id, username, email, password_hash) VALUES ('u1', 'old', 'old@example.com', 'x')",
+    "INSERT INTO documents (id, title, content, user_id) VALUES ('d1', 'Old course', 'Bees make honey.', 'u1')",
+    "INSERT INTO questions (id, type, question, choices, answer, document_id) VALUES "
+    "('q1', 'qcm', 'What do bees make?', '[\"Honey\", \"Milk\"]', 'Honey', 'd1')",
+]
+
+
+class TestSchemaUpgrade:
+    """An existing database is brought to the schema of the models on startup"""
+
+    @pytest.fixture
+    def baseline_app(self, tmp_path, monkeypatch):
+        """The app started on a database created by the baseline schema"""
+        from sqlalchemy import create_engine
+
+        from app import create_app
+        from app.db import LocalSession
+
+        url = f"sqlite:///{tmp_path / 'baseline.db'}"
+        engine = create_engine(url)
+        with engine.begin() as connection:
+            for statement in BASELINE_SCHEMA:
+                connection.execute(text(statement))
+        engine.dispose()
+
+        monkeypatch.setenv("DATABASE_URL", url)
+        monkeypatch.setenv("SECRET_KEY", "test-secret-key-for-testing-only")
+        yield create_app()
+        LocalSession().bind.dispose()
+
+    def test_app_starts_on_a_baseline_database(self, baseline_app):
+        from app.db import LocalSession
+
+        with LocalSession() as session:
+            columns = {column["name"] for column in inspect(session.bind).get_columns("documents")}
+            assert "content_hash" in columns
+            assert "ix_documents_content_hash" in {
+                index["name"] for index in inspect(session.bind).get_indexes("documents")
+            }
+            document = session.get(Document, "d1")
+            assert (document.content, document.content_hash) == ("Bees make honey.", None)
+
+    def test_questions_of_a_baseline_database_get_signatures(self, baseline_app):
+        from app.core.dedupe import load_index
+        from app.db import LocalSession
+
+        with LocalSession() as session:
+            assert "signature" in {column["name"] for column in inspect(session.bind).get_columns("questions")}
+            assert len(load_index(session, "d1")) == 1
+            session.commit()
+            assert session.get(Question, "q1").signature is not None
+
+    def test_questions_of_a_baseline_database_get_groundings(self, baseline_app):
+        from app.core.grounding import GroundingIndex, ensure_grounding
+        from app.db import LocalSession
+
+        with LocalSession() as session:
+            columns = {column["name"] for column in inspect(session.bind).get_columns("questions")}
+            assert {"source_start", "source_end", "source_score", "created_at"} <= columns
+            question = session.get(Question, "q1")
+            assert question.source_score is None
+            ensure_grounding(question, GroundingIndex(question.document.content))
+            session.commit()
+            assert session.get(Question, "q1").source_score is not None
+
+    def test_missing_not_null_column_is_refused(self, db_session):
+        from app.db import add_missing_columns
+
+        db_session.execute(text("DROP INDEX ix_documents_user_id_created_at"))
+        db_session.execute(text("ALTER TABLE documents DROP COLUMN title"))
+        db_session.commit()
+        with pytest.raises(RuntimeError, match='"documents"."title"'):
+            add_missing_columns(db_session.bind)
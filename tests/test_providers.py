@@ -0,0 +1,95 @@
+"""
+Tests for the LLM provider layer
+"""
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import llm
+from app.core.llm import MCQList, _build_prompt
+from app.core.providers import (
+    GeminiProvider, LLMProvider, OpenAIProvider, StubProvider, create_provider,
+)
+
+TEXT = """
+Bees play a crucial role in pollination of many plants.
+As they collect nectar, pollen grains stick to their bodies.
+This process increases genetic diversity and improves crop yields.
+"""
+
+
+class TestCreateProvider:
+
+    def test_default_is_gemini(self, monkeypatch):
+        monkeypatch.delenv("LLM_PROVIDER", raising=False)
+        monkeypatch.delenv("LLM_MODEL", raising=False)
+        provider = create_provider()
+        assert isinstance(provider, GeminiProvider)
+        assert provider.model == "gemini-2.5-flash"
+
+    def test_selected_from_env(self, monkeypatch):
+        monkeypatch.setenv("LLM_PROVIDER", "OpenAI")
+        monkeypatch.setenv("LLM_MODEL", "llama3")
+        provider = create_provider()
+        assert isinstance(provider, OpenAIProvider)
+        assert provider.model == "llama3"
+
+    def test_unknown_provider(self):
+        with pytest.raises(ValueError):
+            create_provider("nope")
+
+    def test_provider_must_implement_generate_and_stream(self):
+        class GenerateOnly(LLMProvider):
+            name = "stub"
+
+            def generate(self, prompt, schema):
+                return None
+
+        with pytest.raises(TypeError):
+            GenerateOnly()
+
+    def test_gemini_client_is_lazy(self):
+        provider = GeminiProvider()
+        assert provider._client is None
+
+
+class TestStubProvider:
+
+    def test_valid_and_deterministic(self):
+        provider = StubProvider(latency=0)
+        prompt = _build_prompt(TEXT, nb_questions=2)
+
+        first = provider.generate(prompt, MCQList)
+        quiz = MCQList.model_validate_json(first)
+
+        assert first == provider.generate(prompt, MCQList)
+        assert len(quiz.questions) == 2
+        for mcq in quiz.questions:
+            assert len(mcq.answers) == 4
+            assert mcq.correct_answer in mcq.answers
+
+    def test_latency(self):
+        provider = StubProvider(latency=0.05)
+        start = time.perf_counter()
+        provider.generate(_build_prompt(TEXT, nb_questions=1), MCQList)
+        assert time.perf_counter() - start >= 0.05
+
+    def test_generate_mcq_end_to_end(self, monkeypatch):
+        monkeypatch.setattr(llm, "_provider", StubProvider(latency=0))
+        questions = llm.generate_mcq(TEXT, nb_questions=3)
+        assert len(questions) == 3
+
+
+def test_openai_provider_request():
+    provider = OpenAIProvider(model="local-model", base_url="http://localhost:8000/v1")
+    completion = MagicMock()
+    completion.choices[0].message.content = '{"questions": []}'
+
+    with patch.object(OpenAIProvider, "client") as mock_client:
+        mock_client.chat.completions.create.return_value = completion
+        assert provider.generate("prompt", MCQList) == '{"questions": []}'
+
+    kwargs = mock_client.chat.completions.create.call_args.kwargs
+    assert kwargs["model"] == "local-model"
+    assert kwargs["response_format"]["json_schema"]["name"] == "MCQList"
@@ -1,6 +1,8 @@
 """
 Tests for quiz routes
 """
+import time
+from unittest.mock import patch
 
 
 class TestGenerateQuiz:
@@ -78,6 +80,78 @@ class TestGenerateQuiz:
         assert "error" in data
         assert "No question has been generated" in data["error"]
 
+    def test_topup_appends_new_questions(self, authenticated_client, test_document, test_questions, db_session):
+        """Test that a top-up lists the existing questions and only appends new ones"""
+        new_questions = [
+            {"question": "Test Question 1?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"},
+            {"question": "A brand new question?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"},
+        ]
+        with patch("app.routes.quizzes.generate_mcq", return_value=new_questions[1:]) as mock_generate:
+            response = authenticated_client.post(
+                f"/api/quizzes/generate?document_id={test_document.id}&mode=topup&count=5"
+            )
+
+        assert response.status_code == 201
+        assert response.get_json()["message"] == "1 MCQs added"
+        kwargs = mock_generate.call_args.kwargs
+        assert kwargs["nb_questions"] == 5
+        assert kwargs["existing"] == ["Test Question 1?", "Test Question 2?", "Test Question 3?"]
+
+        from app.models import Question
+        assert db_session.query(Question).filter_by(document_id=test_document.id).count() == 4
+
+    def test_topup_rejects_near_duplicates(self, authenticated_client, test_document, test_questions, db_session):
+        """Test that paraphrases of existing questions are not inserted"""
+        paraphrase = {"question": "test question 1 ?", "answers": ["Option A", "Option B", "Option C", "Option D"],
+                      "correct_answer": "Option A"}
+        with patch("app.routes.quizzes.generate_mcq", return_value=[paraphrase]):
+            response = authenticated_client.post(f"/api/quizzes/generate?document_id={test_document.id}&mode=topup")
+
+        assert response.status_code == 500
+        assert "No new question" in response.get_json()["error"]
+
+        from app.models import Question
+        assert db_session.query(Question).filter_by(document_id=test_document.id).count() == 3
+
+    def test_topup_targets_uncovered_sections(self, authenticated_client, test_document, db_session):
+        """Test that a top-up only sends the sections no question is grounded in"""
+        from app.models import Question, QuestionType
+        test_document.content = (
+            "# Cells\nThe mitochondria is the powerhouse of the cell.\n\n"
+            "# History\nThe first vaccine was developed by Edward Jenner in 1796."
+        )
+        db_session.add(Question(type=QuestionType.qcm, question="Which organelle is the powerhouse of the cell?",
+                                choices=["Mitochondria", "Nucleus"], answer="Mitochondria", document_id=test_document.id))
+        db_session.commit()
+
+        new_question = {"question": "Who developed the first vaccine?", "answers": ["Edward Jenner", "Louis Pasteur"],
+                        "correct_answer": "Edward Jenner"}
+        with patch("app.routes.quizzes.generate_mcq", return_value=[new_question]) as mock_generate:
+            response = authenticated_client.post(f"/api/quizzes/generate?document_id={test_document.id}&mode=topup")
+
+        assert response.status_code == 201
+        assert mock_generate.call_args.args[0] == "# History\nThe first vaccine was developed by Edward Jenner in 1796."
+
+        questions = db_session.query(Question).filter_by(document_id=test_document.id).all()
+        assert all(question.source_score is not None for question in questions)
+        added = next(question for question in questions if question.question == new_question["question"])
+        assert test_document.content[added.source_start:added.source_end].startswith("The first vaccine")
+
+    def test_topup_invalid_count(self, authenticated_client, test_document):
+        """Test top-up with an out of range count"""
+        for count in ("0", "abc", "1000"):
+            response = authenticated_client.post(
+                f"/api/quizzes/generate?document_id={test_document.id}&mode=topup&count={count}"
+            )
+            assert response.status_code == 400
+
+    def test_topup_nothing_new(self, authenticated_client, test_document, test_questions, mock_generate_mcq_empty):
+        """Test top-up when the model only returns known questions"""
+        response = authenticated_client.post(f"/api/quizzes/generate?document_id={test_document.id}&mode=topup")
+
+        assert response.status_code == 500
+        assert "No new question" in response.get_json()["error"]
+
     def test_generate_unauthenticated(self, client, test_document_no_questions):
         """Test generation without authentication"""
         document_id = test_document_no_questions.id
@@ -89,3 +163,279 @@ class TestGenerateQuiz:
         
         assert response.status_code == 302  # Redirect to login
 
+    def test_eager_job_runs_as_running(self, authenticated_client, test_document_no_questions, db_session):
+        """With JOBS_EAGER the request runs the job: it is running with a heartbeat, so a
+        worker cannot claim it and a lost request is detected
+        """
+        from app.core.jobs import claim_next
+        from app.models import Job, JobStatus
+        seen = []
+
+        def generate(*args, **kwargs):
+            job = db_session.query(Job).one()
+            seen.append((job.status, job.heartbeat_at is not None, claim_next(db_session, "other-worker")))
+            return [{"question": "Q?", "answers": ["a", "b"], "correct_answer": "a"}]
+
+        with patch("app.routes.quizzes.generate_mcq", side_effect=generate):
+            response = authenticated_client.post(f"/api/quizzes/generate?document_id={test_document_no_questions.id}")
+
+        assert response.status_code == 201
+        assert seen == [(JobStatus.running, True, None)]
+
+
+
+def test_existing_questions_oldest_first(db_session, test_document_no_questions):
+    """Ordered by creation time, the questions generated before created_at existed first:
+    their random (v4) ids sort anywhere among the time-ordered ones
+    """
+    from datetime import datetime, timedelta
+    from app.ids import new_id
+    from app.models import Question, QuestionType
+    from app.routes.quizzes import _existing_questions
+    start = datetime(2026, 1, 1)
+    ids = [new_id() for _ in range(3)]
+    for i, question_id in reversed(list(enumerate(ids))):
+        db_session.add(Question(id=question_id, type=QuestionType.qcm, question=f"Q{i}?", choices=["a", "b"],
+                                answer="a", document_id=test_document_no_questions.id,
+                                created_at=start + timedelta(seconds=i)))
+    legacy = "ffffffff-ffff-4fff-bfff-ffffffffffff"
+    db_session.add(Question(id=legacy, type=QuestionType.qcm, question="Old?", choices=["a", "b"],
+                            answer="a", document_id=test_document_no_questions.id))
+    db_session.commit()
+    db_session.query(Question).filter_by(id=legacy).update({"created_at": None})
+    db_session.commit()
+
+    assert [q.id for q in _existing_questions(db_session, test_document_no_questions.id)] == [legacy] + ids
+
+
+def _read_events(response):
+    """Parse a Server-Sent Events body into (event, data) pairs"""
+    import json
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestGenerateQuizStream:
+    """Tests for GET /api/quizzes/generate/stream"""
+
+    def test_stream_saves_and_sends_questions(self, authenticated_client, test_document_no_questions, stub_provider, db_session):
+        document_id = test_document_no_questions.id
+        response = authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}")
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        events = _read_events(response)
+        assert [name for name, _ in events] == ["question", "done"]
+        assert "answer" not in events[0][1]
+
+        from app.models import Question
+        question = db_session.query(Question).filter_by(document_id=document_id).one()
+        assert question.id == events[0][1]["id"]
+
+    def test_stream_error_event(self, authenticated_client, test_document_no_questions):
+        with patch("app.routes.quizzes.stream_mcq", side_effect=RuntimeError("LLM down")):
+            response = authenticated_client.get(
+                f"/api/quizzes/generate/stream?document_id={test_document_no_questions.id}"
+            )
+        assert _read_events(response) == [("error", {"error": "LLM down", "nb_questions": 0})]
+
+    def test_stream_already_exists(self, authenticated_client, test_document, test_questions):
+        response = authenticated_client.get(f"/api/quizzes/generate/stream?document_id={test_document.id}")
+        assert response.status_code == 409
+
+    def test_stream_releases_generation(self, authenticated_client, test_document_no_questions, stub_provider, db_session):
+        authenticated_client.get(f"/api/quizzes/generate/stream?document_id={test_document_no_questions.id}").get_data()
+
+        from app.models import Job, JobStatus
+        job = db_session.query(Job).one()
+        assert job.status == JobStatus.succeeded
+        assert job.active_key is None
+        assert job.result == {"nb_questions": 1}
+
+    def test_stream_follows_inflight_generation(self, authenticated_client, test_document_no_questions, db_session, monkeypatch):
+        """A second stream attaches to the running generation instead of calling the LLM"""
+        from types import SimpleNamespace
+        from app.core.jobs import enqueue_once, finish
+        from app.models import Job, JobStatus, Question, QuestionType
+        from app.routes import quizzes
+
+        document_id = test_document_no_questions.id
+        job, _ = enqueue_once(db_session, "generate_quiz", f"generate_quiz:{document_id}", status=JobStatus.running)
+        db_session.add(Question(type=QuestionType.qcm, question="Q1?", choices=["a", "b"], answer="a", document_id=document_id))
+        db_session.commit()
+
+        def finish_generation(seconds):
+            # the first poll saw Q1: the other generation saves Q2 and finishes
+            running = db_session.get(Job, job.id)
+            db_session.add(Question(type=QuestionType.qcm, question="Q2?", choices=["a", "b"], answer="a", document_id=document_id))
+            finish(running, JobStatus.succeeded, result={"nb_questions": 2})
+            db_session.commit()
+
+        monkeypatch.setattr(quizzes, "time", SimpleNamespace(sleep=finish_generation, monotonic=time.monotonic))
+        with patch("app.routes.quizzes.stream_mcq") as mock_stream:
+            response = authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}")
+            events = _read_events(response)
+
+        mock_stream.assert_not_called()
+        assert [name for name, _ in events] == ["question", "question", "done"]
+        assert {data["question"] for name, data in events[:2]} == {"Q1?", "Q2?"}
+
+    def test_stream_topup(self, authenticated_client, test_document_no_questions, stub_provider, db_session):
+        """A streamed top-up skips the questions the stub already generated"""
+        document_id = test_document_no_questions.id
+        test_document_no_questions.content = "Bees pollinate many flowering plants. Honey is made from the nectar of flowers."
+        db_session.commit()
+
+        first = _read_events(authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}&count=1"))
+        topup = _read_events(authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}&mode=topup&count=5"))
+
+        assert [name for name, _ in first] == ["question", "done"]
+        assert [name for name, _ in topup] == ["question", "done"]
+        assert topup[-1][1]["message"] == "1 MCQs added"
+        assert topup[0][1]["question"] != first[0][1]["question"]
+
+    def test_stream_follows_the_worker(self, app, authenticated_client, test_document_no_questions, stub_provider, db_session, monkeypatch):
+        """Without JOBS_EAGER the stream only queues the job: the worker generates the questions"""
+        from types import SimpleNamespace
+        from app.core.jobs import work
+        from app.models import Job, JobStatus
+        from app.routes import quizzes
+        app.config["JOBS_EAGER"] = False
+        document_id = test_document_no_questions.id
+        polls = []
+
+        def worker_runs(seconds):
+            polls.append(db_session.query(Job).one().status)
+            work(worker_id="test-worker", max_jobs=1)
+
+        monkeypatch.setattr(quizzes, "time", SimpleNamespace(sleep=worker_runs, monotonic=time.monotonic))
+        events = _read_events(authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}"))
+
+        assert polls == [JobStatus.queued]
+        assert [name for name, _ in events] == ["question", "done"]
+        job = db_session.query(Job).one()
+        assert job.payload["stream"] is True
+        assert job.status == JobStatus.succeeded
+        assert job.progress == 100
+
+    def test_stream_releases_a_stale_generation(self, authenticated_client, test_document_no_questions, db_session):
+        """A running generation without heartbeat is failed and its document released"""
+        from datetime import datetime
+        from app.core.jobs import enqueue_once, get_active
+        from app.models import Job, JobStatus
+
+        document_id = test_document_no_questions.id
+        job, _ = enqueue_once(db_session, "generate_quiz", f"generate_quiz:{document_id}", status=JobStatus.running)
+        job.heartbeat_at = datetime(2000, 1, 1)
+        db_session.commit()
+
+        events = _read_events(authenticated_client.get(f"/api/quizzes/generate/stream?document_id={document_id}"))
+
+        assert events[-1][0] == "error"
+        assert "Generation lost" in events[-1][1]["error"]
+        assert db_session.get(Job, job.id, populate_existing=True).status == JobStatus.failed
+        assert get_active(db_session, f"generate_quiz:{document_id}") is None
+
+    def test_stream_stops_following_after_a_while(self, app, authenticated_client, test_document_no_questions, db_session, monkeypatch):
+        """A queued generation nobody runs is not followed forever"""
+        from app.routes import quizzes
+        app.config["JOBS_EAGER"] = False
+        monkeypatch.setattr(quizzes, "FOLLOW_MAX_SECONDS", 0)
+
+        response = authenticated_client.get(f"/api/quizzes/generate/stream?document_id={test_document_no_questions.id}")
+        events = _read_events(response)
+
+        assert [name for name, _ in events] == ["error"]
+        assert "still in progress" in events[0][1]["error"]
+        assert events[0][1]["status_url"].endswith(events[0][1]["job_id"])
+
+    def test_stream_missing_document_id(self, authenticated_client):
+        response = authenticated_client.get("/api/quizzes/generate/stream")
+        assert response.status_code == 400
+
+
+class TestGenerateQuizQueued:
+    """Tests for the queued (non eager) generation and GET /api/quizzes/jobs/<job_id>"""
+
+    def test_generate_returns_job_id(self, app, authenticated_client, test_document_no_questions, mock_generate_mcq, db_session):
+        """Test that generation is queued and completed by the worker"""
+        app.config["JOBS_EAGER"] = False
+        document_id = test_document_no_questions.id
+
+        response = authenticated_client.post(f"/api/quizzes/generate?document_id={document_id}")
+
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data["status"] == "queued"
+        job_id = data["job_id"]
+
+        status = authenticated_client.get(data["status_url"]).get_json()
+        assert status["status"] == "queued"
+        assert status["progress"] == 0
+
+        from app.core.jobs import work
+        assert work(worker_id="test-worker", max_jobs=1) == 1
+
+        status = authenticated_client.get(f"/api/quizzes/jobs/{job_id}").get_json()
+        assert status["status"] == "succeeded"
+        assert status["progress"] == 100
+        assert status["result"] == {"nb_questions": 2}
+
+        from app.models import Question
+        assert db_session.query(Question).filter_by(document_id=document_id).count() == 2
+
+    def test_job_failure_reported(self, app, authenticated_client, test_document_no_questions, mock_generate_mcq_empty):
+        """Test that a failed generation is visible in the job status"""
+        app.config["JOBS_EAGER"] = False
+        response = authenticated_client.post(
+            f"/api/quizzes/generate?document_id={test_document_no_questions.id}"
+        )
+        job_id = response.get_json()["job_id"]
+
+        from app.core.jobs import work
+        work(worker_id="test-worker", max_jobs=1)
+
+        status = authenticated_client.get(f"/api/quizzes/jobs/{job_id}").get_json()
+        assert status["status"] == "failed"
+        assert "No question has been generated" in status["error"]
+
+    def test_duplicate_request_attaches_to_job(self, app, authenticated_client, test_document_no_questions, mock_generate_mcq, db_session):
+        """Test that concurrent generate requests share a single job"""
+        app.config["JOBS_EAGER"] = False
+        url = f"/api/quizzes/generate?document_id={test_document_no_questions.id}"
+
+        first = authenticated_client.post(url).get_json()
+        second = authenticated_client.post(url)
+
+        assert second.status_code == 202
+        assert second.get_json()["job_id"] == first["job_id"]
+        assert "already in progress" in second.get_json()["message"]
+
+        from app.core.jobs import work
+        assert work(worker_id="test-worker", max_jobs=5) == 1
+
+        from app.models import Question
+        assert db_session.query(Question).filter_by(document_id=test_document_no_questions.id).count() == 2
+
+    def test_job_status_not_found(self, authenticated_client):
+        """Test status of an unknown job"""
+        response = authenticated_client.get("/api/quizzes/jobs/00000000-0000-0000-0000-000000000000")
+
+        assert response.status_code == 404
+
+    def test_job_status_other_user(self, app, client, test_user2, authenticated_client, test_document_no_questions, mock_generate_mcq):
+        """Test that users cannot see the jobs of other users"""
+        app.config["JOBS_EAGER"] = False
+        response = authenticated_client.post(
+            f"/api/quizzes/generate?document_id={test_document_no_questions.id}"
+        )
+        job_id = response.get_json()["job_id"]
+        authenticated_client.get("/auth/logout")
+
+        client.post("/auth/login", data={"email": test_user2.email, "password": "testpassword123"})
+        response = client.get(f"/api/quizzes/jobs/{job_id}")
+
+        assert response.status_code == 404
@@ -0,0 +1,129 @@
+"""
+Tests for the LLM rate limiter and retry with backoff
+"""
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.ratelimit import RateLimiter, backoff_delay, call_with_retry, is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.code = status
+
+
+class TestRateLimiter:
+
+    def test_token_bucket(self, tmp_path):
+        limiter = RateLimiter(str(tmp_path), rate=20, burst=2)
+        start = time.perf_counter()
+        for _ in range(4):
+            with limiter.slot():
+                pass
+        # 2 calls from the burst, then 2 more at 20/s
+        assert time.perf_counter() - start >= 0.09
+
+    def test_bucket_shared_through_the_directory(self, tmp_path):
+        RateLimiter(str(tmp_path), rate=0.01, burst=1).wait_for_token()
+        other = RateLimiter(str(tmp_path), rate=0.01, burst=1)
+        assert other._take_token() > 0
+
+    def test_max_inflight(self, tmp_path):
+        limiter = RateLimiter(str(tmp_path), max_inflight=2, poll_interval=0.01)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            with limiter.slot():
+                with lock:
+                    running.append(1)
+                    peak.append(len(running))
+                time.sleep(0.05)
+                with lock:
+                    running.pop()
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) == 2
+
+    def test_slot_released_on_error(self, tmp_path):
+        limiter = RateLimiter(str(tmp_path), max_inflight=1)
+        with pytest.raises(ValueError):
+            with limiter.slot():
+                raise ValueError("boom")
+        with limiter.slot():
+            pass
+
+
+class TestRetry:
+
+    def test_is_retryable(self):
+        assert is_retryable(StatusError(429))
+        assert is_retryable(StatusError(503))
+        assert not is_retryable(StatusError(400))
+        assert is_retryable(ConnectionError())
+        assert not is_retryable(ValueError())
+
+    def test_sdk_network_errors_are_retryable(self):
+        httpx = pytest.importorskip("httpx")
+        openai = pytest.importorskip("openai")
+        request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+        assert is_retryable(httpx.ConnectError("connection refused", request=request))
+        assert is_retryable(httpx.ReadTimeout("timed out", request=request))
+        assert is_retryable(openai.APIConnectionError(request=request))
+        assert is_retryable(openai.APITimeoutError(request=request))
+        assert not is_retryable(httpx.InvalidURL("not a url"))
+
+    def test_dropped_connection_is_retried(self):
+        httpx = pytest.importorskip("httpx")
+        func = MagicMock(side_effect=[httpx.ReadTimeout("timed out"), "ok"])
+        assert call_with_retry(func, max_attempts=2, sleep=lambda delay: None) == "ok"
+
+    def test_backoff_is_capped(self):
+        for attempt in range(10):
+            assert 0 <= backoff_delay(attempt, 1.0, 5.0) <= 5.0
+
+    def test_retries_then_succeeds(self):
+        func = MagicMock(side_effect=[StatusError(429), StatusError(503), "ok"])
+        delays = []
+        assert call_with_retry(func, max_attempts=4, sleep=delays.append) == "ok"
+        assert func.call_count == 3
+        assert len(delays) == 2
+
+    def test_gives_up(self):
+        func = MagicMock(side_effect=StatusError(429))
+        with pytest.raises(StatusError):
+            call_with_retry(func, max_attempts=3, sleep=lambda delay: None)
+        assert func.call_count == 3
+
+    def test_no_retry_on_client_error(self):
+        func = MagicMock(side_effect=StatusError(400))
+        with pytest.raises(StatusError):
+            call_with_retry(func, sleep=lambda delay: None)
+        assert func.call_count == 1
+
+
+def test_generate_mcq_retries_rate_limited_calls(monkeypatch, tmp_path):
+    from app.core import llm
+    provider = MagicMock(name="provider")
+    provider.generate.side_effect = [StatusError(429), json.dumps({"questions": [
+        {"question": "Q?", "answers": ["a", "b", "c", "d"], "correct_answer": "a"}
+    ]})]
+    monkeypatch.setattr(llm, "_provider", provider)
+    monkeypatch.setattr(llm, "response_cache", None)
+    monkeypatch.setattr(llm, "rate_limiter", RateLimiter(str(tmp_path), rate=100, burst=5, max_inflight=1))
+    monkeypatch.setattr(llm, "RETRY_BASE_DELAY", 0)
+
+    assert len(llm.generate_mcq("Some course", nb_questions=1)) == 1
+    assert provider.generate.call_count == 2
@@ -49,13 +49,13 @@ class TestSaveResults:
                 assert quiz_session.score == 50.0
                 assert quiz_session.total_questions == 2
                 
-                # Verify Results were created
-                # Note: The route code creates results but doesn't set quiz_session_id on them
-                # So we check by question_id instead of quiz_session_id
+                # Verify Results were created and linked to the quiz session
                 results = session.query(Result).filter(
                     Result.question_id.in_([answers[0]["question_id"], answers[1]["question_id"]])
                 ).all()
                 assert len(results) == 2
+                assert {result.quiz_session_id for result in results} == {quiz_session.id}
+                assert {result.user_answer for result in results} == {"Option A", "Option B"}
             finally:
                 session.close()
 
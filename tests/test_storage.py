@@ -0,0 +1,197 @@
+"""
+Tests for the content-addressed blob store
+"""
+import hashlib
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.storage import BlobStore, LocalBlobStore, S3BlobStore, collect_garbage, create_blob_store
+
+
+class FakeS3Client:
+    """In-memory stand-in for a boto3 S3 client (only the calls S3BlobStore uses)"""
+
+    def __init__(self, page_size=1000):
+        self.objects = {}
+        self.page_size = page_size
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = (Body, datetime.now(timezone.utc))
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective):
+        body = self.objects[(CopySource["Bucket"], CopySource["Key"])][0]
+        self.objects[(Bucket, Key)] = (body, datetime.now(timezone.utc))
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=None, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        size = min(MaxKeys or self.page_size, self.page_size)
+        page = keys[start:start + size]
+        response = {
+            "Contents": [{"Key": k, "LastModified": self.objects[(Bucket, k)][1]} for k in page],
+            "IsTruncated": start + size < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + size)
+        return response
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalBlobStore(str(tmp_path / "blobs"))
+    return S3BlobStore("bucket", prefix="raw", client=FakeS3Client(page_size=2))
+
+
+class TestBlobStore:
+    """Tests shared by every backend"""
+
+    def test_put_get(self, store):
+        data = b"HELLO BLOB"
+        store.put(_digest(data), io.BytesIO(data))
+        assert store.exists(_digest(data))
+        assert store.get(_digest(data)) == data
+
+    def test_missing(self, store):
+        assert not store.exists(_digest(b"missing"))
+        with pytest.raises(KeyError):
+            store.get(_digest(b"missing"))
+
+    def test_delete(self, store):
+        data = b"HELLO BLOB"
+        store.put(_digest(data), io.BytesIO(data))
+        store.delete(_digest(data))
+        assert not store.exists(_digest(data))
+        store.delete(_digest(data))  # deleting twice is not an error
+
+    def test_put_again_refreshes_modified_time(self, store):
+        data = b"HELLO BLOB"
+        store.put(_digest(data), io.BytesIO(data))
+        (_, first_modified), = store.list()
+        time.sleep(0.01)
+        store.put(_digest(data), io.BytesIO(data))
+        (_, modified), = store.list()
+        assert modified > first_modified
+        assert store.get(_digest(data)) == data
+
+    def test_list(self, store):
+        digests = set()
+        for i in range(5):
+            data = f"BLOB {i}".encode()
+            store.put(_digest(data), io.BytesIO(data))
+            digests.add(_digest(data))
+        listed = dict(store.list())
+        assert set(listed) == digests
+        assert all(isinstance(modified, datetime) for modified in listed.values())
+
+
+def test_local_store_layout(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    data = b"HELLO LAYOUT"
+    digest = _digest(data)
+    store.put(digest, io.BytesIO(data))
+    assert os.path.exists(tmp_path / digest[:2] / digest[2:4] / digest)
+
+
+def test_blob_store_is_abstract():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_create_blob_store(tmp_path):
+    assert create_blob_store(None) is None
+    assert isinstance(create_blob_store(f"file://{tmp_path}"), LocalBlobStore)
+    with pytest.raises(ValueError):
+        create_blob_store("ftp://host/blobs")
+
+
+class TestCollectGarbage:
+    """Tests for collect_garbage"""
+
+    def test_deletes_unreferenced_blobs(self, tmp_path, db_session, test_user):
+        from app.models import Document
+        store = LocalBlobStore(str(tmp_path))
+        kept, orphan = b"REFERENCED", b"ORPHAN"
+        for data in (kept, orphan):
+            store.put(_digest(data), io.BytesIO(data))
+        db_session.add(Document(title="doc", content="x", content_hash=_digest(kept), user_id=test_user.id))
+        db_session.commit()
+
+        deleted = collect_garbage(store, db_session, grace_period=timedelta(0))
+
+        assert deleted == [_digest(orphan)]
+        assert store.exists(_digest(kept))
+        assert not store.exists(_digest(orphan))
+
+    def test_grace_period_and_dry_run(self, tmp_path, db_session):
+        store = LocalBlobStore(str(tmp_path))
+        data = b"JUST UPLOADED"
+        store.put(_digest(data), io.BytesIO(data))
+
+        assert collect_garbage(store, db_session, grace_period=timedelta(hours=1)) == []
+        time.sleep(0.01)
+        assert collect_garbage(store, db_session, grace_period=timedelta(0), dry_run=True) == [_digest(data)]
+        assert store.exists(_digest(data))
+
+    def test_reupload_of_old_orphan_is_kept(self, tmp_path, db_session):
+        store = LocalBlobStore(str(tmp_path))
+        data = b"OLD ORPHAN"
+        store.put(_digest(data), io.BytesIO(data))
+        old = time.time() - 2 * 3600
+        os.utime(store._path(_digest(data)), (old, old))
+
+        # uploaded again, its document not committed yet
+        store.put(_digest(data), io.BytesIO(data))
+
+        assert collect_garbage(store, db_session, grace_period=timedelta(hours=1)) == []
+        assert store.exists(_digest(data))
+
+    def test_references_checked_again_before_delete(self, tmp_path, db_session, test_user, monkeypatch):
+        from app.models import Document
+        store = LocalBlobStore(str(tmp_path))
+        data = b"REFERENCED DURING GC"
+        store.put(_digest(data), io.BytesIO(data))
+        listed = list(store.list())
+
+        def list_then_commit():
+            # a document referencing the blob is committed while the store is listed
+            db_session.add(Document(title="doc", content="x", content_hash=_digest(data), user_id=test_user.id))
+            db_session.commit()
+            yield from listed
+
+        monkeypatch.setattr(store, "list", list_then_commit)
+        assert collect_garbage(store, db_session, grace_period=timedelta(0)) == []
+        assert store.exists(_digest(data))
+
+
+class TestGarbageCollectionCommand:
+    """Tests for `flask blobs gc`"""
+
+    def test_gc_command(self, runner, blob_store):
+        data = b"ORPHAN"
+        blob_store.put(_digest(data), io.BytesIO(data))
+
+        result = runner.invoke(args=["blobs", "gc", "--grace-hours", "0"])
+
+        assert result.exit_code == 0
+        assert "1 unreferenced blob(s) deleted" in result.output
+        assert not blob_store.exists(_digest(data))
+
+    def test_gc_command_without_store(self, runner):
+        result = runner.invoke(args=["blobs", "gc"])
+        assert result.exit_code != 0
+        assert "No blob store configured" in result.output
@@ -0,0 +1,140 @@
+"""
+Tests for the LLM call telemetry
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.core import llm
+from app.core.providers import StubProvider
+from app.core.telemetry import estimate_cost, percentile, summarize
+from app.models import LLMCall, LLMCallOutcome
+
+COURSE = "Bees pollinate many flowering plants. Honey is made from the nectar of flowers."
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_estimate_cost(monkeypatch):
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert estimate_cost("unknown-model", 1000, 1000) is None
+
+    monkeypatch.setenv("LLM_PRICE_INPUT", "1")
+    monkeypatch.setenv("LLM_PRICE_OUTPUT", "2")
+    assert estimate_cost("unknown-model", 1000, 1000) == pytest.approx(0.003)
+
+
+def test_generate_records_call(app, stub_provider, db_session):
+    questions = llm.generate_mcq(COURSE, nb_questions=3)
+
+    call = db_session.query(LLMCall).one()
+    assert call.provider == "stub"
+    assert call.mode == "generate"
+    assert call.outcome == LLMCallOutcome.ok
+    assert call.nb_requested == 3
+    assert call.nb_questions == len(questions) == 2
+    assert call.document_chars == len(COURSE)
+    assert call.input_tokens > call.output_tokens > 0
+    assert call.tokens_estimated
+    assert call.cost == 0
+    assert call.attempts == 1
+
+
+def test_provider_usage_is_recorded(app, db_session):
+    class ReportingProvider(StubProvider):
+        def generate(self, prompt, schema):
+            self._set_usage(1234, 56)
+            return json.dumps({"questions": []})
+
+    with patch.object(llm, "_provider", ReportingProvider(latency=0)), patch.object(llm, "response_cache", None):
+        llm.generate_mcq(COURSE, nb_questions=1)
+
+    call = db_session.query(LLMCall).one()
+    assert (call.input_tokens, call.output_tokens, call.tokens_estimated) == (1234, 56, False)
+
+
+def test_failures_are_recorded(app, stub_provider, db_session, monkeypatch):
+    monkeypatch.setattr(stub_provider, "generate", lambda prompt, schema: "not json")
+    assert llm.generate_mcq(COURSE, nb_questions=1) == []
+
+    def fail(prompt, schema):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(stub_provider, "generate", fail)
+    with pytest.raises(RuntimeError):
+        llm.generate_mcq(COURSE, nb_questions=1)
+
+    calls = db_session.query(LLMCall).order_by(LLMCall.created_at).all()
+    assert [call.outcome for call in calls] == [LLMCallOutcome.invalid, LLMCallOutcome.error]
+    assert calls[1].error == "quota exceeded"
+
+
+def test_stream_records_call(app, stub_provider, db_session):
+    questions = list(llm.stream_mcq(COURSE, nb_questions=5))
+
+    call = db_session.query(LLMCall).one()
+    assert call.mode == "stream"
+    assert call.outcome == LLMCallOutcome.ok
+    assert call.nb_questions == len(questions)
+    assert call.first_token_ms is not None
+    assert call.first_token_ms <= call.latency_ms
+
+
+def test_calls_outside_the_app_are_not_recorded(app, stub_provider, db_session):
+    """The telemetry setting belongs to the app: a call made without its context is not recorded"""
+    thread = threading.Thread(target=llm.generate_mcq, args=(COURSE,), kwargs={"nb_questions": 1})
+    thread.start()
+    thread.join()
+    assert db_session.query(LLMCall).count() == 0
+
+    llm.generate_mcq(COURSE, nb_questions=1)
+    assert db_session.query(LLMCall).count() == 1
+
+
+def test_summarize(app, db_session):
+    now = datetime.now()
+    for i in range(20):
+        db_session.add(LLMCall(
+            provider="stub", model="stub-v1", mode="generate",
+            outcome=LLMCallOutcome.error if i == 0 else LLMCallOutcome.ok,
+            latency_ms=100.0 * (i + 1), attempts=2 if i == 0 else 1, input_tokens=1000, output_tokens=200,
+            cost=0.001, prompt_chars=3000 if i < 10 else 9000, nb_requested=5, nb_questions=0 if i == 0 else 5,
+            concurrency=1 + i % 2, created_at=now,
+        ))
+    db_session.add(LLMCall(
+        provider="stub", model="stub-v1", mode="generate", outcome=LLMCallOutcome.ok, latency_ms=1.0,
+        input_tokens=1, output_tokens=1, prompt_chars=1, nb_requested=1, created_at=now - timedelta(days=2),
+    ))
+    db_session.commit()
+
+    (summary,) = summarize(db_session, since=now - timedelta(days=1))
+    assert summary["model"] == "stub/stub-v1"
+    assert summary["calls"] == 20
+    assert summary["failure_rate"] == 0.05
+    assert summary["outcomes"] == {"error": 1, "ok": 19}
+    assert summary["retries"] == 1
+    assert summary["latency_p50_ms"] == 1100
+    assert summary["latency_p95_ms"] == 2000
+    assert summary["questions_per_call"] == 4.75
+    assert summary["cost"] == pytest.approx(0.02)
+
+    by_size = summarize(db_session, since=now - timedelta(days=1), group_by="prompt_size")
+    assert [(s["prompt_size"], s["calls"]) for s in by_size] == [("2k-4k", 10), ("8k-16k", 10)]
+
+
+def test_stats_command(app, runner, stub_provider):
+    llm.generate_mcq(COURSE, nb_questions=3)
+
+    result = runner.invoke(args=["llm-calls", "stats", "--by", "mode"])
+
+    assert result.exit_code == 0
+    assert "generate" in result.output.splitlines()[1]
@@ -2,6 +2,24 @@
 Tests for UI routes (HTML pages)
 """
 import pytest
+from sqlalchemy import event
+
+from app.db import LocalSession
+
+
+@pytest.fixture
+def selects():
+    """SELECT statements sent to the database while the test runs"""
+    statements = []
+    engine = LocalSession().bind
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_execute)
 
 
 class TestHomePage:
@@ -21,6 +39,30 @@ class TestDocumentsPage:
         response = authenticated_client.get("/documents")
         assert response.status_code == 200
 
+    def test_documents_page_defers_content(self, authenticated_client, test_document, test_questions, selects):
+        """The list neither loads extracted texts nor question rows"""
+        response = authenticated_client.get("/documents")
+        assert response.status_code == 200
+        documents = [s for s in selects if "WHERE documents.user_id" in s]
+        questions = [s for s in selects if "FROM questions" in s]
+        assert len(documents) == 1 and "documents.content," not in documents[0]
+        assert len(questions) == 1 and "count(" in questions[0] and "questions.question" not in questions[0]
+
+    def test_documents_page_question_counts(self, authenticated_client, db_session, test_user, test_document,
+                                            test_questions):
+        """Play is enabled only for documents that have questions"""
+        from app.models import Document
+
+        empty = Document(title="Empty", content="No questions yet.", user_id=test_user.id)
+        db_session.add(empty)
+        db_session.commit()
+
+        html = authenticated_client.get("/documents").get_data(as_text=True)
+        assert f'href="/quizzes/play/{test_document.id}"' in html
+        assert f'data-topup="{test_document.id}"' in html
+        assert f'data-play-disabled="{empty.id}"' in html
+        assert f'data-generate="{empty.id}"' in html
+
     def test_documents_page_unauthenticated(self, client):
         """Test documents page redirects when not authenticated"""
         response = client.get("/documents", follow_redirects=False)
@@ -109,6 +151,15 @@ class TestResultsPage:
         response = authenticated_client.get("/results")
         assert response.status_code == 200
 
+    def test_results_page_defers_content(self, authenticated_client, test_document, selects):
+        """The document picker does not load extracted texts"""
+        title = test_document.title
+        selects.clear()
+        response = authenticated_client.get("/results")
+        assert response.status_code == 200
+        assert title in response.get_data(as_text=True)
+        assert not any("documents.content," in s for s in selects)
+
     def test_results_page_unauthenticated(self, client):
         """Test results page redirects when not authenticated"""
         response = client.get("/results", follow_redirects=False)
@@ -0,0 +1,13 @@
+from dotenv import load_dotenv
+# Load environement variables
+load_dotenv()
+
+from app.__init__ import create_app
+from app.core.jobs import work
+
+app = create_app()
+
+if __name__ == "__main__":
+    # Background job worker (quiz generation), run next to the web server
+    with app.app_context():
+        work()